@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist import conversions
+from moist.telemetry import FIELDS, FrameError, parse_line
+
+# Benchmark of the scalar and the array paths of moist.conversions, and of the
+# NTC interpolation table, on the resistances and pressures of a recorded
+# flight. The copy the GUI had before is timed as the baseline.
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_analysis', 'data', 'andoya_gs.txt')
+
+# As it was in moist-gui.py
+A1 = 3.354016e-3
+B1 = 2.569850e-4
+C1 = 2.620131e-6
+D1 = 6.383091e-8
+
+def ntc_ohms_to_temp(ntc_ohms):
+    log_NTC = np.log(ntc_ohms/10000)
+    return (1 / (A1 + B1 * log_NTC + C1 * log_NTC * log_NTC + D1 * log_NTC * log_NTC * log_NTC)) - 273.15
+
+def load_columns(path):
+    rows = []
+    with open(path, newline = '') as f:
+        for line in f:
+            try:
+                packet = parse_line(','.join(line.strip().split(',')[:len(FIELDS)]))
+            except FrameError:
+                continue
+            rows.append((packet.ohm, packet.pressure))
+    return np.array(rows).T
+
+def best_of(function, repeat):
+    return min(timeit.repeat(function, number = 1, repeat = repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the scalar and array paths of moist.conversions')
+    parser.add_argument('--log', default = DEFAULT_LOG)
+    parser.add_argument('--scale', type = int, default = 100, help = 'times the flight is repeated')
+    parser.add_argument('--repeat', type = int, default = 5)
+    args = parser.parse_args()
+
+    ohm, pressure = (np.tile(v, args.scale) for v in load_columns(args.log))
+    ohm_list, pressure_list = ohm.tolist(), pressure.tolist()
+    table = conversions.DEFAULT_NTC.table()
+
+    exact = conversions.ntc_temperature(ohm)
+    temp_list = exact.tolist() # The altitude cases both get the temperatures
+    print('table max error: {:.2e} degrees on the flight, {:.2e} over the table'.format(
+        np.max(np.abs(table.temperature(ohm) - exact)), table.max_error()))
+    scalar = np.array([conversions.ntc_temperature(v) for v in ohm_list])
+    print('scalar and array paths differ by at most {:.2e} degrees'.format(np.max(np.abs(scalar - exact))))
+
+    cases = [
+        ('NTC per packet (old GUI)', lambda: [ntc_ohms_to_temp(v) for v in ohm_list]),
+        ('NTC scalar', lambda: [conversions.ntc_temperature(v) for v in ohm_list]),
+        ('NTC table scalar', lambda: [table.temperature(v) for v in ohm_list]),
+        ('NTC array', lambda: conversions.ntc_temperature(ohm)),
+        ('NTC table array', lambda: table.temperature(ohm)),
+        ('altitude scalar', lambda: [conversions.hypsometric_altitude(p, t) for p, t in zip(pressure_list, temp_list)]),
+        ('altitude array', lambda: conversions.hypsometric_altitude(pressure, exact)),
+    ]
+    n = len(ohm)
+    print('{} samples'.format(n))
+    for name, function in cases:
+        print('{:<26} {:8.0f} ns/sample'.format(name, best_of(function, args.repeat) / n * 1e9))
+
+if __name__ == '__main__':
+    main()
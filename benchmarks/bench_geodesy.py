@@ -0,0 +1,105 @@
+import argparse
+import math
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist import geodesy
+from moist.telemetry import FIELDS, FrameError, parse_line
+
+# Benchmark of moist.geodesy against the per sample functions the GUI used
+# before it, on the positions of a recorded flight. Also checks that both give
+# the same results.
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_analysis', 'data', 'andoya_gs.txt')
+
+operator_pos = (69.296049, 16.030619)
+
+# The functions as they were in moist-gui.py
+def distance(current_lat, current_lng):
+    op_lat, op_lng = operator_pos
+    op_lat = math.radians(op_lat)
+    op_lng = math.radians(op_lng)
+    current_lat = math.radians(current_lat)
+    current_lng = math.radians(current_lng)
+    diff_lon = current_lng - op_lng
+    diff_lat = current_lat - op_lat
+    a = math.sin(diff_lat / 2) ** 2 + math.cos(op_lat) * math.cos(current_lat) * math.sin(diff_lon / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return 6371 * c * 1000
+
+def calcTilt(alt, lat, lng):
+    return math.degrees(math.atan2(alt, distance(lat, lng)))
+
+def calcBearing(current_lat, current_lng):
+    op_lat, op_lng = operator_pos
+    op_lat = math.radians(op_lat)
+    op_lng = math.radians(op_lng)
+    current_lat = math.radians(current_lat)
+    current_lng = math.radians(current_lng)
+    diff_lon = current_lng - op_lng
+    x = math.sin(diff_lon) * math.cos(current_lat)
+    y = math.cos(op_lat) * math.sin(current_lat) - math.sin(op_lat) * math.cos(current_lat) * math.cos(diff_lon)
+    return math.degrees(math.atan2(x, y))
+
+def load_positions(path):
+    rows = []
+    with open(path, newline = '') as f:
+        for line in f:
+            try:
+                packet = parse_line(','.join(line.strip().split(',')[:len(FIELDS)]))
+            except FrameError:
+                continue
+            rows.append((packet.alt, packet.lat, packet.lng))
+    return np.array(rows).T
+
+def best_of(function, repeat):
+    # Seconds of the fastest of repeat runs
+    return min(timeit.repeat(function, number = 1, repeat = repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark moist.geodesy against the per sample GUI functions')
+    parser.add_argument('--log', default = DEFAULT_LOG)
+    parser.add_argument('--scale', type = int, default = 100, help = 'times the flight is repeated')
+    parser.add_argument('--stations', type = int, default = 3)
+    parser.add_argument('--repeat', type = int, default = 5)
+    args = parser.parse_args()
+
+    alt, lat, lng = (np.tile(v, args.scale) for v in load_positions(args.log))
+    alt_list, lat_list, lng_list = alt.tolist(), lat.tolist(), lng.tolist()
+    observer = geodesy.Observer(*operator_pos)
+    stations = [geodesy.Observer(operator_pos[0] + 0.01 * i, operator_pos[1] - 0.01 * i) for i in range(args.stations)]
+
+    def legacy():
+        return [(distance(y, x), calcBearing(y, x), calcTilt(z, y, x)) for z, y, x in zip(alt_list, lat_list, lng_list)]
+
+    def scalar():
+        return [(observer.distance(y, x), observer.bearing(y, x), observer.elevation(z, y, x)) for z, y, x in zip(alt_list, lat_list, lng_list)]
+
+    def vectorised():
+        return observer.look(lat, lng, alt)
+
+    def all_stations():
+        return geodesy.look_angles(stations, lat, lng, alt)
+
+    expected = np.array(legacy()).T
+    for name, result in (('scalar', np.array(scalar()).T), ('vectorised', np.array(vectorised()))):
+        error = np.max(np.abs(result - expected), axis = 1)
+        print('{} max difference: {:.2e} m, {:.2e} deg, {:.2e} deg'.format(name, *error))
+
+    n = len(alt)
+    print('{} samples'.format(n))
+    baseline = None
+    for name, function, count in (('per sample (GUI)', legacy, n),
+                                  ('Observer scalar', scalar, n),
+                                  ('vectorised', vectorised, n),
+                                  ('{} stations at once'.format(args.stations), all_stations, n * args.stations)):
+        per_sample = best_of(function, args.repeat) / count
+        baseline = baseline or per_sample
+        print('{:<22} {:8.0f} ns/sample {:6.1f}x'.format(name, per_sample * 1e9, baseline / per_sample))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+
+import matplotlib
+matplotlib.use('Agg') # Headless, the frames are rendered into memory
+import matplotlib.pyplot as plt
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARKS_DIR, '..')) # Shared moist package
+sys.path.append(os.path.join(BENCHMARKS_DIR, '..', 'gui')) # Channel store, sample queue and renderer of the GUI
+from moist import conversions
+from moist.dataset import load_flight, load_radiosonde
+from moist.framing import FrameDecoder, encode_frame, encode_payload
+from moist.geodesy import Observer
+from moist.ingest import Ingest
+from moist.link import LinkQuality
+from moist.telemetry import format_packet, hms_to_seconds
+from moist.velocity import VerticalVelocity
+from channel_store import ChannelStore
+from render import BlitRenderer, update_panel
+from sample_queue import SampleQueue
+from bench_conversions import ntc_ohms_to_temp
+from bench_geodesy import calcBearing, calcTilt, distance, operator_pos
+from synthetic import synthetic_flight
+
+# Benchmark suite of the paths that run for every packet or every frame.
+#
+#   ingest      a telemetry line (or binary frame) through Ingest to the sample
+#               queue, as dataHandling() does minus the journal
+#   conversions the per packet conversions, the old GUI functions next to
+#               moist.conversions, moist.geodesy and moist.velocity
+#   render      one frame of the six live plots at 1k, 10k and 100k samples,
+#               the classic update() with a full draw and the blit renderer,
+#               both through the frame code of gui/render.py
+#   loading     every file in data_analysis/data, parsed and from the cache
+#
+# Everything but the loading runs on synthetic flights (see synthetic.py) of
+# configurable length. --save stores the results as the baseline of this
+# machine in baselines/, later runs print every result next to its baseline
+# and flag the ones that got more than --tolerance slower, --check makes
+# that an error for scripts. Timings only compare on the machine that made
+# them, so no baseline is kept in the repository: the first run on a machine
+# has nothing to compare against and should be made with --save, on the
+# commit the later runs are to be measured against.
+#
+#   python bench_suite.py --save
+#   python bench_suite.py --check
+#   python bench_suite.py --only render --sizes 1000,10000,100000,1000000
+
+DEFAULT_SAMPLES = 10000
+DEFAULT_SIZES = '1000,10000,100000'
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_DATA = os.path.join(BENCHMARKS_DIR, '..', 'data_analysis', 'data')
+BASELINE_DIR = os.path.join(BENCHMARKS_DIR, 'baselines')
+GROUPS = ['ingest', 'conversions', 'render', 'loading']
+
+# As in moist-gui.py
+CHANNELS = ['altitude', 'pressure', 'ntc', 'humidity', 'co2', 'temperature']
+PANELS = [
+    ('SCD30', 'Readings', 'Temperature ($^\\circ$C)', 'r', 5),
+    ('SCD30', 'Readings', 'Relative humidity (%)', 'g', 3),
+    ('SCD30', 'Readings', '$CO_{2}$ (ppm)', 'b', 4),
+    ('NTC', 'Readings', 'Resistance ($\\Omega$)', 'c', 2),
+    ('BMP-280', 'Readings', 'Pressure (Pa)', 'y', 1),
+    ('BN-880', 'Readings', 'Altitude (m)', 'm', 0)
+]
+FRAMES = 20 # Frames timed per render case
+
+def best_of(function, repeat):
+    # Seconds of the fastest of repeat runs
+    return min(timeit.repeat(function, number = 1, repeat = repeat))
+
+class LineSource:
+    name = 'benchmark'
+
+class Case:
+    def __init__(self, group, name, seconds, unit, scale):
+        self.group = group
+        self.name = name
+        self.seconds = seconds # Per unit
+        self.unit = unit
+        self.scale = scale     # Display multiplier for the unit, like 1e6 for us
+
+    def key(self):
+        return '{}/{}'.format(self.group, self.name)
+
+def bench_ingest(packets, repeat):
+    lines = [(format_packet(packet) + '\n').encode() for packet in packets]
+    frames = b''.join(encode_frame(encode_payload(p), hms_to_seconds(p.elapsed_time), p.rssi) for p in packets)
+    chunks = [frames[i:i + 4096] for i in range(0, len(frames), 4096)]
+
+    def run_text():
+        link = LinkQuality()
+        samples = SampleQueue(len(lines) + 1)
+        ingest = Ingest(LineSource(), on_packet = lambda packet, received_at: (link.update(packet.id, packet.rssi), samples.put((packet, received_at))))
+        for raw in lines:
+            ingest.handle(raw)
+
+    def run_binary():
+        decoder = FrameDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+
+    n = len(packets)
+    return [Case('ingest', 'csv line to sample queue', best_of(run_text, repeat) / n, 'us/packet', 1e6),
+            Case('ingest', 'binary frame decode', best_of(run_binary, repeat) / n, 'us/packet', 1e6)]
+
+def bench_conversions(packets, repeat):
+    ohm = [p.ohm for p in packets]
+    pressure = [p.pressure for p in packets]
+    lat = [p.lat for p in packets]
+    lng = [p.lng for p in packets]
+    alt = [p.alt for p in packets]
+    times = [hms_to_seconds(p.time) for p in packets]
+    temp = [conversions.ntc_temperature(v) for v in ohm]
+    observer = Observer(*operator_pos)
+
+    def calcAltitude(temp, p):
+        # As it was in moist-gui.py
+        pb = 101325
+        hb = 1
+        tb = temp + 273.15
+        lb = -0.0065
+        R = 287.06
+        g = 9.80665
+        return hb + (tb/lb) * ((p/pb)**((-R*lb)/(g)) - 1)
+
+    def run_velocity():
+        estimator = VerticalVelocity()
+        for t, h in zip(times, alt):
+            estimator.update(t, h)
+
+    cases = [
+        ('ntc_ohms_to_temp (old GUI)', lambda: [ntc_ohms_to_temp(v) for v in ohm]),
+        ('ntc_temperature', lambda: [conversions.ntc_temperature(v) for v in ohm]),
+        ('calcAltitude (old GUI)', lambda: [calcAltitude(t, p) for t, p in zip(temp, pressure)]),
+        ('barometric_altitude', lambda: [conversions.barometric_altitude(p, t, h0 = 1) for t, p in zip(temp, pressure)]),
+        ('distance (old GUI)', lambda: [distance(y, x) for y, x in zip(lat, lng)]),
+        ('Observer.distance', lambda: [observer.distance(y, x) for y, x in zip(lat, lng)]),
+        ('calcBearing (old GUI)', lambda: [calcBearing(y, x) for y, x in zip(lat, lng)]),
+        ('Observer.bearing', lambda: [observer.bearing(y, x) for y, x in zip(lat, lng)]),
+        ('calcTilt (old GUI)', lambda: [calcTilt(z, y, x) for z, y, x in zip(alt, lat, lng)]),
+        ('Observer.elevation', lambda: [observer.elevation(z, y, x) for z, y, x in zip(alt, lat, lng)]),
+        ('VerticalVelocity.update', run_velocity),
+    ]
+    n = len(packets)
+    return [Case('conversions', name, best_of(function, repeat) / n, 'us/packet', 1e6) for name, function in cases]
+
+def filled_store(packets):
+    store = ChannelStore(CHANNELS)
+    store.extend([(p.alt, p.pressure, p.ohm, p.hum, p.co2, p.temp) for p in packets])
+    return store
+
+def bench_render(packets, sizes, repeat):
+    # The frame code of gui/render.py on an Agg canvas, TkAgg would need a display
+    cases = []
+    extra = packets[:FRAMES]
+    rows = [(p.alt, p.pressure, p.ohm, p.hum, p.co2, p.temp) for p in extra]
+    for size in sizes:
+        flight = packets if len(packets) >= size else synthetic_flight(size, seed = 1)
+
+        # Classic: update() of moist-gui.py for every panel, then the full draw FuncAnimation does
+        store = filled_store(flight[:size])
+        fig, axes = plt.subplots(2, 3, squeeze = False)
+        fig.set_size_inches(4.4 * 3, 4 * 2)
+        panels = [(ax, ax.plot([], [], color = color)[0], channel) for (_, _, _, color, channel), ax in zip(PANELS, axes.flat)]
+        fig.canvas.draw()
+        def classic():
+            for row in rows:
+                store.append(row)
+                for ax, graph, channel in panels:
+                    update_panel(ax, graph, store, channel)
+                fig.canvas.draw()
+        cases.append(Case('render', 'classic frame {}'.format(size), best_of(classic, repeat) / FRAMES, 'ms/frame', 1e3))
+        plt.close(fig)
+
+        # Blit: BlitRenderer.render(), a full draw only when the limits have to grow
+        store = filled_store(flight[:size])
+        renderer = BlitRenderer(None, store, PANELS)
+        renderer.render()
+        def blit():
+            for row in rows:
+                store.append(row)
+                renderer.render()
+        cases.append(Case('render', 'blit frame {}'.format(size), best_of(blit, repeat) / FRAMES, 'ms/frame', 1e3))
+        plt.close(renderer.fig)
+    return cases
+
+def bench_loading(data_dir, repeat):
+    cases = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for path in sorted(glob.glob(os.path.join(data_dir, '*'))):
+            if(not os.path.isfile(path)):
+                continue
+            name = os.path.basename(path)
+            if(name.endswith('.geojson')):
+                load = lambda cache: load_radiosonde(path, cache_dir = cache_dir, cache = cache)
+                columns = ['temp_c', 'pressure_pa', 'gpheight']
+            else:
+                load = lambda cache: load_flight(path, sort = 'id', cache_dir = cache_dir, cache = cache)
+                columns = ['time', 'pressure', 'ohm', 'rssi']
+            def parse():
+                load(False).close()
+            def from_cache():
+                dataset = load(True)
+                for column in columns:
+                    dataset[column]
+                dataset.close()
+            cases.append(Case('loading', '{} parsed'.format(name), best_of(parse, repeat), 'ms/file', 1e3))
+            cases.append(Case('loading', '{} cached'.format(name), best_of(from_cache, repeat), 'ms/file', 1e3))
+    return cases
+
+def baseline_path(name = None):
+    return os.path.join(BASELINE_DIR, '{}.json'.format(name or platform.node() or 'default'))
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)['results']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def save_baseline(path, cases, args):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    baseline = {'machine': platform.node(),
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'matplotlib': matplotlib.__version__,
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'samples': args.samples,
+                'results': {case.key(): case.seconds for case in cases}}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent = 1)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the ingest, conversion, render and loading paths against a stored baseline')
+    parser.add_argument('--only', action = 'append', choices = GROUPS, help = 'run only this group, repeat it for more')
+    parser.add_argument('--samples', type = int, default = DEFAULT_SAMPLES, help = 'packets of the synthetic flight for ingest and conversions')
+    parser.add_argument('--sizes', default = DEFAULT_SIZES, help = 'samples in the store for the render cases, comma separated')
+    parser.add_argument('--data', default = DEFAULT_DATA, help = 'directory of the files to load')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--baseline', help = 'name of the baseline in baselines/ (default: this machine)')
+    parser.add_argument('--save', action = 'store_true', help = 'store the results as the baseline')
+    parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE, help = 'slowdown over the baseline that is flagged, 0.25 is 25%%')
+    parser.add_argument('--check', action = 'store_true', help = 'exit with 1 when a case is flagged')
+    args = parser.parse_args()
+
+    groups = args.only or GROUPS
+    sizes = [int(size) for size in args.sizes.split(',')]
+    packets = synthetic_flight(args.samples)
+    path = baseline_path(args.baseline)
+    baseline = load_baseline(path)
+    if(args.check and not baseline and not args.save):
+        parser.error('no baseline at {} to check against, make one with --save first'.format(path))
+    print('{} packets, baseline {}'.format(len(packets), path if baseline else 'none yet, --save makes one'))
+
+    cases = []
+    for group in groups:
+        if(group == 'ingest'):
+            results = bench_ingest(packets, args.repeat)
+        elif(group == 'conversions'):
+            results = bench_conversions(packets, args.repeat)
+        elif(group == 'render'):
+            results = bench_render(packets, sizes, args.repeat)
+        else:
+            results = bench_loading(args.data, args.repeat)
+        for case in results:
+            line = '{:<12} {:<42} {:10.3f} {}'.format(case.group, case.name, case.seconds * case.scale, case.unit)
+            if(case.key() in baseline):
+                ratio = case.seconds / baseline[case.key()]
+                line += ' {:6.2f}x baseline'.format(ratio)
+                if(ratio > 1 + args.tolerance):
+                    line += '  SLOWER'
+            print(line, flush = True)
+        cases += results
+
+    slower = [case for case in cases if case.key() in baseline and case.seconds > baseline[case.key()] * (1 + args.tolerance)]
+    if(args.save):
+        save_baseline(path, cases, args)
+        print('baseline saved to {}'.format(path))
+    if(slower):
+        print('{} of {} cases more than {:.0f}% slower than the baseline'.format(len(slower), len(cases), args.tolerance * 100))
+        if(args.check):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
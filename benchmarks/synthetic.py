@@ -0,0 +1,77 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist.conversions import KELVIN, LAUNCH_PRESSURE
+from moist.telemetry import HEADER, Packet, format_packet, seconds_to_hms
+
+# Synthetic flights of any length for the benchmarks.
+#
+# A balloon climbs at a steady rate, bursts after 70% of the flight and
+# falls under its parachute, drifting east. Temperature follows the standard
+# atmosphere, pressure an isothermal scale height, the thermistor a beta
+# model and the RSSI the range, with noise on everything and a share of the
+# packets lost. The numbers are plausible rather than physical, what matters
+# is that every code path sees the value ranges and the gaps of a real
+# flight, at whatever length the benchmark asks for. The same seed gives the
+# same flight.
+#
+#   python synthetic.py --samples 100000 --output long_flight.txt
+
+START = 14 * 3600          # GPS clock at the first packet
+OPERATOR = (69.296049, 16.030619)
+
+def synthetic_flight(samples, interval = 2.0, seed = 0, loss = 0.05, ascent_rate = 5.0, descent_rate = 12.0):
+    # List of samples Packets, ids keep counting over the lost ones
+    rng = np.random.default_rng(seed)
+    count = int(samples / (1 - loss)) + 1
+    elapsed = np.arange(count) * interval
+    burst = elapsed[-1] * 0.7
+    altitude = np.where(elapsed < burst, elapsed * ascent_rate, burst * ascent_rate - (elapsed - burst) * descent_rate)
+    altitude = np.maximum(altitude, 0) + 30 + rng.normal(0, 0.5, count)
+    kelvin = 288.15 - 0.0065 * np.minimum(altitude, 11000) + rng.normal(0, 0.3, count)
+    pressure = LAUNCH_PRESSURE * np.exp(-altitude / 7400) + rng.normal(0, 2, count)
+    ohm = 10000 * np.exp(3950 * (1 / kelvin - 1 / 298.15))
+    lat = OPERATOR[0] + np.cumsum(rng.normal(0, 2e-5, count))
+    lng = OPERATOR[1] + np.cumsum(np.abs(rng.normal(1e-4, 5e-5, count)))
+    kilometers = np.hypot((lat - OPERATOR[0]) * 111.2, (lng - OPERATOR[1]) * 39.4) + altitude / 1000
+    rssi = np.round(-70 - 20 * np.log10(1 + kilometers) + rng.normal(0, 2, count)).astype(int)
+    humidity = np.clip(80 - altitude / 300 + rng.normal(0, 1, count), 0, 100)
+    co2 = np.clip(420 * pressure / LAUNCH_PRESSURE + rng.normal(0, 5, count), 0, None)
+    internal = kelvin - KELVIN + 30
+
+    kept = np.sort(rng.choice(count, samples, replace = False)) if samples < count else np.arange(count)
+    packets = []
+    for i in kept.tolist():
+        packets.append(Packet(seconds_to_hms(elapsed[i]), i + 1, seconds_to_hms((START + elapsed[i]) % 86400),
+                              float(altitude[i]), float(lat[i]), float(lng[i]), float(pressure[i]), float(ohm[i]),
+                              float(humidity[i]), float(co2[i]), float(internal[i]), int(rssi[i])))
+    return packets
+
+def synthetic_lines(samples, **options):
+    # The flight as the receiver prints it
+    return [format_packet(packet) for packet in synthetic_flight(samples, **options)]
+
+def write_log(path, samples, **options):
+    with open(path, 'w', newline = '') as f:
+        f.write(HEADER + '\n')
+        for line in synthetic_lines(samples, **options):
+            f.write(line + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Write a synthetic flight log in the ground station format')
+    parser.add_argument('--samples', type = int, default = 10000)
+    parser.add_argument('--interval', type = float, default = 2.0, help = 'seconds between packets')
+    parser.add_argument('--loss', type = float, default = 0.05, help = 'share of the packets lost')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = 'synthetic_flight.txt')
+    args = parser.parse_args()
+
+    write_log(args.output, args.samples, interval = args.interval, seed = args.seed, loss = args.loss)
+    print('{} packets written to {}'.format(args.samples, args.output))
+
+if __name__ == '__main__':
+    main()
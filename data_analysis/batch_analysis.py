@@ -0,0 +1,170 @@
+'''
+File: batch_analysis.py
+Description: Analyses every flight log in a directory in parallel and tabulates them side by side
+'''
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist.conversions import LAUNCH_PRESSURE, ntc_temperature, pad_altitude
+from moist.dataset import cached, content_hash, load_flight
+from moist.geodesy import distance
+from moist.phases import detect_phases
+from moist.velocity import vertical_velocity
+
+'''
+Every log (a ground station log or a merged dataset) is analysed by its own
+worker process: NTC temperature, pressure altitude over the pad (the launch
+pressure main_analysis.py uses, --pad-pressure for another site), flight
+phases, vertical rates (the filter of moist/velocity.py, as in the GUI and
+main_analysis.py), packet loss and the RSSI at range. The result of a
+flight is cached next to its dataset cache, keyed on the content of the
+log and the source of this script and of the moist package, so adding a
+flight to the archive only analyses the new one.
+
+A log that only starts once the balloon is in the air, like a station that
+was switched on late, has no launch in it. It is marked started_aloft and
+the numbers that need the launch are left empty.
+
+    python ../batch_analysis.py . --output summary.csv
+    python ../batch_analysis.py /archive/flights --pattern '*_gs.txt' --workers 8
+'''
+
+DEFAULT_PATTERN = '*.txt'
+MOIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'moist')
+RANGE_FRACTION = 0.9  # RSSI at range is the median RSSI beyond this share of the maximum range
+START_SAMPLES = 10    # Samples the height a log starts at is the median of
+PAD_HEIGHT = 100.0    # A log starting higher than this over the pad started in flight
+
+REQUIRED = ['id', 'time', 'lat', 'lng', 'pressure', 'ohm', 'rssi'] # Columns of the log flight_metrics() reads
+
+COLUMNS = ['flight', 'rows', 'duration_min', 'max_altitude_m', 'burst_pressure_pa', 'ascent_rate_ms',
+           'descent_rate_ms', 'peak_ascent_ms', 'peak_descent_ms', 'min_temp_c', 'loss_pct', 'max_range_km',
+           'rssi_at_range_dbm', 'median_rssi_dbm', 'landed', 'start_altitude_m', 'started_aloft']
+
+def analyse(path, pad_pressure = LAUNCH_PRESSURE):
+    # Metrics of one flight, as a dict of COLUMNS
+    flight = load_flight(path, sort = 'id')
+    try:
+        missing = [name for name in REQUIRED if name not in flight]
+        if(missing):
+            # Like a notes file next to the logs, it is reported as skipped
+            raise ValueError('not a flight log, no {} column'.format(', '.join(missing)))
+        return flight_metrics(path, flight, pad_pressure)
+    finally:
+        flight.close()
+
+def flight_metrics(path, flight, pad_pressure = LAUNCH_PRESSURE):
+    # analyse() of a loaded flight
+    seconds = flight['time'].astype(float)
+    pressure = flight['pressure'].astype(float)
+    temp_ntc = ntc_temperature(flight['ohm'].astype(float))
+    altitude = pad_altitude(pressure, temp_ntc, pad_pressure)
+    start_altitude = np.nanmedian(altitude[:START_SAMPLES])
+    started_aloft = bool(start_altitude > PAD_HEIGHT)
+    phases = detect_phases(seconds, altitude)
+    launch, burst = phases.launch, phases.burst
+    end = phases.landing if phases.landing is not None else phases.last_signal
+
+    _, rate = vertical_velocity(seconds, altitude)
+    ascent = rate[launch:burst + 1]
+    descent = rate[burst:end + 1]
+
+    ids = flight['id']
+    expected = int(ids.max() - ids.min() + 1) if len(ids) else 0
+    loss = 100.0 * (1 - len(np.unique(ids)) / expected) if expected else np.nan
+
+    # Slant range from the launch position, over the samples with a GPS fix
+    lat, lng = flight['lat'], flight['lng']
+    fix = (lat != 0) & (lng != 0)
+    rssi = flight['rssi'].astype(float)
+    max_range = rssi_at_range = np.nan
+    if(fix.any()):
+        pad = np.flatnonzero(fix)
+        origin = pad[np.searchsorted(pad, launch)] if launch <= pad[-1] else pad[-1]
+        ground = distance(lat[origin], lng[origin], lat[fix], lng[fix])
+        slant = np.hypot(ground, altitude[fix] - altitude[origin])
+        max_range = slant.max()
+        rssi_at_range = np.median(rssi[fix][slant >= RANGE_FRACTION * max_range])
+
+    return {
+        'flight': os.path.basename(path),
+        'rows': len(flight),
+        'duration_min': np.nan if started_aloft else (seconds[phases.last_signal] - seconds[launch]) / 60,
+        'max_altitude_m': altitude[burst],
+        'burst_pressure_pa': pressure[burst],
+        'ascent_rate_ms': np.nan if started_aloft else (altitude[burst] - altitude[launch]) / max(seconds[burst] - seconds[launch], 1),
+        'descent_rate_ms': (altitude[end] - altitude[burst]) / max(seconds[end] - seconds[burst], 1),
+        'peak_ascent_ms': ascent.max() if len(ascent) and not started_aloft else np.nan,
+        'peak_descent_ms': descent.min() if len(descent) else np.nan,
+        'min_temp_c': np.nanmin(temp_ntc),
+        'loss_pct': loss,
+        'max_range_km': max_range / 1000,
+        'rssi_at_range_dbm': rssi_at_range,
+        'median_rssi_dbm': np.median(rssi),
+        'landed': phases.landing is not None,
+        'start_altitude_m': start_altitude,
+        'started_aloft': started_aloft,
+    }
+
+def code_version():
+    # Hash of this script and the moist package, the cached results of older code are not used
+    paths = [os.path.abspath(__file__)] + sorted(glob.glob(os.path.join(MOIST_DIR, '*.py')))
+    return [content_hash(path) for path in paths]
+
+def summarise(path, cache = True, pad_pressure = LAUNCH_PRESSURE):
+    # Worker: analyse() through the dataset cache, a changed log or script is analysed again
+    def parse(source):
+        metrics = {name: value.item() if isinstance(value, np.generic) else value for name, value in analyse(source, pad_pressure).items()}
+        return {}, {'metrics': metrics}
+    try:
+        start = time.perf_counter()
+        dataset = cached(path, 'summary', parse, code_version() + [pad_pressure], cache = cache)
+        dataset.close()
+        return dataset.meta['metrics'], time.perf_counter() - start, None
+    except (OSError, ValueError, IndexError) as error:
+        return {'flight': os.path.basename(path)}, 0.0, error
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Analyse every flight log in a directory in parallel and tabulate them')
+    parser.add_argument('directory', help = 'directory of the flight logs')
+    parser.add_argument('--pattern', default = DEFAULT_PATTERN, help = 'file name pattern of the logs')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per core)')
+    parser.add_argument('--output', help = 'CSV file for the summary table')
+    parser.add_argument('--force', action = 'store_true', help = 'analyse every flight, even the cached ones')
+    parser.add_argument('--pad-pressure', type = float, default = LAUNCH_PRESSURE, help = 'pressure at the launch pad in Pa, altitudes are over it')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.directory, args.pattern)))
+    if(not paths):
+        parser.error('no logs matching {} in {}'.format(args.pattern, args.directory))
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers = args.workers) as pool:
+        for path, (metrics, seconds, error) in zip(paths, pool.map(summarise, paths, [not args.force] * len(paths), [args.pad_pressure] * len(paths))):
+            if(error is not None):
+                print('{}: skipped, {}'.format(path, error), file = sys.stderr)
+                continue
+            print('{:<40} {:6.2f} s'.format(metrics['flight'], seconds), flush = True)
+            if(metrics['started_aloft']):
+                print('{}: starts {:.0f} m over the pad, no launch in the log'.format(path, metrics['start_altitude_m']), file = sys.stderr)
+            rows.append(metrics)
+    print('{} flights in {:.1f} s\n'.format(len(rows), time.perf_counter() - start))
+
+    table = pd.DataFrame(rows, columns = COLUMNS)
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.1f}'.format):
+        print(table.to_string(index = False))
+    if(args.output):
+        table.to_csv(args.output, index = False, float_format = '%.3f')
+
+if __name__ == '__main__':
+    main()
@@ -9,16 +9,23 @@ Course: TEK5720
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
-import json
 import scipy as sp
-from scipy.signal import savgol_filter
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist.conversions import ntc_temperature, pad_altitude
+from moist.dataset import load_flight, load_radiosonde
+from moist.phases import detect_phases
+from moist.profiles import ASCENT_GROUP, DESCENT_GROUP, bin_profile, phase_groups, residual_stats
+from moist.velocity import vertical_velocity
 
 '''
 Reading and extracting data
 '''
-df_data = pd.read_csv('merged_data_header.txt', sep=',')
-
-df_data = df_data.sort_values('id') 
+# Parsed once into typed columns and cached in .cache/, see moist/dataset.py
+flight = load_flight('merged_data_header.txt', sort='id')
+df_data = flight.frame()
 
 elapsed_time = df_data['elapsed_time']
 id = df_data['id']
@@ -36,57 +43,44 @@ rssi = df_data['rssi']
 '''
 Resistance to Temperature Conversion
 '''
-# Material constants
-A1 = 3.354016e-3
-B1 = 2.569850e-4
-C1 = 2.620131e-6
-D1 = 6.383091e-8
-
-
-# Logarithmic values of resistance
-R_NTC = thermistor
-log_NTC = np.log(R_NTC/10000)
-
-
-# Steinhart and Hart Equation
-temp_ntc = (1 / (A1 + B1 * log_NTC + C1 * log_NTC * log_NTC + D1 * log_NTC * log_NTC * log_NTC)) - 273.15
+# Steinhart and Hart Equation, see moist/conversions.py for the material constants
+temp_ntc = ntc_temperature(thermistor)
 
 '''
 Pressure to Altitude Conversion
 '''
-# CONVERSION BASED ON EQUATION FROM SCHROEDER
+# CONVERSION BASED ON EQUATION FROM SCHROEDER, relative to the pressure at the launch pad
 def altitude_calculation(pres, temp):
-    P_0 = 101036
-    P_z = pres
-    tmp = temp
-    k = 8.3144598 
-    m = 0.02896968 # [kg/mol]
-    g = 9.80665 # [m/s^2]
-    z = ((np.log(P_z) - np.log(P_0)) * k * (tmp + 274.15)) / (- m * g)
-
-    return z
+    return pad_altitude(pres, temp)
 
 # Calculating altitude based on pressure
 altitude_from_pressure = altitude_calculation(pressure, temp_ntc)
 max_altitude = max(altitude_from_pressure)
 
 '''
-Time Conversion: 
+Flight Phases:
+Detected from the pressure altitude, see moist/phases.py. For this flight
 - 14:06:14 ---- Time of Launch [58]
-- 15:09:20 ---- Time of Burst [1756]
+- 15:09:22 ---- Time of Burst [1756]
 - 15:28:51 ---- Time of Last Signal [2276]
 '''
-df = pd.DataFrame({'Time': time})
-df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S')  # Convert the 'Time' column to a datetime type
-time_fix = df['Time']
+time_fix = pd.Series(flight.times(), name='Time')  # GPS clock as datetime, unwrapped over midnight
+
+phases = detect_phases(flight.times(), altitude_from_pressure)
+launch_index = phases.launch
+burst_index = phases.burst
+lastsignal_index = phases.last_signal
 
-launch_time = pd.to_datetime('14:06:15', format='%H:%M:%S')
-balloon_burst = pd.to_datetime('15:09:20', format='%H:%M:%S')
-lastsignal_time = pd.to_datetime('15:28:51', format='%H:%M:%S')
+launch_time = time_fix[launch_index]
+balloon_burst = time_fix[burst_index]
+lastsignal_time = time_fix[lastsignal_index]
 
-burst_index = 1756
-launch_index = 58
-lastsignal_index = 2276
+def event_label(name, index, value=None, unit=''):
+    # Legend label of a flight event, like 'Burst: 15:09:22 (-27 °C)'
+    label = '{}: {}'.format(name, time_fix[index].strftime('%H:%M:%S'))
+    if value is not None:
+        label += ' ({:.{}f}{})'.format(value, 1 if abs(value) < 10 else 0, unit)
+    return label
 
 # INDEX ANALYSIS
 pd.set_option('display.max_rows', None) 
@@ -96,51 +90,70 @@ pd.set_option('display.max_rows', None)
 Reading data from Andøya radiosonde
 '''
 
-# Reading the JSON file in a very unpleasent way but it works
-with open('data_radiosonde.geojson') as f:
-    data = json.load(f)
-
-def create_lists(atr:str, data:list):
-    tmp = []
-    for feature,j in zip(data["features"], range(len(data["features"]))):
-        try:
-            tmp.append(feature['properties'][atr])
-        except:
-            #print(f"Didn't find '{atr}' at index {j}")
-            tmp.append(np.nan)
-
-    return tmp 
-
-altitudes_r = create_lists("gpheight", data)
-times_r = create_lists("time", data)
-temperatures_r = create_lists("temp", data)
-temperatures_r_c = []
-for i in temperatures_r:
-    temp_r_c = i - 273.15
-    temperatures_r_c.append(temp_r_c)
-dewpoints_r = create_lists("dewpoint", data)
-pressures_r = create_lists("pressure", data)
-pressures_r_pa = []
-for i in pressures_r:
-    pres_r_pa = i * 100
-    pressures_r_pa.append(pres_r_pa)
-wind_us_r = create_lists("wind_u", data)
-wind_vs_r = create_lists("wind_v", data)
+# Streamed in one pass into typed columns and cached like the flight, see moist/radiosonde.py
+radiosonde = load_radiosonde('data_radiosonde.geojson')
+
+altitudes_r = radiosonde['gpheight']
+times_r = radiosonde['time']
+temperatures_r = radiosonde['temp']
+temperatures_r_c = radiosonde['temp_c']
+dewpoints_r = radiosonde['dewpoint']
+pressures_r = radiosonde['pressure']
+pressures_r_pa = radiosonde['pressure_pa']
+wind_us_r = radiosonde['wind_u']
+wind_vs_r = radiosonde['wind_v']
 
 '''
 Calculating ascent and descent rates
 '''
+# Kalman filtered altitude and vertical rate, the same filter shows the rate live in the GUI, see moist/velocity.py
+smoothed_altitude, vertical_rate = vertical_velocity(flight['time'], altitude_from_pressure)
 
-index_max = np.argmax(altitude_from_pressure)
+index_max = burst_index
 
-def plot_radisonde_vs_moist():
+'''
+Profiles on a common altitude grid
+'''
+# Binned separately for ascent and descent, see moist/profiles.py
+profile_edges = np.arange(0, max_altitude + 250, 250)
+ntc_profile = bin_profile(altitude_from_pressure, temp_ntc, profile_edges, phase_groups(phases), n_groups=2)
+radiosonde_profile = bin_profile(altitudes_r, temperatures_r_c, profile_edges)
+temperature_residual = ntc_profile.residual(radiosonde_profile)
+residual_bias, residual_rms, residual_bins = residual_stats(temperature_residual)
+
+'''
+Sensor accuracy zones and CO2 pressure compensation
+'''
+# SCD30 internal temperature accuracy, best accuracy from 14:06 to 14:34
+yellow_zone1_start = 0
+yellow_zone1_end = 20
+green_zone_start = 20
+green_zone_end = 30
+yellow_zone2_start = 30
+yellow_zone2_end = 42
+red_zone1_start = 42
+red_zone1_end = 50
+red_zone2_start = 0
+red_zone2_end = min(temperature)
+
+sea_level_pressure = 101325
+co2_pressure = sea_level_pressure / pressure
+new_co2 = co2 * co2_pressure
+
+'''
+Figures
+'''
+# One function per figure, each draws on a fresh figure and leaves showing or
+# saving it to the caller, so report.py can render them in parallel
+
+def plot_temperature_vs_radiosonde():
     # EXTERNAL TEMPERATURE VS ALTITUDE (COMPARISON)
     plt.plot(temperatures_r_c, altitudes_r, label='Radiosonde', color='blue', linewidth=0.9)
     plt.plot(temp_ntc[:index_max], altitude_from_pressure[:index_max], label='Ascent (MOIST)', color='red', linewidth=0.9)
     plt.plot(temp_ntc[index_max:], altitude_from_pressure[index_max:], label='Descent (MOIST)', color='salmon', linewidth=0.9)
-    plt.scatter(temp_ntc[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 (8 °C)', color='green', s=100)
-    plt.scatter(temp_ntc[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 (-27 °C)', color='black', s=100)
-    plt.scatter(temp_ntc[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 (1.6 °C)', color='blue', s=100)
+    plt.scatter(temp_ntc[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, temp_ntc[launch_index], ' °C'), color='green', s=100)
+    plt.scatter(temp_ntc[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, temp_ntc[burst_index], ' °C'), color='black', s=100)
+    plt.scatter(temp_ntc[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, temp_ntc[lastsignal_index], ' °C'), color='blue', s=100)
     troposphere_start = 10
     troposphere_end = 7700
     tropopause_start = 7700
@@ -155,23 +168,22 @@ def plot_radisonde_vs_moist():
     plt.grid()
     plt.legend()
     plt.title('Temperature vs Altitude (Andøya Radiosonde vs MOIST) - ATMOSPHERE LAYERS')
-    plt.show()
 
+def plot_pressure_vs_radiosonde():
     # PRESSURE VS ALTITUDE (COMPARISON)
     plt.plot(altitudes_r, pressures_r_pa, label='Radiosonde', color='blue', linewidth=0.9)
     plt.plot(altitude_from_pressure[:index_max], pressure[:index_max], label='Ascent (MOIST)', color='brown', linewidth=0.9)
     plt.plot(altitude_from_pressure[index_max:], pressure[index_max:], label='Descent (MOIST)', color='peru', linewidth=0.9)
-    plt.scatter(altitude_from_pressure[58], pressure[58], marker='x', label='Launch: 14:06:14 (101036 Pa)', color='green', s=100)
-    plt.scatter(altitude_from_pressure[1756], pressure[1756], marker='x', label='Burst: 15:09:20 (7751 Pa)',  color='black', s=100)
-    plt.scatter(altitude_from_pressure[2276], pressure[2276], marker='x', label='Last Signal: 15:28:51 (98355 Pa)', color='blue', s=100)
+    plt.scatter(altitude_from_pressure[launch_index], pressure[launch_index], marker='x', label=event_label('Launch', launch_index, pressure[launch_index], ' Pa'), color='green', s=100)
+    plt.scatter(altitude_from_pressure[burst_index], pressure[burst_index], marker='x', label=event_label('Burst', burst_index, pressure[burst_index], ' Pa'),  color='black', s=100)
+    plt.scatter(altitude_from_pressure[lastsignal_index], pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, pressure[lastsignal_index], ' Pa'), color='blue', s=100)
     plt.ylabel('Pressure [Pa]')
     plt.xlabel('Altitude [m]')
     plt.grid()
     plt.legend()
     plt.title('Pressure vs Altitude (Andøya Radiosonde vs MOIST)')
-    plt.show()
 
-def plot_moist():
+def plot_ntc_vs_time():
     # EXTERNAL TEMPERATURE VS TIME [NTC]
     plt.title('External Temperature [NTC]')
     plt.grid()
@@ -179,13 +191,13 @@ def plot_moist():
     plt.xlabel('Time [Hour:Min]')
     plt.plot(time_fix[:index_max], temp_ntc[:index_max], color='red', linewidth='0.8', label='Ascent')
     plt.plot(time_fix[index_max:], temp_ntc[index_max:], color='salmon', linewidth='0.8', label='Descent')
-    plt.scatter(time_fix[58], temp_ntc[58], marker='x', label='Launch: 14:06:14 (8 °C)', color='green', s=100)
-    plt.scatter(time_fix[1756], temp_ntc[1756], marker='x', label='Burst: 15:09:20 (-27 °C)', color='black', s=100)
-    plt.scatter(time_fix[2276], temp_ntc[2276], marker='x', label='Last Signal: 15:28:51 (1.6 °C)', color='blue', s=100)
+    plt.scatter(time_fix[launch_index], temp_ntc[launch_index], marker='x', label=event_label('Launch', launch_index, temp_ntc[launch_index], ' °C'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], temp_ntc[burst_index], marker='x', label=event_label('Burst', burst_index, temp_ntc[burst_index], ' °C'), color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], temp_ntc[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, temp_ntc[lastsignal_index], ' °C'), color='blue', s=100)
     plt.legend()
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
-    plt.show()
 
+def plot_ntc_vs_altitude():
     # EXTERNAL TEMPERATURE VS ALTITUDE [NTC]
     plt.title('External Temperature [NTC]')
     plt.grid()
@@ -193,12 +205,12 @@ def plot_moist():
     plt.xlabel('Temperature [°C]')
     plt.plot(temp_ntc[:index_max], altitude_from_pressure[:index_max], color='red', linewidth='0.8', label='Ascent')
     plt.plot(temp_ntc[index_max:], altitude_from_pressure[index_max:], color='salmon', linewidth='0.8', label='Descent')
-    plt.scatter(temp_ntc[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 (8 °C)', color='green', s=100)
-    plt.scatter(temp_ntc[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 (-27 °C)', color='black', s=100)
-    plt.scatter(temp_ntc[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 (1.6 °C)', color='blue', s=100)
+    plt.scatter(temp_ntc[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, temp_ntc[launch_index], ' °C'), color='green', s=100)
+    plt.scatter(temp_ntc[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, temp_ntc[burst_index], ' °C'), color='black', s=100)
+    plt.scatter(temp_ntc[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, temp_ntc[lastsignal_index], ' °C'), color='blue', s=100)
     plt.legend()
-    plt.show()
 
+def plot_altitude_vs_time():
     # ALTITUDE VS TIME [BN-880 and BMP-280]
     plt.title('Altitude [BN-880 and BMP-280]')
     plt.grid()
@@ -206,13 +218,13 @@ def plot_moist():
     plt.xlabel('Time [Hour:Min]')
     plt.plot(time_fix, altitude_from_pressure, label='BMP-280 (Based on Pressure and Temperature)', color='orange')
     plt.plot(time_fix, altitude, color='blue', linewidth='1', label='BN-880')
-    plt.scatter(time_fix[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 (23 m)', color='green', s=100)
-    plt.scatter(time_fix[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 ({:.0f} m)'.format(max_altitude),  color='black', s=100)
-    plt.scatter(time_fix[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 (248 m)', color='blue', s=100)
+    plt.scatter(time_fix[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, altitude_from_pressure[launch_index], ' m'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, altitude_from_pressure[burst_index], ' m'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, altitude_from_pressure[lastsignal_index], ' m'), color='blue', s=100)
     plt.legend()
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
-    plt.show()
 
+def plot_pressure_vs_time():
     # PRESSURE VS TIME [BMP-280]
     plt.title('Pressure [BMP-280]')
     plt.grid()
@@ -220,13 +232,13 @@ def plot_moist():
     plt.xlabel('Time [Hour:Min]')
     plt.plot(time_fix[:index_max], pressure[:index_max], color='brown', linewidth='1', label='Ascent')
     plt.plot(time_fix[index_max:], pressure[index_max:], color='peru', linewidth='1', label='Descent')
-    plt.scatter(time_fix[58], pressure[58], marker='x', label='Launch: 14:06:14 (101036 Pa)', color='green', s=100)
-    plt.scatter(time_fix[1756], pressure[1756], marker='x', label='Burst: 15:09:20 (7751 Pa)',  color='black', s=100)
-    plt.scatter(time_fix[2276], pressure[2276], marker='x', label='Last Signal: 15:28:51 (98355 Pa)', color='blue', s=100)
+    plt.scatter(time_fix[launch_index], pressure[launch_index], marker='x', label=event_label('Launch', launch_index, pressure[launch_index], ' Pa'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], pressure[burst_index], marker='x', label=event_label('Burst', burst_index, pressure[burst_index], ' Pa'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, pressure[lastsignal_index], ' Pa'), color='blue', s=100)
     plt.legend()
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
-    plt.show()
 
+def plot_pressure_vs_altitude():
     # PRESSURE VS ALTITUDE [BMP-280]
     plt.title('Pressure [BMP-280]')
     plt.grid()
@@ -234,32 +246,20 @@ def plot_moist():
     plt.ylabel('Pressure [Pa]')
     plt.plot(altitude_from_pressure[:index_max], pressure[:index_max], color='brown', linewidth='1', label='Ascent')
     plt.plot(altitude_from_pressure[index_max:], pressure[index_max:], color='peru', linewidth='1', label='Descent')
-    plt.scatter(altitude_from_pressure[58], pressure[58], marker='x', label='Launch: 14:06:14 (101036 Pa)', color='green', s=100)
-    plt.scatter(altitude_from_pressure[1756], pressure[1756], marker='x', label='Burst: 15:09:20 (7751 Pa)',  color='black', s=100)
-    plt.scatter(altitude_from_pressure[2276], pressure[2276], marker='x', label='Last Signal: 15:28:51 (98355 Pa)', color='blue', s=100)
+    plt.scatter(altitude_from_pressure[launch_index], pressure[launch_index], marker='x', label=event_label('Launch', launch_index, pressure[launch_index], ' Pa'), color='green', s=100)
+    plt.scatter(altitude_from_pressure[burst_index], pressure[burst_index], marker='x', label=event_label('Burst', burst_index, pressure[burst_index], ' Pa'),  color='black', s=100)
+    plt.scatter(altitude_from_pressure[lastsignal_index], pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, pressure[lastsignal_index], ' Pa'), color='blue', s=100)
     plt.legend()
-    plt.show()
 
+def plot_scd30_temperature_vs_time():
     # INTERNAL TEMPERATURE VS TIME [SCD30]
     plt.title('Internal Temperature [SCD30]')
     plt.grid()
     plt.ylabel('Temperature [°C]')
     plt.xlabel('Time [Hour:Min]')
-    plt.scatter(time_fix[58], temperature[58], marker='x', label='Launch: 14:06:14 (42 °C)', color='green', s=100)
-    plt.scatter(time_fix[1756], temperature[1756], marker='x', label='Burst: 15:09:20 (-9 °C)',  color='black', s=100)
-    plt.scatter(time_fix[2276], temperature[2276], marker='x', label='Last Signal: 15:28:51 (-9 °C)', color='blue', s=100)
-
-    # Best Accuracy: 14:06 to 14:34
-    yellow_zone1_start = 0
-    yellow_zone1_end = 20
-    green_zone_start = 20
-    green_zone_end = 30
-    yellow_zone2_start = 30
-    yellow_zone2_end = 42
-    red_zone1_start = 42
-    red_zone1_end = 50
-    red_zone2_start = 0
-    red_zone2_end = min(temperature)
+    plt.scatter(time_fix[launch_index], temperature[launch_index], marker='x', label=event_label('Launch', launch_index, temperature[launch_index], ' °C'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], temperature[burst_index], marker='x', label=event_label('Burst', burst_index, temperature[burst_index], ' °C'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], temperature[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, temperature[lastsignal_index], ' °C'), color='blue', s=100)
 
     plt.legend()
     plt.plot(time_fix[:index_max], temperature[:index_max], color='orange', linewidth='1', label='Ascent')
@@ -271,16 +271,16 @@ def plot_moist():
     plt.fill_between(time_fix, red_zone2_start, red_zone2_end, alpha=0.2, color='red', label='Accuracy < ± 10°C')
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
     plt.legend()
-    plt.show()
 
+def plot_scd30_temperature_vs_altitude():
     # INTERNAL TEMPERATURE VS ALTITUDE [SCD30]
     plt.title('Internal Temperature [SCD30]')
     plt.grid()
     plt.xlabel('Temperature [°C]')
     plt.ylabel('Altitude [m]')
-    plt.scatter(temperature[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 (42 °C)', color='green', s=100)
-    plt.scatter(temperature[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 (-9 °C)',  color='black', s=100)
-    plt.scatter(temperature[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 (-9 °C)', color='blue', s=100)
+    plt.scatter(temperature[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, temperature[launch_index], ' °C'), color='green', s=100)
+    plt.scatter(temperature[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, temperature[burst_index], ' °C'),  color='black', s=100)
+    plt.scatter(temperature[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, temperature[lastsignal_index], ' °C'), color='blue', s=100)
     plt.fill_betweenx(np.linspace(min(altitude_from_pressure), max(altitude_from_pressure)), yellow_zone1_start, yellow_zone1_end, alpha=0.2, color='yellow', label='Accuracy ± 6 °C')
     plt.fill_betweenx(np.linspace(min(altitude_from_pressure), max(altitude_from_pressure)), green_zone_start, green_zone_end, alpha=0.2, color='green', label='Accuracy ± 1 °C')
     plt.fill_betweenx(np.linspace(min(altitude_from_pressure), max(altitude_from_pressure)), yellow_zone2_start, yellow_zone2_end, alpha=0.2, color='yellow')
@@ -289,93 +289,89 @@ def plot_moist():
     plt.legend()
     plt.plot(temperature[:index_max], altitude_from_pressure[:index_max], color='orange', linewidth='1', label='Ascent')
     plt.plot(temperature[index_max:], altitude_from_pressure[index_max:], color='brown', linewidth='1', label='Descent')
-    plt.show()
-
-    sea_level_pressure = 101325
-    co2_pressure = sea_level_pressure / pressure
-    new_co2 = co2 * co2_pressure
 
+def plot_co2_vs_time():
     # CO2 VS TIME [SCD30]
     plt.title('$CO_2$ [SCD30] - With Pressure')
     plt.grid()
     plt.ylabel('$CO_2$ [ppm]')
     plt.xlabel('Time [Hour:Min]')
-    plt.scatter(time_fix[58], co2[58], marker='x', label='Launch: 14:06:14 (477 ppm)', color='green', s=100)
-    plt.scatter(time_fix[1756], co2[1756], marker='x', label='Burst: 15:09:20 (8.5 ppm)',  color='black', s=100)
-    plt.scatter(time_fix[2276], co2[2276], marker='x', label='Last Signal: 15:28:51 (300 ppm)', color='blue', s=100)
+    plt.scatter(time_fix[launch_index], co2[launch_index], marker='x', label=event_label('Launch', launch_index, co2[launch_index], ' ppm'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], co2[burst_index], marker='x', label=event_label('Burst', burst_index, co2[burst_index], ' ppm'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], co2[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, co2[lastsignal_index], ' ppm'), color='blue', s=100)
     green_time_start = time_fix[0]
     green_time_end = time_fix[828]
     yellow_time_start = time_fix[828]
-    yellow_time_end = time_fix[2276]
+    yellow_time_end = time_fix[lastsignal_index]
     plt.fill_betweenx(np.linspace(min(co2), max(co2)), green_time_start, green_time_end, alpha=0.2, color='green', label='Accuracy ± 2.5 ppm')
     plt.fill_betweenx(np.linspace(min(co2), max(co2)), yellow_time_start, yellow_time_end, alpha=0.2, color='gray', label='Accuracy < ± 2.5 ppm (not specified)')
     plt.plot(time_fix[:index_max], co2[:index_max], color='limegreen', linewidth='0.9', label='Ascent')
     plt.plot(time_fix[index_max:], co2[index_max:], color='green', linewidth='0.9', label='Descent')
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
     plt.legend()
-    plt.show()
 
+def plot_co2_vs_altitude():
     # CO2 VS ALTITUDE [SCD30]
     plt.title('$CO_2$ [SCD30] - With Pressure')
     plt.grid()
     plt.ylabel('Altitude [m]')
     plt.xlabel('$CO_2$ [ppm]')
-    plt.scatter(co2[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 (477 ppm)', color='green', s=100)
-    plt.scatter(co2[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 (8.5 ppm)',  color='black', s=100)
-    plt.scatter(co2[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 (300 ppm)', color='blue', s=100)
+    plt.scatter(co2[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, co2[launch_index], ' ppm'), color='green', s=100)
+    plt.scatter(co2[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, co2[burst_index], ' ppm'),  color='black', s=100)
+    plt.scatter(co2[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, co2[lastsignal_index], ' ppm'), color='blue', s=100)
     plt.plot(co2[:index_max], altitude_from_pressure[:index_max], color='limegreen', linewidth='0.9', label='Ascent')
     plt.plot(co2[index_max:], altitude_from_pressure[index_max:], color='green', linewidth='0.9', label='Descent')
     plt.legend()
-    plt.show()
 
+def plot_compensated_co2_vs_time():
     # CO2 VS TIME [SCD30] without pressure
     plt.title('$CO_2$ [SCD30] - Without Pressure')
     plt.grid()
     plt.ylabel('$CO_2$ [ppm]')
     plt.xlabel('Time [Hour:Min]')
-    plt.scatter(time_fix[58], new_co2[58], marker='x', label='Launch: 14:06:14 ({:.0f} ppm)'.format(new_co2[58]), color='green', s=100)
-    plt.scatter(time_fix[1756], new_co2[1756], marker='x', label='Burst: 15:09:20 ({:.0f} ppm)'.format(new_co2[1756]),  color='black', s=100)
-    plt.scatter(time_fix[2276], new_co2[2276], marker='x', label='Last Signal: 15:28:51 ({:.0f} ppm)'.format(new_co2[2276]), color='blue', s=100)
+    plt.scatter(time_fix[launch_index], new_co2[launch_index], marker='x', label=event_label('Launch', launch_index, new_co2[launch_index], ' ppm'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], new_co2[burst_index], marker='x', label=event_label('Burst', burst_index, new_co2[burst_index], ' ppm'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], new_co2[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, new_co2[lastsignal_index], ' ppm'), color='blue', s=100)
     green_time_start = time_fix[0]
     green_time_end = time_fix[828]
     yellow_time_start = time_fix[828]
-    yellow_time_end = time_fix[2276]
+    yellow_time_end = time_fix[lastsignal_index]
     plt.fill_betweenx(np.linspace(min(new_co2), max(new_co2)), green_time_start, green_time_end, alpha=0.2, color='green', label='Accuracy ± 2.5 ppm')
     plt.fill_betweenx(np.linspace(min(new_co2), max(new_co2)), yellow_time_start, yellow_time_end, alpha=0.2, color='gray', label='Accuracy < ± 2.5 ppm (not specified)')
     plt.plot(time_fix[:index_max], new_co2[:index_max], color='limegreen', linewidth='0.9', label='Ascent')
     plt.plot(time_fix[index_max:], new_co2[index_max:], color='green', linewidth='0.9', label='Descent')
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
     plt.legend()
-    plt.show()
 
+def plot_compensated_co2_vs_altitude():
     # CO2 VS ALTITUDE [SCD30] without pressure
     plt.title('$CO_2$ [SCD30] - Without Pressure')
     plt.grid()
     plt.ylabel('Altitude [m]')
     plt.xlabel('$CO_2$ [ppm]')
-    plt.scatter(new_co2[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 ({:.0f} ppm)'.format(new_co2[58]), color='green', s=100)
-    plt.scatter(new_co2[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 ({:.0f} ppm)'.format(new_co2[1756]),  color='black', s=100)
-    plt.scatter(new_co2[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 ({:.0f} ppm)'.format(new_co2[2276]), color='blue', s=100)
+    plt.scatter(new_co2[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, new_co2[launch_index], ' ppm'), color='green', s=100)
+    plt.scatter(new_co2[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, new_co2[burst_index], ' ppm'),  color='black', s=100)
+    plt.scatter(new_co2[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, new_co2[lastsignal_index], ' ppm'), color='blue', s=100)
     plt.legend()
     plt.plot(new_co2[:index_max], altitude_from_pressure[:index_max], color='limegreen', linewidth='0.9', label='Ascent')
     plt.plot(new_co2[index_max:], altitude_from_pressure[index_max:], color='green', linewidth='0.9', label='Descent')
     plt.legend()
-    plt.show()
 
+def plot_humidity_vs_time():
     # HUMIDITY VS TIME [SCD30]
     plt.title('Relative Humidity [SCD30]')
     plt.grid()
     plt.ylabel('Relative Humidity [RH %]')
     plt.xlabel('Time [Hour:Min]')
-    plt.scatter(time_fix[58], humidity[58], marker='x', label='Launch: 14:06:14 ({:.0f}%)'.format(humidity[58]), color='green', s=100)
-    plt.scatter(time_fix[1756], humidity[1756], marker='x', label='Burst: 15:09:20 ({:.0f}%)'.format(humidity[1756]),  color='black', s=100)
-    plt.scatter(time_fix[2276], humidity[2276], marker='x', label='Last Signal: 15:28:51 ({:.0f}%)'.format(humidity[2276]), color='blue', s=100)
+    plt.scatter(time_fix[launch_index], humidity[launch_index], marker='x', label=event_label('Launch', launch_index, humidity[launch_index], '%'), color='green', s=100)
+    plt.scatter(time_fix[burst_index], humidity[burst_index], marker='x', label=event_label('Burst', burst_index, humidity[burst_index], '%'),  color='black', s=100)
+    plt.scatter(time_fix[lastsignal_index], humidity[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, humidity[lastsignal_index], '%'), color='blue', s=100)
     green_time_start = time_fix[245]
     green_time_end = time_fix[465]
     gray_time1_start = time_fix[0]
     gray_time1_end = time_fix[245]
     gray_time2_start = time_fix[465]
-    gray_time2_end = time_fix[2276]
+    gray_time2_end = time_fix[lastsignal_index]
     plt.fill_betweenx(np.linspace(min(humidity), max(humidity)), green_time_start, green_time_end, alpha=0.2, color='green', label='Accuracy ± 3%RH')
     plt.fill_betweenx(np.linspace(min(humidity), max(humidity)), gray_time1_start, gray_time1_end, alpha=0.2, color='gray', label='Accuracy < ± 3%RH (not specified)')
     plt.fill_betweenx(np.linspace(min(humidity), max(humidity)), gray_time2_start, gray_time2_end, alpha=0.2, color='gray')
@@ -383,21 +379,21 @@ def plot_moist():
     plt.plot(time_fix[index_max:], humidity[index_max:], color='springgreen', linewidth='1', label='Descent')
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
     plt.legend()
-    plt.show()
 
+def plot_humidity_vs_altitude():
     # HUMIDITY VS ALTITUDE [SCD30]
     plt.title('Relative Humidity [SCD30]')
     plt.grid()
     plt.xlabel('Relative Humidity [RH %]')
     plt.ylabel('Altitude [m]')
-    plt.scatter(humidity[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14 ({:.0f}%)'.format(humidity[58]), color='green', s=100)
-    plt.scatter(humidity[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20 ({:.0f}%)'.format(humidity[1756]),  color='black', s=100)
-    plt.scatter(humidity[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51 ({:.0f}%)'.format(humidity[2276]), color='blue', s=100)
+    plt.scatter(humidity[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index, humidity[launch_index], '%'), color='green', s=100)
+    plt.scatter(humidity[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index, humidity[burst_index], '%'),  color='black', s=100)
+    plt.scatter(humidity[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index, humidity[lastsignal_index], '%'), color='blue', s=100)
     plt.plot(humidity[:index_max], altitude_from_pressure[:index_max], color='dodgerblue', linewidth='1', label='Ascent')
     plt.plot(humidity[index_max:], altitude_from_pressure[index_max:], color='springgreen', linewidth='1', label='Descent')
     plt.legend()
-    plt.show()
 
+def plot_temperature_comparison():
     # MIX (EXTERNAL TEMPERATURE VS INTERNAL TEMPERATURE VS ALTITUDE)
     plt.title('Temperature Comparison [NTC and SCD30]')
     plt.grid()
@@ -407,16 +403,16 @@ def plot_moist():
     plt.plot(temp_ntc[index_max:], altitude_from_pressure[index_max:], color='salmon', linewidth='0.8', label='Descent (external)')
     plt.plot(temperature[:index_max], altitude_from_pressure[:index_max], color='orange', linewidth='0.8', label='Ascent (internal)')
     plt.plot(temperature[index_max:], altitude_from_pressure[index_max:], color='brown', linewidth='0.8', label='Descent (internal)')
-    plt.scatter(temp_ntc[58], altitude_from_pressure[58], marker='x', label='Launch: 14:06:14', color='green', s=100)
-    plt.scatter(temp_ntc[1756], altitude_from_pressure[1756], marker='x', label='Burst: 15:09:20', color='black', s=100)
-    plt.scatter(temp_ntc[2276], altitude_from_pressure[2276], marker='x', label='Last Signal: 15:28:51', color='blue', s=100)
-    plt.scatter(temperature[58], altitude_from_pressure[58], marker='x', color='green', s=100)
-    plt.scatter(temperature[1756], altitude_from_pressure[1756], marker='x',  color='black', s=100)
-    plt.scatter(temperature[2276], altitude_from_pressure[2276], marker='x', color='blue', s=100)
+    plt.scatter(temp_ntc[launch_index], altitude_from_pressure[launch_index], marker='x', label=event_label('Launch', launch_index), color='green', s=100)
+    plt.scatter(temp_ntc[burst_index], altitude_from_pressure[burst_index], marker='x', label=event_label('Burst', burst_index), color='black', s=100)
+    plt.scatter(temp_ntc[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', label=event_label('Last Signal', lastsignal_index), color='blue', s=100)
+    plt.scatter(temperature[launch_index], altitude_from_pressure[launch_index], marker='x', color='green', s=100)
+    plt.scatter(temperature[burst_index], altitude_from_pressure[burst_index], marker='x',  color='black', s=100)
+    plt.scatter(temperature[lastsignal_index], altitude_from_pressure[lastsignal_index], marker='x', color='blue', s=100)
     plt.legend()
-    plt.show()
 
-   # MIX (CO2 VS HUMIDITY VS EXTERNAL TEMPERATURE VS ALTITUDE VS TIME)
+def plot_mix_vs_time():
+    # MIX (CO2 VS HUMIDITY VS EXTERNAL TEMPERATURE VS ALTITUDE VS TIME)
     fig, ax = plt.subplots()
     fig.subplots_adjust(right=0.75)
 
@@ -451,14 +447,14 @@ def plot_moist():
     ax.tick_params(axis='x', **tkw)
 
     plt.title('Comparison of External Temperature & Relative Humidity & $CO_2$ [SCD30 and NTC]')
-    plt.axvline(time_fix[58], label='Launch: 14:06:14', color='black', linestyle='solid')
-    plt.axvline(time_fix[1756], label='Burst: 15:09:20', color='black', linestyle='dashed')
-    plt.axvline(time_fix[2276], label='Last Signal: 15:28:51', color='black', linestyle='dotted')
+    plt.axvline(time_fix[launch_index], label=event_label('Launch', launch_index), color='black', linestyle='solid')
+    plt.axvline(time_fix[burst_index], label=event_label('Burst', burst_index), color='black', linestyle='dashed')
+    plt.axvline(time_fix[lastsignal_index], label=event_label('Last Signal', lastsignal_index), color='black', linestyle='dotted')
     plt.grid()
     plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%H:%M'))  # Format x-axis labels to display only hour:minute
     plt.legend(loc='upper center')
-    plt.show()
 
+def plot_mix_vs_altitude():
     # MIX (CO2 VS HUMIDITY VS EXTERNAL TEMPERATURE VS ALTITUDE VS TIME)
     fig, ax = plt.subplots()
     fig.subplots_adjust(top=0.75)
@@ -491,49 +487,72 @@ def plot_moist():
     ax.tick_params(axis='y', **tkw)
 
     plt.title('Comparison of External Temperature & Relative Humidity & $CO_2$ [SCD30 and NTC]')
-    plt.axhline(altitude_from_pressure[58], label='Launch: 14:06:14', color='black', linestyle='solid')
-    plt.axhline(altitude_from_pressure[1756], label='Burst: 15:09:20', color='black', linestyle='dashed')
-    plt.axhline(altitude_from_pressure[2276], label='Last Signal: 15:28:51', color='black', linestyle='dotted')
+    plt.axhline(altitude_from_pressure[launch_index], label=event_label('Launch', launch_index), color='black', linestyle='solid')
+    plt.axhline(altitude_from_pressure[burst_index], label=event_label('Burst', burst_index), color='black', linestyle='dashed')
+    plt.axhline(altitude_from_pressure[lastsignal_index], label=event_label('Last Signal', lastsignal_index), color='black', linestyle='dotted')
     plt.grid()
     plt.legend(loc='upper center')
-    plt.show()
 
 def rssi_and_rates_plot():
-    # Applying Savitzky-Golay Filter 
-    window_length = 60 # Must be an odd number
-    poly_order = 2  # Degree of the fitting polynomial
-
-    # Convert the time data to datetime type
-    time_fix_ = pd.to_datetime(time_fix)
-
-    # Calculate the difference in seconds from the starting timestamp
-    seconds_difference = (time_fix_ - time_fix_.iloc[0]).dt.seconds
-
-    delta_t = np.diff(seconds_difference)
+    # Rate between neighbouring samples, where the GPS clock moved on (it repeats a second now and then)
+    delta_t = np.diff(flight['time'])
     delta_h = np.diff(altitude_from_pressure)
+    moved = delta_t > 0
+    full_rate = delta_h[moved] / delta_t[moved]
+    average_full_altitude = np.asarray(altitude_from_pressure)[:-1][moved]
 
-    full_rate = delta_h / delta_t
-    average_full_altitude = altitude_from_pressure.drop(altitude_from_pressure.index[-1])
-    smooth_full_rate = savgol_filter(full_rate, window_length, poly_order)
-
-    index_max = np.argmax(average_full_altitude)
-
+    ascent = slice(launch_index, burst_index + 1)
+    descent = slice(burst_index, lastsignal_index + 1)
     plt.title('Ascent and Descent Rate of MOIST CanSat')
     plt.plot(full_rate, average_full_altitude, linewidth='0.5', color='black', alpha=0.2)
-    plt.plot(smooth_full_rate[:index_max], average_full_altitude[:index_max], linewidth='0.5', color='red', label='Ascent: avg {:.1f} m/s'.format(np.average(smooth_full_rate[:index_max])))
-    plt.plot(smooth_full_rate[index_max:], average_full_altitude[index_max:], linewidth='0.9', color='blue', label='Descent: avg {:.1f} m/s'.format(np.average(smooth_full_rate[index_max:])))
+    plt.plot(vertical_rate[ascent], smoothed_altitude[ascent], linewidth='0.5', color='red', label='Ascent: avg {:.1f} m/s'.format(np.average(vertical_rate[ascent])))
+    plt.plot(vertical_rate[descent], smoothed_altitude[descent], linewidth='0.9', color='blue', label='Descent: avg {:.1f} m/s'.format(np.average(vertical_rate[descent])))
     plt.ylabel('Altitude [m]')
     plt.grid()
     plt.xlabel('Velocity [m/s]')
     plt.legend()
-    plt.show()
+
+def plot_temperature_residuals():
+    # EXTERNAL TEMPERATURE RESIDUAL VS ALTITUDE (MOIST - RADIOSONDE)
+    centers = ntc_profile.centers()
+    for group, name, color in [(ASCENT_GROUP, 'Ascent', 'red'), (DESCENT_GROUP, 'Descent', 'salmon')]:
+        plt.errorbar(temperature_residual[group], centers, xerr=ntc_profile.std[group], color=color, linewidth=0.9, elinewidth=0.5,
+                     label='{}: bias {:.1f} °C, RMS {:.1f} °C over {} bins'.format(name, residual_bias[group], residual_rms[group], residual_bins[group]))
+    plt.axvline(0, color='black', linewidth=0.8)
+    plt.xlabel('Temperature Residual [°C]')
+    plt.ylabel('Altitude [m]')
+    plt.grid()
+    plt.legend()
+    plt.title('Temperature Residual per 250 m (MOIST NTC - Andøya Radiosonde)')
+
+MOIST_FIGURES = [plot_ntc_vs_time, plot_ntc_vs_altitude, plot_altitude_vs_time, plot_pressure_vs_time,
+                 plot_pressure_vs_altitude, plot_scd30_temperature_vs_time, plot_scd30_temperature_vs_altitude,
+                 plot_co2_vs_time, plot_co2_vs_altitude, plot_compensated_co2_vs_time, plot_compensated_co2_vs_altitude,
+                 plot_humidity_vs_time, plot_humidity_vs_altitude, plot_temperature_comparison, plot_mix_vs_time,
+                 plot_mix_vs_altitude]
+RADIOSONDE_FIGURES = [plot_temperature_vs_radiosonde, plot_pressure_vs_radiosonde, plot_temperature_residuals]
+FIGURES = [rssi_and_rates_plot] + MOIST_FIGURES + RADIOSONDE_FIGURES # In the order of a full run
+
+def show(figures):
+    for figure in figures:
+        figure()
+        plt.show()
+
+def plot_moist():
+    show(MOIST_FIGURES)
+
+def plot_radisonde_vs_moist():
+    show(RADIOSONDE_FIGURES)
 
 '''
 Plotting all results
 '''
 
-rssi_and_rates_plot()
-plot_moist()
-plot_radisonde_vs_moist()
+# Interactive, one window after the other. For all figures at once without windows run
+#   python ../report.py
+if __name__ == '__main__':
+    show([rssi_and_rates_plot])
+    plot_moist()
+    plot_radisonde_vs_moist()
 
 
@@ -0,0 +1,173 @@
+'''
+File: merge_logs.py
+Description: Merges the logs of several ground stations into one flight dataset with derived columns
+'''
+
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist.conversions import G, KELVIN, LAPSE_RATE, M, R, hypsometric_altitude, ntc_temperature
+from moist.telemetry import FIELDS, HEADER, FrameError, parse_fields
+
+'''
+Every station log is checked and, where needed, sorted on id by its own worker
+process, which writes it out as a run file. A log that is already in id
+order, as logs normally are, is streamed straight to its run. One that is not
+is sorted externally, CHUNK_LINES lines at a time, so no log is ever held in
+memory as a whole. The runs are then merged on id in a single streaming pass
+that keeps one line per station in memory. When several stations heard the
+same packet the copy with the best RSSI is kept, ties go to the station given
+first. The derived columns are computed in the same pass, so the output is
+the same for the same inputs every time.
+'''
+
+DERIVED = ['temp_ntc', 'lapse_rate', 'loss', 'altitude', 'temp_alt']
+MERGED_HEADER = HEADER + ',' + ','.join(DERIVED)
+CHUNK_LINES = 100000 # Lines sorted in memory at a time when a log is out of order
+
+def parse_log(path):
+    # Yields (id, line) for every valid line of a log, the count of rejected lines is in rejected[0]
+    rejected = [0]
+    def lines():
+        with open(path, newline = '') as f:
+            for line in f:
+                fields = line.strip().split(',')[:len(FIELDS)]
+                try:
+                    packet = parse_fields(fields)
+                except FrameError:
+                    if(fields[0] != FIELDS[0]): # Not the header
+                        rejected[0] += 1
+                    continue
+                yield packet.id, ','.join(fields)
+    return lines(), rejected
+
+def write_chunk(path, entries):
+    with open(path, 'w', newline = '') as f:
+        for _, line in entries:
+            f.write(line + '\n')
+
+def read_chunk(path, index):
+    # Yields (id, chunk index, line), the chunk index keeps the merge stable
+    with open(path, newline = '') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            yield int(line.split(',', 2)[1]), index, line
+
+def prepare(path, run_path, chunk_lines = CHUNK_LINES):
+    # Worker: writes the valid lines of one log to run_path sorted on id.
+    # Returns (run_path, lines kept, lines rejected).
+    lines, rejected = parse_log(path)
+    kept = 0
+    last_id = None
+    with open(run_path, 'w', newline = '') as run:
+        for packet_id, line in lines:
+            if(last_id is not None and packet_id < last_id):
+                break
+            run.write(line + '\n')
+            kept += 1
+            last_id = packet_id
+        else:
+            return run_path, kept, rejected[0] # In order, the common case
+
+    # Out of order: what was written is the first sorted chunk, the rest is
+    # sorted chunk_lines at a time and the chunks are merged into the run
+    chunks = [run_path + '.chunk-0']
+    os.replace(run_path, chunks[0])
+    pending = [(packet_id, line)]
+    for entry in lines:
+        pending.append(entry)
+        if(len(pending) >= chunk_lines):
+            chunks.append(run_path + '.chunk-{}'.format(len(chunks)))
+            pending.sort(key = lambda entry: entry[0]) # Stable, keeps the order of equal ids
+            write_chunk(chunks[-1], pending)
+            kept += len(pending)
+            pending = []
+    pending.sort(key = lambda entry: entry[0])
+    kept += len(pending)
+    streams = [read_chunk(chunk, index) for index, chunk in enumerate(chunks)]
+    streams.append((packet_id, len(chunks), line) for packet_id, line in pending)
+    with open(run_path, 'w', newline = '') as run:
+        for _, _, line in heapq.merge(*streams, key = lambda entry: entry[:2]):
+            run.write(line + '\n')
+    for chunk in chunks:
+        os.remove(chunk)
+    return run_path, kept, rejected[0]
+
+def read_run(run_path, station):
+    # Yields (id, -rssi, station, fields), the key heapq.merge orders on
+    with open(run_path, newline = '') as f:
+        for line in f:
+            fields = line.rstrip('\n').split(',')
+            yield int(fields[1]), -int(fields[11]), station, fields
+
+def merged(runs):
+    # Best copy of every packet id across the runs, in id order
+    streams = [read_run(run_path, station) for station, run_path in enumerate(runs)]
+    for _, copies in itertools.groupby(heapq.merge(*streams), key = lambda entry: entry[0]):
+        yield next(copies)[3] # Best RSSI first, then the station given first
+
+def format_row(fields):
+    # Same number formatting as the merged datasets written with pandas
+    values = [fields[0], str(int(fields[1])), fields[2]]
+    values += [repr(float(v)) for v in fields[3:11]]
+    values.append(str(int(fields[11])))
+    return values
+
+def derive(rows):
+    # Appends the derived columns to every row of the merged stream
+    previous = None
+    for fields in rows:
+        ohm = float(fields[7])
+        pressure = float(fields[6])
+        temp_ntc = ntc_temperature(ohm)
+        if(previous is None):
+            pressure_0 = pressure # Altitudes are relative to the first packet
+            lapse_rate = ''
+            loss = ''
+        else:
+            lapse_rate = repr(temp_ntc - previous[0])
+            loss = repr(float(int(fields[1]) - previous[1])) # 1 when no packet went missing
+        altitude = hypsometric_altitude(pressure, temp_ntc, pressure_0)
+        # Temperature change of the standard atmosphere over the same pressure ratio
+        temp_alt = (temp_ntc + KELVIN) * ((pressure / pressure_0) ** (-LAPSE_RATE * R / (M * G)) - 1)
+        previous = (temp_ntc, int(fields[1]))
+        yield format_row(fields) + [repr(temp_ntc), lapse_rate, loss, repr(altitude), repr(temp_alt)]
+
+def merge_logs(paths, output, jobs = None):
+    # Returns (rows written, {path: (lines kept, lines rejected)})
+    report = {}
+    with tempfile.TemporaryDirectory(prefix = 'moist-merge-') as directory:
+        run_paths = [os.path.join(directory, '{}.csv'.format(i)) for i in range(len(paths))]
+        with ProcessPoolExecutor(max_workers = jobs) as pool:
+            results = list(pool.map(prepare, paths, run_paths))
+        for path, (_, kept, rejected) in zip(paths, results):
+            report[path] = (kept, rejected)
+
+        count = 0
+        with open(output, 'w', newline = '') as f:
+            f.write(MERGED_HEADER + '\n')
+            for row in derive(merged(run_paths)):
+                f.write(','.join(row) + '\n')
+                count += 1
+    return count, report
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Merge ground station logs into one dataset with derived columns')
+    parser.add_argument('logs', nargs = '+', help = 'station logs, on equal RSSI the first one given wins')
+    parser.add_argument('-o', '--output', default = 'merged_data_header.txt')
+    parser.add_argument('-j', '--jobs', type = int, default = None, help = 'worker processes, one per log by default')
+    args = parser.parse_args()
+
+    count, report = merge_logs(args.logs, args.output, args.jobs or len(args.logs))
+    for path, (kept, rejected) in report.items():
+        print('{}: {} lines, {} rejected'.format(path, kept, rejected))
+    print('Wrote {} packets to {}'.format(count, args.output))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+'''
+File: report.py
+Description: Renders every figure of main_analysis.py without windows and writes them into one HTML report
+'''
+
+import argparse
+import glob
+import hashlib
+import html
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg') # Before main_analysis imports pyplot, no windows and no display needed
+import matplotlib.pyplot as plt
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+
+'''
+Every function in main_analysis.FIGURES is rendered by a pool of worker
+processes, one figure per task, and saved as an image next to the report.
+An image is named after a hash of everything it is drawn from: the content
+of the flight and radiosonde files (the key of their dataset cache), the
+source of main_analysis.py outside the figure functions, the source of the
+figure function itself, the moist package and the render options. A figure
+whose hash already has an image is not drawn again, so after editing one
+figure only that one is rendered.
+
+Run it from data_analysis/data like the scripts:
+    python ../report.py
+    python ../report.py --workers 4 --dpi 200 --output report
+'''
+
+DEFAULT_OUTPUT = 'report'
+DEFAULT_DPI = 120
+DEFAULT_SIZE = '12x7' # Inches, about a maximized window
+FIGURES_DIR = 'figures'
+MANIFEST = 'manifest.json' # Titles of the cached images
+
+MOIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'moist')
+
+analysis = None
+
+def load_analysis():
+    # Worker initializer, the data is loaded once per process
+    global analysis
+    if(analysis is None):
+        import main_analysis
+        analysis = main_analysis
+    return analysis
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return float(width), float(height)
+
+def figure_keys(module, options):
+    # {figure name: hash of its inputs, code and options}
+    sources = {figure.__name__: inspect.getsource(figure) for figure in module.FIGURES}
+    shared = inspect.getsource(module)
+    for source in sources.values():
+        shared = shared.replace(source, '')
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(os.path.basename(module.flight.path).encode()) # Named after the content hash of the source
+    digest.update(os.path.basename(module.radiosonde.path).encode())
+    digest.update(shared.encode())
+    for path in sorted(glob.glob(os.path.join(MOIST_DIR, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update('{}|{}'.format(matplotlib.__version__, options).encode())
+    keys = {}
+    for name, source in sources.items():
+        figure_digest = digest.copy()
+        figure_digest.update(source.encode())
+        keys[name] = figure_digest.hexdigest()
+    return keys
+
+def render(name, path, dpi, size):
+    # Worker: draws one figure and saves it to path, returns (name, title, seconds)
+    start = time.perf_counter()
+    module = load_analysis()
+    plt.close('all')
+    getattr(module, name)()
+    fig = plt.gcf()
+    fig.set_size_inches(size)
+    title = next((ax.get_title() for ax in fig.axes if ax.get_title()), name)
+    temporary = '{}.tmp-{}{}'.format(path, os.getpid(), os.path.splitext(path)[1])
+    fig.savefig(temporary, dpi = dpi, bbox_inches = 'tight')
+    os.replace(temporary, path) # A cancelled run leaves no half image behind
+    plt.close('all')
+    return name, title, time.perf_counter() - start
+
+def write_html(path, module, entries, rendered, cached, seconds):
+    flight = module.flight
+    parts = ['<!DOCTYPE html>',
+             '<html><head><meta charset="utf-8"><title>MOIST flight report</title>',
+             '<style>body { font-family: sans-serif; max-width: 1200px; margin: auto; } img { width: 100%; } '
+             'li { line-height: 1.5; }</style></head><body>',
+             '<h1>MOIST flight report</h1>',
+             '<p>{} ({} rows, {} rejected lines), radiosonde {}</p>'.format(
+                 html.escape(flight.meta['source']), len(flight), flight.meta.get('rejected', 0),
+                 html.escape(module.radiosonde.meta['source'])),
+             '<p>{}</p>'.format(html.escape(module.phases.summary())),
+             '<p>Generated {}, {} figures rendered and {} cached in {:.1f} s</p>'.format(
+                 time.strftime('%Y-%m-%d %H:%M:%S'), rendered, cached, seconds),
+             '<ol>']
+    for name, title, image in entries:
+        parts.append('<li><a href="#{}">{}</a></li>'.format(name, html.escape(title)))
+    parts.append('</ol>')
+    for name, title, image in entries:
+        parts.append('<h2 id="{}">{}</h2>'.format(name, html.escape(title)))
+        parts.append('<img src="{}/{}" alt="{}">'.format(FIGURES_DIR, image, html.escape(title)))
+    parts.append('</body></html>')
+    with open(path, 'w', encoding = 'utf-8') as f:
+        f.write('\n'.join(parts) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Render all figures of main_analysis.py in parallel into an HTML report')
+    parser.add_argument('--output', default = DEFAULT_OUTPUT, help = 'directory of the report')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: one per core)')
+    parser.add_argument('--dpi', type = int, default = DEFAULT_DPI)
+    parser.add_argument('--size', type = parse_size, default = DEFAULT_SIZE, help = 'figure size in inches, WIDTHxHEIGHT')
+    parser.add_argument('--format', choices = ['png', 'svg'], default = 'png', help = 'image format of the figures')
+    parser.add_argument('--force', action = 'store_true', help = 'render every figure, even the cached ones')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    module = load_analysis()
+    figures_dir = os.path.join(args.output, FIGURES_DIR)
+    os.makedirs(figures_dir, exist_ok = True)
+    manifest_path = os.path.join(figures_dir, MANIFEST)
+    try:
+        with open(manifest_path, encoding = 'utf-8') as f:
+            titles = json.load(f)
+    except (OSError, ValueError):
+        titles = {}
+
+    keys = figure_keys(module, (args.dpi, args.size, args.format))
+    images = {}
+    pending = []
+    for i, figure in enumerate(module.FIGURES):
+        name = figure.__name__
+        images[name] = '{:02d}-{}-{}.{}'.format(i + 1, name, keys[name], args.format)
+        if(args.force or images[name] not in titles or not os.path.isfile(os.path.join(figures_dir, images[name]))):
+            pending.append(name)
+
+    if(pending):
+        # Forked workers start with the data already loaded, spawned ones load it in the initializer
+        with ProcessPoolExecutor(max_workers = args.workers, initializer = load_analysis) as pool:
+            futures = [pool.submit(render, name, os.path.join(figures_dir, images[name]), args.dpi, args.size) for name in pending]
+            for future in futures:
+                name, title, seconds = future.result()
+                titles[images[name]] = title
+                print('{:<40} {:6.2f} s'.format(name, seconds), flush = True)
+
+    # Images of figures that changed or were removed
+    titles = {image: titles[image] for image in images.values()}
+    for path in glob.glob(os.path.join(figures_dir, '*.' + args.format)):
+        if(os.path.basename(path) not in titles):
+            os.remove(path)
+    with open(manifest_path, 'w', encoding = 'utf-8') as f:
+        json.dump(titles, f, indent = 1)
+
+    entries = [(figure.__name__, titles[images[figure.__name__]], images[figure.__name__]) for figure in module.FIGURES]
+    seconds = time.perf_counter() - start
+    report_path = os.path.join(args.output, 'index.html')
+    write_html(report_path, module, entries, len(pending), len(entries) - len(pending), seconds)
+    print('{} rendered, {} cached in {:.1f} s: {}'.format(len(pending), len(entries) - len(pending), seconds, report_path))
+
+if __name__ == '__main__':
+    main()
@@ -6,21 +6,27 @@ Description: This code plots the RSSI values from different ground stations
 Course: TEK5720
 '''
 
-import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import scipy as sp
 from scipy.signal import savgol_filter
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist.conversions import ntc_temperature, pad_altitude
+from moist.dataset import load_flight
+from moist.phases import detect_phases
 
 '''
 Reading and extracting data
 '''
 
-#df_data = pd.read_csv('logs/andenes_gs.txt', sep=',')
-#df_data = pd.read_csv('logs/andoya_gs.txt', sep=',')
-df_data = pd.read_csv('logs/automatic_antenna_gs.txt', sep=',')
-
-df_data = df_data.sort_values('id') 
+# Parsed once into typed columns and cached in .cache/, see moist/dataset.py
+#flight = load_flight('logs/andenes_gs.txt', sort='id')
+#flight = load_flight('logs/andoya_gs.txt', sort='id')
+flight = load_flight('logs/automatic_antenna_gs.txt', sort='id')
+df_data = flight.frame()
 
 elapsed_time = df_data['elapsed_time']
 id = df_data['id']
@@ -38,69 +44,40 @@ rssi = df_data['rssi']
 '''
 Resistance to Temperature Conversion
 '''
-# Material constants
-A1 = 3.354016e-3
-B1 = 2.569850e-4
-C1 = 2.620131e-6
-D1 = 6.383091e-8
-
-
-# Logarithmic values of resistance
-R_NTC = thermistor
-log_NTC = np.log(R_NTC/10000)
-
-
-# Steinhart and Hart Equation
-temp_ntc = (1 / (A1 + B1 * log_NTC + C1 * log_NTC * log_NTC + D1 * log_NTC * log_NTC * log_NTC)) - 273.15
+# Steinhart and Hart Equation, see moist/conversions.py for the material constants
+temp_ntc = ntc_temperature(thermistor)
 
 '''
 Pressure to Altitude Conversion
 '''
-# CONVERSION BASED ON EQUATION FROM SCHROEDER
+# CONVERSION BASED ON EQUATION FROM SCHROEDER, relative to the pressure at the launch pad
 def altitude_calculation(pres, temp):
-    P_0 = 101036
-    P_z = pres
-    tmp = temp
-    k = 8.3144598 
-    m = 0.02896968 # [kg/mol]
-    g = 9.80665 # [m/s^2]
-    z = ((np.log(P_z) - np.log(P_0)) * k * (tmp + 274.15)) / (- m * g)
-
-    return z
+    return pad_altitude(pres, temp)
 
 # Calculating altitude based on pressure
 altitude_from_pressure = altitude_calculation(pressure, temp_ntc)
 max_altitude = max(altitude_from_pressure)
 
 '''
-Time Conversion: 
-- 14:06:14 ---- Time of Launch [58]
-- 15:09:20 ---- Time of Burst [1756]
-- 15:28:51 ---- Time of Splashdown [2276]
+Flight Phases:
+Detected from the pressure altitude, see moist/phases.py
 '''
-df = pd.DataFrame({'Time': time})
-df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S')  # Convert the 'Time' column to a datetime type
-time_fix = df['Time']
-
-#launch_time = pd.to_datetime('14:06:15', format='%H:%M:%S')
-#balloon_burst = pd.to_datetime('15:09:20', format='%H:%M:%S')
-#splashdown_time = pd.to_datetime('15:28:51', format='%H:%M:%S')
+time_fix = pd.Series(flight.times(), name='Time')  # GPS clock as datetime, unwrapped over midnight
 
-#burst_index = 1756
-#launch_index = 58
-#splashdown_index = 2276
+phases = detect_phases(flight.times(), altitude_from_pressure)
+print(phases.summary())
 
 # INDEX ANALYSIS
 pd.set_option('display.max_rows', None) 
 #print(time_fix)
 
 
-index_max = np.argmax(altitude_from_pressure)
+index_max = phases.burst
 
 
 def rssi_and_rates_plot():
     # Applying Savitzky-Golay Filter 
-    window_length = 60 # Must be an odd number
+    window_length = 61 # Must be an odd number
     poly_order = 2  # Degree of the fitting polynomial
     smoothed = savgol_filter(rssi, window_length, poly_order)
 
@@ -7,6 +7,10 @@
 // Set to 0 while capturing data
 #define DEBUG 1
 
+// Capture output format when DEBUG is 0: 1 forwards the raw packet in a
+// binary frame (see moist.h), 0 prints a CSV line for every packet
+#define BINARY_OUTPUT 0
+
 RH_RF95 rf95(CS_PIN, INT_PIN);
 
 uint8_t buf[RH_RF95_MAX_MESSAGE_LEN];
@@ -46,6 +50,13 @@ void loop() {
   if (rf95.waitAvailableTimeout(3000)) {
     uint8_t len = sizeof(buf);
     if (rf95.recv(buf, &len)) {
+      #if !DEBUG && BINARY_OUTPUT
+        // No bit strings needed, the payload goes out as it was received
+        uint8_t frame[DATA_BUDGET_SIZE + FRAME_OVERHEAD];
+        uint32_t elapsed = hour() * 3600UL + minute() * 60UL + second();
+        uint16_t frame_len = buildFrame(frame, buf, DATA_BUDGET_SIZE, elapsed, rf95.lastRssi());
+        Serial.write(frame, frame_len);
+      #else
       char bit_str_buf[DATA_BUDGET_SIZE * 8];
       bytesToBitStr(buf, DATA_BUDGET_SIZE, bit_str_buf);
       String bit_str = String(bit_str_buf);
@@ -86,7 +97,7 @@ void loop() {
         Serial.println();
       #endif
 
-      #if !DEBUG
+      #if !DEBUG && !BINARY_OUTPUT
         //Elapsed time since start
         Serial.print(hour());
         Serial.print(":");
@@ -120,7 +131,7 @@ void loop() {
         Serial.print(",");
         Serial.println(rf95.lastRssi(), DEC);
       #endif
-      
+      #endif
     }
     else {
       #if DEBUG
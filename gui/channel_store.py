@@ -0,0 +1,126 @@
+import threading
+import numpy as np
+from downsampling import MinMaxPyramid
+
+# Columnar storage for the live telemetry channels.
+#
+# Every channel gets its own preallocated, typed NumPy column next to a shared
+# sample index column. Columns grow by doubling, so appending is amortised
+# O(1), and the running extrema of each channel are kept up to date on append
+# so the plots can rescale their axes without scanning the history. A min/max
+# pyramid per channel lets the plots draw a pixel sized summary of the flight.
+
+INITIAL_CAPACITY = 4096
+
+class ChannelStore:
+    def __init__(self, channels, dtype = np.float32, capacity = INITIAL_CAPACITY):
+        # channels is either a list of names or a list of (name, dtype) pairs
+        self.names = []
+        self.dtypes = []
+        for channel in channels:
+            if(isinstance(channel, tuple)):
+                name, channel_dtype = channel
+            else:
+                name, channel_dtype = channel, dtype
+            self.names.append(name)
+            self.dtypes.append(np.dtype(channel_dtype))
+
+        self.capacity = max(1, int(capacity))
+        self.index = np.zeros(self.capacity, dtype = np.int64)
+        self.columns = [np.zeros(self.capacity, dtype = d) for d in self.dtypes]
+        self.minimum = [np.inf] * len(self.names)
+        self.maximum = [-np.inf] * len(self.names)
+        self.pyramids = [MinMaxPyramid() for _ in self.names]
+        self.count = 0
+        self.version = 0 # Bumped on every change, lets consumers skip redundant redraws
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def channel(self, name):
+        return self.names.index(name)
+
+    def _grow(self, required):
+        capacity = self.capacity
+        while(capacity < required):
+            capacity *= 2
+        # Readers may still hold views of the old buffers, they stay valid
+        index = np.zeros(capacity, dtype = np.int64)
+        index[:self.count] = self.index[:self.count]
+        self.index = index
+        for i, column in enumerate(self.columns):
+            grown = np.zeros(capacity, dtype = column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[i] = grown
+        self.capacity = capacity
+
+    def append(self, values):
+        if(len(values) != len(self.columns)):
+            raise ValueError('Expected {} values, got {}'.format(len(self.columns), len(values)))
+        with self.lock:
+            if(self.count == self.capacity):
+                self._grow(self.count + 1)
+            n = self.count
+            self.index[n] = n + 1 # Sample numbers start at 1 like the old x axis
+            for i, value in enumerate(values):
+                self.columns[i][n] = value
+                stored = self.columns[i][n]
+                if(stored < self.minimum[i]): self.minimum[i] = stored
+                if(stored > self.maximum[i]): self.maximum[i] = stored
+                self.pyramids[i].append(stored)
+            self.count = n + 1
+            self.version += 1
+
+    def extend(self, rows):
+        # rows is a 2D array like object with one row per sample
+        rows = np.asarray(rows)
+        if(not len(rows)):
+            return
+        if(rows.ndim != 2 or rows.shape[1] != len(self.columns)):
+            raise ValueError('Expected rows with {} values'.format(len(self.columns)))
+        with self.lock:
+            start = self.count
+            stop = start + len(rows)
+            if(stop > self.capacity):
+                self._grow(stop)
+            self.index[start:stop] = np.arange(start + 1, stop + 1)
+            for i, column in enumerate(self.columns):
+                column[start:stop] = rows[:, i]
+                chunk = column[start:stop]
+                # fmin/fmax skip NaN, the comparisons in append() do the same
+                self.minimum[i] = min(self.minimum[i], np.fmin.reduce(chunk))
+                self.maximum[i] = max(self.maximum[i], np.fmax.reduce(chunk))
+                self.pyramids[i].extend(chunk)
+            self.count = stop
+            self.version += 1
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+            self.minimum = [np.inf] * len(self.names)
+            self.maximum = [-np.inf] * len(self.names)
+            self.pyramids = [MinMaxPyramid() for _ in self.names]
+            self.version += 1
+
+    def view(self, channel):
+        # Views into the backing buffers, no copies are made
+        with self.lock:
+            n = self.count
+            return self.index[:n], self.columns[channel][:n]
+
+    def downsampled(self, channel, max_points):
+        # At most about max_points points that keep the spikes of the channel
+        with self.lock:
+            n = self.count
+            x, y = self.index[:n], self.columns[channel][:n]
+            return self.pyramids[channel].query(x, y, max_points)
+
+    def limits(self, channel):
+        return self.minimum[channel], self.maximum[channel]
+
+    def last(self, channel):
+        with self.lock:
+            if(not self.count):
+                return None
+            return self.columns[channel][self.count - 1]
@@ -0,0 +1,124 @@
+import numpy as np
+
+# Min/max pyramid used to plot long flights at a fixed cost.
+#
+# Level k summarises the channel in buckets of 2**(k + 1) samples and keeps the
+# minimum and maximum of each bucket together with the sample position where
+# they occurred. When drawing, the coarsest level that still gives roughly one
+# bucket per pixel is picked and every bucket contributes its min and its max
+# in time order, so short spikes stay visible no matter how far we zoom out.
+
+class _Level:
+    def __init__(self, capacity = 64):
+        self.lo = np.zeros(capacity)
+        self.hi = np.zeros(capacity)
+        self.lo_pos = np.zeros(capacity, dtype = np.int64)
+        self.hi_pos = np.zeros(capacity, dtype = np.int64)
+        self.count = 0
+        # Bucket that is still being filled from the level below
+        self.pending = None
+
+    def push(self, lo, lo_pos, hi, hi_pos):
+        if(self.count == len(self.lo)):
+            capacity = 2 * len(self.lo)
+            for name in ('lo', 'hi', 'lo_pos', 'hi_pos'):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype = old.dtype)
+                grown[:self.count] = old[:self.count]
+                setattr(self, name, grown)
+        n = self.count
+        self.lo[n] = lo
+        self.hi[n] = hi
+        self.lo_pos[n] = lo_pos
+        self.hi_pos[n] = hi_pos
+        self.count = n + 1
+
+def _merge(a, b):
+    # a and b are (lo, lo_pos, hi, hi_pos), NaN never wins over a real value
+    lo, lo_pos, hi, hi_pos = a
+    if(b[0] < lo or lo != lo):
+        lo, lo_pos = b[0], b[1]
+    if(b[2] > hi or hi != hi):
+        hi, hi_pos = b[2], b[3]
+    return (lo, lo_pos, hi, hi_pos)
+
+class MinMaxPyramid:
+    def __init__(self):
+        self.levels = [] # levels[0] has buckets of 2 samples
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        value = float(value)
+        bucket = (value, self.count, value, self.count)
+        self.count += 1
+        level = 0
+        # Each completed bucket is carried up one level, amortised O(1)
+        while(bucket is not None):
+            if(level == len(self.levels)):
+                self.levels.append(_Level())
+            current = self.levels[level]
+            if(current.pending is None):
+                current.pending = bucket
+                bucket = None
+            else:
+                merged = _merge(current.pending, bucket)
+                current.push(*merged)
+                current.pending = None
+                bucket = merged
+                level += 1
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def level_for(self, max_points):
+        # Coarsest level needed so that two points per bucket fit max_points
+        level = -1
+        size = 1
+        while(2 * -(-self.count // size) > max_points and level + 1 < len(self.levels)):
+            level += 1
+            size *= 2
+        return level
+
+    def query(self, x, y, max_points):
+        # x and y are the raw sample columns, same length as the pyramid
+        n = min(self.count, len(y))
+        max_points = max(4, int(max_points))
+        level = self.level_for(max_points)
+        if(level < 0):
+            return x[:n], y[:n]
+
+        current = self.levels[level]
+        size = 2 ** (level + 1)
+        buckets = min(current.count, n // size)
+        lo = current.lo[:buckets]
+        hi = current.hi[:buckets]
+        lo_pos = current.lo_pos[:buckets]
+        hi_pos = current.hi_pos[:buckets]
+
+        # Samples after the last complete bucket are summarised on the fly
+        tail_start = buckets * size
+        if(tail_start < n):
+            tail = np.asarray(y[tail_start:n], dtype = float)
+            if(np.isnan(tail).all()):
+                t_lo = t_hi = 0
+            else:
+                t_lo = int(np.nanargmin(tail))
+                t_hi = int(np.nanargmax(tail))
+            lo = np.append(lo, tail[t_lo])
+            hi = np.append(hi, tail[t_hi])
+            lo_pos = np.append(lo_pos, tail_start + t_lo)
+            hi_pos = np.append(hi_pos, tail_start + t_hi)
+
+        # Emit min and max of every bucket in the order they happened
+        lo_first = lo_pos <= hi_pos
+        positions = np.empty(2 * len(lo), dtype = np.int64)
+        values = np.empty(2 * len(lo))
+        positions[0::2] = np.where(lo_first, lo_pos, hi_pos)
+        positions[1::2] = np.where(lo_first, hi_pos, lo_pos)
+        values[0::2] = np.where(lo_first, lo, hi)
+        values[1::2] = np.where(lo_first, hi, lo)
+        return np.asarray(x)[positions], values
@@ -0,0 +1,198 @@
+import math
+import threading
+
+import numpy as np
+
+# Track layer for the map that stays cheap however long the flight gets.
+#
+# tkintermapview's own paths re-project and redraw their whole position list
+# on every update. TrackLayer instead keeps the track in Web Mercator
+# coordinates and splits it into chunks of CHUNK fixes. Only the newest chunk,
+# the live tail, is redrawn when fixes arrive. Once the tail is full it is
+# simplified with Douglas-Peucker to half a pixel at the current zoom and
+# frozen into its own canvas line, which is only moved when the map is
+# panned. The simplified chunks are cached per zoom level, so zooming back to
+# a level seen before only rebuilds the canvas lines from the cache.
+#
+# TrackLayer registers itself with the map widget like its own paths do, so
+# the widget calls draw() whenever the map moves or zooms. append() may be
+# called from any thread, the fixes are picked up by flush() on the Tk thread.
+
+CHUNK = 256        # Fixes per chunk
+TOLERANCE = 0.5    # Simplification tolerance in pixels
+TAG = 'path'       # Same tag as tkintermapview paths, for its z ordering
+
+def project(lat, lng):
+    # Web Mercator at zoom level 0, the world is the square [0, 1] x [0, 1]
+    lat = np.radians(np.asarray(lat, dtype = float))
+    x = (np.asarray(lng, dtype = float) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2.0
+    return x, y
+
+def douglas_peucker(x, y, tolerance):
+    # Indices of the points to keep, the first and last are always kept
+    n = len(x)
+    if(n < 3):
+        return np.arange(n)
+    keep = np.zeros(n, dtype = bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while(stack):
+        start, end = stack.pop()
+        if(end - start < 2):
+            continue
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        length = math.hypot(dx, dy)
+        if(length == 0):
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        i = int(np.argmax(distances))
+        if(distances[i] > tolerance):
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+class ZoomCache:
+    # Simplified chunks of the track at one zoom level, in tile coordinates
+    def __init__(self, zoom, tile_size):
+        self.zoom = zoom
+        self.scale = 2.0 ** zoom
+        self.tolerance = TOLERANCE / tile_size # Pixels to tiles
+        self.chunks = [] # (x, y) arrays of the frozen chunks
+
+    def extend(self, x, y, chunk_count):
+        # Simplifies the chunks the cache does not have yet, x and y are the whole track at zoom 0
+        for i in range(len(self.chunks), chunk_count):
+            start = i * CHUNK
+            end = min(len(x), start + CHUNK + 1) # Overlap by one fix so the chunks join up
+            cx = x[start:end] * self.scale
+            cy = y[start:end] * self.scale
+            kept = douglas_peucker(cx, cy, self.tolerance)
+            self.chunks.append((cx[kept], cy[kept]))
+
+class TrackLayer:
+    def __init__(self, map_widget, color = '#3E69CB', width = 9):
+        self.map_widget = map_widget
+        self.color = color
+        self.width = width
+        self.x = np.zeros(1024)
+        self.y = np.zeros(1024)
+        self.count = 0
+        self.last = None # Last (lat, lng) appended
+        self.pending = []
+        self.lock = threading.Lock()
+        self.caches = {}
+        self.frozen_items = []
+        self.tail_item = None
+        self.drawn_zoom = None
+        self.drawn_chunks = 0
+        self.last_upper_left = None
+        self.deleted = False
+        self.tag = 'track-{}'.format(id(self)) # Every canvas line of this track
+        map_widget.canvas_path_list.append(self)
+
+    def append(self, lat, lng):
+        with self.lock:
+            self.pending.append((lat, lng))
+            self.last = (lat, lng)
+
+    def __len__(self):
+        return self.count + len(self.pending)
+
+    def flush(self):
+        # Takes in the fixes appended since the last call and redraws what they changed
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+        if(not pending):
+            return
+        lat, lng = zip(*pending)
+        x, y = project(lat, lng)
+        if(self.count + len(x) > len(self.x)):
+            size = max(2 * len(self.x), self.count + len(x))
+            self.x = np.concatenate([self.x[:self.count], np.zeros(size - self.count)])
+            self.y = np.concatenate([self.y[:self.count], np.zeros(size - self.count)])
+        self.x[self.count:self.count + len(x)] = x
+        self.y[self.count:self.count + len(y)] = y
+        self.count += len(x)
+        self.draw()
+
+    def frozen_count(self):
+        # Chunks that are complete, the fixes after them make up the live tail
+        return max(0, (self.count - 1) // CHUNK)
+
+    def cache(self, zoom):
+        if(zoom not in self.caches):
+            self.caches[zoom] = ZoomCache(zoom, self.map_widget.tile_size)
+        cache = self.caches[zoom]
+        cache.extend(self.x[:self.count], self.y[:self.count], self.frozen_count())
+        return cache
+
+    def to_canvas(self, x, y):
+        widget = self.map_widget
+        tiles_wide = widget.lower_right_tile_pos[0] - widget.upper_left_tile_pos[0]
+        tiles_high = widget.lower_right_tile_pos[1] - widget.upper_left_tile_pos[1]
+        cx = (x - widget.upper_left_tile_pos[0]) / tiles_wide * widget.width
+        cy = (y - widget.upper_left_tile_pos[1]) / tiles_high * widget.height
+        return np.column_stack([cx, cy]).ravel().tolist()
+
+    def create_line(self, coords):
+        return self.map_widget.canvas.create_line(coords, width = self.width, fill = self.color,
+                                                  capstyle = 'round', joinstyle = 'round', tags = (TAG, self.tag))
+
+    def clear(self):
+        canvas = self.map_widget.canvas
+        for item in self.frozen_items:
+            canvas.delete(item)
+        if(self.tail_item is not None):
+            canvas.delete(self.tail_item)
+        self.frozen_items = []
+        self.tail_item = None
+        self.drawn_chunks = 0
+
+    def draw(self, move = False):
+        # Called by the map widget on every pan and zoom, and by flush()
+        if(self.deleted or self.count == 0):
+            return
+        widget = self.map_widget
+        zoom = round(widget.zoom)
+        if(zoom != self.drawn_zoom):
+            self.clear()
+            self.drawn_zoom = zoom
+        elif(self.last_upper_left is not None and self.last_upper_left != widget.upper_left_tile_pos):
+            # Panned, every line we have moves by the same offset
+            tiles_wide = widget.lower_right_tile_pos[0] - widget.upper_left_tile_pos[0]
+            tiles_high = widget.lower_right_tile_pos[1] - widget.upper_left_tile_pos[1]
+            dx = (self.last_upper_left[0] - widget.upper_left_tile_pos[0]) / tiles_wide * widget.width
+            dy = (self.last_upper_left[1] - widget.upper_left_tile_pos[1]) / tiles_high * widget.height
+            widget.canvas.move(self.tag, dx, dy)
+        self.last_upper_left = widget.upper_left_tile_pos
+
+        cache = self.cache(zoom)
+        for x, y in cache.chunks[self.drawn_chunks:]:
+            self.frozen_items.append(self.create_line(self.to_canvas(x, y)))
+        self.drawn_chunks = len(cache.chunks)
+
+        # The live tail, never more than CHUNK fixes
+        start = self.drawn_chunks * CHUNK
+        scale = 2.0 ** zoom
+        coords = self.to_canvas(self.x[start:self.count] * scale, self.y[start:self.count] * scale)
+        if(len(coords) == 2):
+            coords = coords * 2 # A line needs two points
+        if(self.tail_item is None):
+            self.tail_item = self.create_line(coords)
+        else:
+            widget.canvas.coords(self.tail_item, coords)
+        widget.manage_z_order()
+
+    def delete(self):
+        if(self in self.map_widget.canvas_path_list):
+            self.map_widget.canvas_path_list.remove(self)
+        self.clear()
+        self.deleted = True
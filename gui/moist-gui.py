@@ -1,24 +1,77 @@
-import serial
 import time
-from csv import writer
-import numpy as np
 import threading
 import os
+import sys
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.animation import FuncAnimation
 import tkinter as tk
 from tkinter.filedialog import asksaveasfile
-import tkintermapview
 from PIL import Image, ImageTk
-import math
 import time
-
-port = 'COM6'
-baudrate = 9600
-ser = serial.Serial(port, baudrate)
-
-event = threading.Event()
+import argparse
+import collections
+from channel_store import ChannelStore
+from render import BlitRenderer, update_panel
+from map_track import TrackLayer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')) # Shared moist package
+from moist import journal
+from moist.recording import RecordingWriter
+from moist.ingest import Ingest, SerialSource, DEFAULT_PORT, DEFAULT_BAUDRATE
+from moist.metrics import PipelineStats
+from moist.replay import ReplaySource
+from moist.pubsub import DaemonSource, parse_address
+from moist.stations import StationMerger, DEFAULT_WINDOW
+from moist.link import LinkQuality
+from moist.geodesy import Observer
+from moist.conversions import barometric_altitude, ntc_temperature, pad_altitude
+from moist.telemetry import HEADER, format_packet, hms_to_seconds
+from moist.velocity import VerticalVelocity
+from moist.tiles import TileStore, DEFAULT_URL
+from tile_cache import CachedMapView
+from sample_queue import SampleQueue, DEFAULT_CAPACITY
+
+parser = argparse.ArgumentParser(description = 'MOIST ground station')
+parser.add_argument('--render', choices = ['blit', 'classic'], default = 'blit',
+                    help = 'blit draws every graph in one figure and only when new data arrives, classic keeps one animated figure per graph')
+parser.add_argument('--port', action = 'append', help = 'serial port of a ground station receiver, repeat it for every station (default {})'.format(DEFAULT_PORT))
+parser.add_argument('--baud', type = int, default = DEFAULT_BAUDRATE, help = 'baud rate of the receiver')
+parser.add_argument('--format', choices = ['csv', 'binary'], default = 'csv', help = 'output format of the receiver, see BINARY_OUTPUT in receiver.ino')
+parser.add_argument('--journal-dir', default = 'journal', help = 'directory of the flight journal that records every received line')
+parser.add_argument('--segment-minutes', type = float, default = 60, help = 'start a new journal segment after this many minutes')
+parser.add_argument('--segment-mb', type = float, default = 64, help = 'start a new journal segment after this many megabytes')
+parser.add_argument('--flush-interval', type = float, default = 1.0, help = 'seconds between journal flushes')
+parser.add_argument('--fsync', choices = journal.FSYNC_POLICIES, default = journal.FSYNC_SEGMENT, help = 'when the journal is forced to disk')
+parser.add_argument('--compress', action = 'store_true', help = 'gzip closed journal segments')
+parser.add_argument('--replay', metavar = 'PATH', action = 'append', help = 'replay a CSV log or binary recording instead of reading a receiver, repeat it for every station')
+parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed, 1 is real time and 0 as fast as possible')
+parser.add_argument('--jitter', type = float, default = 0, help = 'random delay per replayed line in seconds')
+parser.add_argument('--drop', type = float, default = 0, help = 'probability of dropping a replayed line')
+parser.add_argument('--corrupt', type = float, default = 0, help = 'probability of corrupting a replayed line')
+parser.add_argument('--seed', type = int, default = None, help = 'random seed of the replay')
+parser.add_argument('--loop', action = 'store_true', help = 'start the replay over when it ends')
+parser.add_argument('--daemon', metavar = 'HOST:PORT', help = 'view the samples of a running python -m moist.daemon instead of reading a receiver')
+parser.add_argument('--queue-size', type = int, default = DEFAULT_CAPACITY, help = 'packets waiting for the display before new ones are dropped from it')
+parser.add_argument('--tile-cache', default = 'tiles.db', help = 'map tile database, fill it before the trip with python -m moist.tiles seed')
+parser.add_argument('--tile-url', default = DEFAULT_URL, help = 'tile server of the map, with {z}, {x} and {y} in it')
+parser.add_argument('--offline', action = 'store_true', help = 'only show cached map tiles, never fetch them')
+parser.add_argument('--merge-window', type = int, default = DEFAULT_WINDOW, help = 'packet ids kept open for copies from other stations')
+args = parser.parse_args()
+if(args.daemon and args.format == 'binary'):
+    parser.error('--format binary is for a receiver, the daemon already decodes the frames of its receivers')
+
+def openJournal(directory):
+    return journal.Journal(directory,
+                           segment_seconds = args.segment_minutes * 60,
+                           segment_bytes = int(args.segment_mb * 1024 * 1024),
+                           flush_interval = args.flush_interval,
+                           fsync = args.fsync,
+                           compress = args.compress).start()
+
+# Every line from the receiver goes to the journal, the Record button only marks regions of it.
+# A daemon journals and records the flight itself, viewing it records nothing locally.
+flight_journal = None if args.daemon else openJournal(args.journal_dir)
 
 ALTITUDE = 0
 PRESSURE = 1
@@ -27,9 +80,20 @@ HUMIDITY = 3
 CO2 = 4
 TEMPERATURE = 5
 
-data = [[], [], [], [], [], []]
+CHANNELS = ['altitude', 'pressure', 'ntc', 'humidity', 'co2', 'temperature']
+
+store = ChannelStore(CHANNELS)
+# Packet rate and the time from a packet arriving to it being drawn
+pipeline_stats = PipelineStats()
+undrawn = collections.deque() # Arrival times of packets not drawn yet
+# Packets from the data thread to the Tk thread, drained in batches every DRAIN_INTERVAL ms
+samples = SampleQueue(args.queue_size)
+DRAIN_INTERVAL = 50
 file = ''
 recording = False
+record_start = None
+record_output = None # With --daemon the Record button writes the lines straight to the file
+record_lock = threading.Lock()
 
 elapsed_time = 'Elapsed time: -'
 tilt_gps = 'GPS based tilt: -'
@@ -37,15 +101,14 @@ tilt_pressure = 'Pressure based tilt: -'
 rssi = 'RSSI: -'
 ntc_temp = 0.0
 bearing = 0
+# Smoothed pressure altitude and vertical rate, the filter the analysis scripts use after the flight
+velocity = VerticalVelocity()
+vertical_rate = float('nan')
+skipped_samples = 0 # Packets the Tk thread could not apply
 
 starting_pos = (69.296011, 16.028944) # Starting position of Cansat
 operator_pos = (69.296049, 16.030619) # Starting position of operator
-
-# NTC Material constants
-A1 = 3.354016e-3
-B1 = 2.569850e-4
-C1 = 2.620131e-6
-D1 = 6.383091e-8
+operator = Observer(*operator_pos)
 
 app = tk.Tk()
 app.title('MOIST')
@@ -56,12 +119,16 @@ container_frame.pack(fill = 'both', expand = True)
 map_label = tk.Label(container_frame)
 map_label.pack(side = 'right')
 
-line = [starting_pos, starting_pos]
 op_can_line = [operator_pos, starting_pos]
-map_widget = tkintermapview.TkinterMapView(map_label, width = 600, height = 800, corner_radius = 0)
+# Tiles come from memory and the tile database first, the network only for tiles it does not have
+tile_store = TileStore(args.tile_cache)
+map_widget = CachedMapView(map_label, width = 600, height = 800, corner_radius = 0, tile_store = tile_store, offline = args.offline)
+map_widget.set_tile_server(args.tile_url)
 map_widget.set_position(69.296177, 16.030525)
 marker = map_widget.set_marker(69.296177, 16.030525, 'Cansat')
-path = map_widget.set_path(line)
+# Only the newest part of the track is redrawn, older parts are simplified and cached per zoom
+track = TrackLayer(map_widget)
+track.append(*starting_pos)
 op_can_path = map_widget.set_path(op_can_line, color = 'red')
 map_widget.set_zoom(10)
 map_widget.pack()
@@ -90,12 +157,21 @@ tilt_pressure_label.pack()
 rssi_label = tk.Label(menu_frame, text = rssi, background = 'white', font = ('Arial', 15))
 rssi_label.pack()
 
+link_label = tk.Label(menu_frame, text = 'Link: -', background = 'white', font = ('Arial', 15))
+link_label.pack()
+
 ntc_temp_label = tk.Label(menu_frame, text = 'NTC Temperature: -', background = 'white', font = ('Arial', 15))
 ntc_temp_label.pack()
 
 bearing_label = tk.Label(menu_frame, text = 'Bearing: -', background = 'white', font = ('Arial', 15))
 bearing_label.pack()
 
+vertical_rate_label = tk.Label(menu_frame, text = 'Vertical rate: -', background = 'white', font = ('Arial', 15))
+vertical_rate_label.pack()
+
+ingest_label = tk.Label(menu_frame, text = 'Ingest: -', background = 'white', font = ('Arial', 15))
+ingest_label.pack()
+
 def save():
     global file
     files = [('Text file', '*.txt')]
@@ -111,12 +187,40 @@ start_recording_icon = ImageTk.PhotoImage(image = start_recording_image)
 stop_recording_image = Image.open('./assets/icons8-pause-squared-30.png')
 stop_recording_icon = ImageTk.PhotoImage(image = stop_recording_image)
 
+def exportRecording(path, start):
+    if(multi_station):
+        # Let the last packets of the region collect their copies from every station
+        time.sleep(merger.max_age)
+        merger.expire()
+    flight_journal.sync()
+    journal.export(args.journal_dir, path, start)
+
+def recordDirectly(start):
+    # Without a local journal the lines received while recording go to the file as they come
+    global record_output
+    with record_lock:
+        if(start and file):
+            record_output = open(file, 'a', newline = '')
+            if(record_output.tell() == 0):
+                record_output.write(HEADER + '\n')
+        elif(record_output is not None):
+            record_output.close()
+            record_output = None
+
 def updateRecording():
-    global recording
+    global recording, record_start
     recording = not recording
-    if(recording):
+    if(flight_journal is None):
+        recordDirectly(recording)
+        recording_btn.configure(image = stop_recording_icon if recording else start_recording_icon)
+    elif(recording):
+        record_start = flight_journal.mark(journal.RECORD_START)
         recording_btn.configure(image = stop_recording_icon)
     else:
+        flight_journal.mark(journal.RECORD_STOP)
+        if(file):
+            # Copy the marked region out of the journal without blocking the UI
+            threading.Thread(target = exportRecording, args = (file, record_start), daemon = True).start()
         recording_btn.configure(image = start_recording_icon)
 
 recording_btn = tk.Button(menu_frame, command = lambda: updateRecording(), image = start_recording_icon, background = 'white')
@@ -127,113 +231,142 @@ recording_icon = ImageTk.PhotoImage(image = recording_image)
 recording_label = tk.Label(menu_frame, image = recording_icon, background = 'white')
 recording_label.pack(side = 'left')
 
-def ntc_ohms_to_temp(ntc_ohms):
-    # Logarithmic values of resistance
-    log_NTC = np.log(ntc_ohms/10000)
-    # Steinhart and Hart Equation
-    temp = (1 / (A1 + B1 * log_NTC + C1 * log_NTC * log_NTC + D1 * log_NTC * log_NTC * log_NTC)) - 273.15
-    return temp
-
-# As specified in the Andøya Cansat handbook
-def calcAltitude(temp, p):
-    pb = 101325 # Starting pressure (Pa)
-    hb = 1 # Starting altitude
-    tb = temp + 273.15 # Starting temperature in celsius
-    lb = -0.0065 # Temperature gradient
-    R = 287.06 # Specific gas constant
-    g = 9.80665 # Gravitational constant
-    return hb + (tb/lb) * ((p/pb)**((-R*lb)/(g)) - 1)
-
-# Graciously provided by the TUMOR group
-def distance(current_lat, current_lng):  # returns distance in meters
-    op_lat, op_lng = operator_pos
-    op_lat = math.radians(op_lat)
-    op_lng = math.radians(op_lng)
-    current_lat = math.radians(current_lat)
-    current_lng = math.radians(current_lng)
-
-    diff_lon = current_lng - op_lng
-    diff_lat = current_lat - op_lat
-
-    a = math.sin(diff_lat / 2) ** 2 + math.cos(op_lat) * math.cos(current_lat) * math.sin(diff_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = 6371 * c  # Earth radius * angle between the two points
-
-    return distance * 1000
-
-def calcTilt(alt, lat, lng):
-     current_distance = distance(lat, lng)
-     return math.degrees(math.atan2(alt, current_distance))
-
-def calcBearing(current_lat, current_lng):
-    op_lat, op_lng = operator_pos
-    # degrees to radians
-    op_lat = math.radians(op_lat)
-    op_lng = math.radians(op_lng)
-    current_lat = math.radians(current_lat)
-    current_lng = math.radians(current_lng)
-
-    diff_lon = current_lng - op_lng
-
-    # Calculate the angle
-    x = math.sin(diff_lon) * math.cos(current_lat)
-    y = math.cos(op_lat) * math.sin(current_lat) - (
-        math.sin(op_lat) * math.cos(current_lat) * math.cos(diff_lon)
+def journalLine(received, received_at, name):
+    if(flight_journal is None):
+        with record_lock:
+            if(record_output is not None and received.count(',') == HEADER.count(',')):
+                record_output.write(received + '\n')
+    elif(multi_station):
+        # Raw lines per station, the flight journal gets the best copy of every packet
+        station_journals[name].write(received, received_at)
+    else:
+        flight_journal.write(received, received_at)
+
+def dataHandling(packet, received_at, station):
+    # Data thread, everything the Tk thread shows goes through the sample queue.
+    # The plots get the first copy of a packet, they do not wait for the other stations.
+    link.update(packet.id, packet.rssi)
+    pipeline_stats.received(received_at)
+    samples.put((packet, received_at))
+    # After the sample is on its way, a packet the recording can not hold is still shown
+    if(not multi_station and flight_recording is not None):
+        recordPacket(packet)
+
+def recordPacket(packet, station = None):
+    # Out of range values are counted in flight_recording.rejected
+    try:
+        flight_recording.append_packet(packet, station)
+    except ValueError:
+        pass
+
+def applyPacket(packet):
+    # Tk thread, the per packet work of applySamples, returns the row for the store
+    global vertical_rate
+    if(packet.lat != 0 and packet.lng != 0):
+        track.append(packet.lat, packet.lng)
+    # Every packet, not just the newest, the filter needs the whole series. The altitude
+    # over the pad is the one the analysis scripts use, so the rates are the same there.
+    altitude = pad_altitude(packet.pressure, ntc_temperature(packet.ohm))
+    vertical_rate = velocity.update(hms_to_seconds(packet.time), altitude)[1]
+    return (
+        packet.alt,      # ALTITUDE
+        packet.pressure, # PRESSURE
+        packet.ohm,      # NTC
+        packet.hum,      # HUMIDITY
+        packet.co2,      # CO2
+        packet.temp      # TEMPERATURE
     )
 
-    bearing = math.atan2(x, y)
-    return math.degrees(bearing)
-
-
-def dataHandling():
-    while (True):
-        try:
-            if(not ser.is_open): ser.open() # handle reconnect
-            if(ser.in_waiting):
-                temp = ser.read_until(b'\r').decode().strip().split(',')
-                if(len(temp) > 1):
-                    if(os.path.isfile(file) and recording):    
-                        with open(file, 'a', newline='') as f_object:
-                            writer_object = writer(f_object)
-                            writer_object.writerow(temp)
-                            f_object.close()
-                    
-                    global elapsed_time, rssi, tilt_gps, tilt_pressure, op_can_path, ntc_temp, bearing
-                    elapsed_time = temp[0]
-                    rssi = temp[11]
-
-                    ntc_temp = ntc_ohms_to_temp(float(temp[7]))
-                    
-                    lat = float(temp[4])
-                    lng = float(temp[5])
-
-                    bearing = calcBearing(lat, lng)
-
-                    op_can_line[-1] = (lat, lng)
-
-                    if(lat != 0 and lng != 0):
-                        line.append([lat, lng])
-                        tilt_gps = calcTilt(float(temp[3]), lat, lng)
-                        tilt_pressure = calcTilt(calcAltitude(float(temp[7]), float(temp[6])), lat, lng)
-
-                    data[ALTITUDE].append(float(temp[3]))
-                    data[PRESSURE].append(float(temp[6]))
-                    data[NTC].append(float(temp[7]))
-                    data[HUMIDITY].append(float(temp[8]))
-                    data[CO2].append(float(temp[9]))
-                    data[TEMPERATURE].append(float(temp[10]))
-        except serial.SerialException as se:
-            ser.close() # handle disconnect
-
-        if(event.is_set()):
-            break
-
-        time.sleep(0.01)
-
-data_thread = threading.Thread(target = dataHandling)
-data_thread.start()
+def applySamples():
+    # Tk thread, applies every waiting sample in one pass, the labels show the newest.
+    # A packet that fails is skipped, the drain is always scheduled again.
+    global elapsed_time, rssi, tilt_gps, tilt_pressure, ntc_temp, bearing, skipped_samples
+    try:
+        rows = []
+        newest = None
+        for packet, received_at in samples.drain():
+            try:
+                rows.append(applyPacket(packet))
+            except Exception:
+                skipped_samples += 1
+                continue
+            newest = packet
+            undrawn.append(received_at)
+        store.extend(rows)
+        if(newest is not None):
+            # The labels show the newest packet that applied
+            packet = newest
+            elapsed_time = packet.elapsed_time
+            rssi = str(packet.rssi)
+            ntc_temp = ntc_temperature(packet.ohm)
+            lat = packet.lat
+            lng = packet.lng
+            bearing = operator.bearing(lat, lng)
+            op_can_line[-1] = (lat, lng)
+            if(lat != 0 and lng != 0):
+                tilt_gps = operator.elevation(packet.alt, lat, lng)
+                # As specified in the Andøya Cansat handbook, from a starting altitude of 1 m
+                tilt_pressure = operator.elevation(barometric_altitude(packet.pressure, ntc_temp, h0 = 1), lat, lng)
+    finally:
+        app.after(DRAIN_INTERVAL, applySamples)
+
+def packetsDrawn():
+    now = time.time()
+    while(undrawn):
+        pipeline_stats.delivered(undrawn.popleft(), now)
+
+def finalPacket(packet, station, received_at):
+    # Best copy of a packet once every station had the chance to deliver it
+    if(multi_station):
+        flight_journal.write(format_packet(packet), received_at)
+        recordPacket(packet, station)
+
+# One reader per station, each blocks on its port in the background, reconnects
+# by itself and skips lines that do not parse. The merger drops the duplicates.
+if(args.daemon):
+    # The daemon owns the receivers, closing this window does not stop the capture
+    sources = [DaemonSource(*parse_address(args.daemon))]
+elif(args.replay):
+    sources = [ReplaySource(path, args.speed, args.jitter, args.drop, args.corrupt, args.seed, loop = args.loop) for path in args.replay]
+else:
+    sources = [SerialSource(port, args.baud) for port in args.port or [DEFAULT_PORT]]
+multi_station = len(sources) > 1
+station_journals = {source.name: openJournal(journal.station_directory(args.journal_dir, source.name)) for source in sources} if multi_station else {}
+# Binary copy of every telemetry packet next to the journal, with several stations tagged with the one that delivered it
+flight_recording = None if args.daemon else RecordingWriter(os.path.join(args.journal_dir, 'flight-{}.mrec'.format(int(time.time()))),
+                                                            stations = [source.name for source in sources] if multi_station else None)
+merger = StationMerger(on_packet = dataHandling, on_final = finalPacket, window = args.merge_window)
+# Packet loss and RSSI of the merged stream and of every station on its own
+link = LinkQuality()
+station_links = {source.name: LinkQuality() for source in sources}
+
+def stationPacket(name, packet, received_at):
+    station_links[name].update(packet.id, packet.rssi)
+    merger.offer(name, packet, received_at)
+
+ingests = []
+for source in sources:
+    ingests.append(Ingest(source,
+                          on_packet = lambda packet, received_at, name = source.name: stationPacket(name, packet, received_at),
+                          on_line = lambda line, received_at, name = source.name: journalLine(line, received_at, name),
+                          binary = args.format == 'binary'))
+for ingest in ingests:
+    ingest.start()
+applySamples()
 
 canvas_pool = []
+animations = []
+renderer = None
+
+# (title, xlabel, ylabel, color, channel), first three go on the top row
+PANELS = [
+    ('SCD30', 'Readings', 'Temperature ($^\circ$C)', 'r', TEMPERATURE),
+    ('SCD30', 'Readings', 'Relative humidity (%)', 'g', HUMIDITY),
+    ('SCD30', 'Readings', '$CO_{2}$ (ppm)', 'b', CO2),
+    ('NTC', 'Readings', 'Resistance ($\Omega$)', 'c', NTC),
+    ('BMP-280', 'Readings', 'Pressure (Pa)', 'y', PRESSURE),
+    ('BN-880', 'Readings', 'Altitude (m)', 'm', ALTITUDE)
+]
 
 def createFigure(title = '', xlabel = '', ylabel = '', color = 'g', parent_frame = None):
     fig, ax = plt.subplots()
@@ -247,52 +380,69 @@ def createFigure(title = '', xlabel = '', ylabel = '', color = 'g', parent_frame
     canvas_pool.append(canvas)
     return (fig, ax, graph)
 
-fig_temp, ax_temp, graph_temp = createFigure('SCD30', 'Readings', 'Temperature ($^\circ$C)', 'r', top_graphs_frame)
-fig_rh, ax_rh, graph_rh = createFigure('SCD30', 'Readings', 'Relative humidity (%)', 'g', top_graphs_frame)
-fig_co2, ax_co2, graph_co2 = createFigure('SCD30', 'Readings', '$CO_{2}$ (ppm)', 'b', top_graphs_frame)
-fig_ntc, ax_ntc, graph_ntc = createFigure('NTC', 'Readings', 'Resistance ($\Omega$)', 'c', bottom_graphs_frame)
-fig_pressure, ax_pressure, graph_pressure = createFigure('BMP-280', 'Readings', 'Pressure (Pa)', 'y', bottom_graphs_frame)
-fig_alt, ax_alt, graph_alt = createFigure('BN-880', 'Readings', 'Altitude (m)', 'm', bottom_graphs_frame)
-
 def update(frame, ax, graph, INDEX):
-    if(data[INDEX]):
-        x = np.arange(start = 1, stop = len(data[INDEX]) + 1, step = 1)
-        ax.set_xlim(1, len(data[INDEX]) + 1)
-        ax.set_ylim(min(data[INDEX]) - 1, max(data[INDEX]) + 1)
-        graph.set_xdata(x)
-        graph.set_ydata(data[INDEX])
-
-anim_temp = FuncAnimation(fig_temp, update, cache_frame_data = False, fargs = (ax_temp, graph_temp, TEMPERATURE,))
-anim_hum = FuncAnimation(fig_rh, update, cache_frame_data = False, fargs = (ax_rh, graph_rh, HUMIDITY,))
-anim_co2 = FuncAnimation(fig_co2, update, cache_frame_data = False, fargs = (ax_co2, graph_co2, CO2,))
-anim_ntc = FuncAnimation(fig_ntc, update, cache_frame_data = False, fargs=(ax_ntc, graph_ntc, NTC,))
-anim_pressure = FuncAnimation(fig_pressure, update, cache_frame_data = False, fargs=(ax_pressure, graph_pressure, PRESSURE,))
-anim_alt = FuncAnimation(fig_alt, update, cache_frame_data = False, fargs=(ax_alt, graph_alt, ALTITUDE,))
+    if(len(store)):
+        update_panel(ax, graph, store, INDEX)
+        if(INDEX == PANELS[-1][4]): # The last figure of a frame
+            packetsDrawn()
+
+if(args.render == 'blit'):
+    # One figure, one timer, blitting only when new samples have arrived
+    renderer = BlitRenderer(graphs_container, store, PANELS, on_frame = packetsDrawn)
+    canvas_pool.append(renderer.canvas)
+    renderer.start()
+else:
+    # Six independent figures that redraw fully on every frame
+    for i, (title, xlabel, ylabel, color, channel) in enumerate(PANELS):
+        parent_frame = top_graphs_frame if i < 3 else bottom_graphs_frame
+        fig, ax, graph = createFigure(title, xlabel, ylabel, color, parent_frame)
+        animations.append(FuncAnimation(fig, update, cache_frame_data = False, fargs = (ax, graph, channel,)))
 
 def cleanup():
+    if(renderer is not None):
+        renderer.stop()
     plt.close('all')
     for canvas in canvas_pool:
         canvas.stop_event_loop()
     map_widget.destroy()
-    event.set()
-    data_thread.join()
+    tile_store.close()
+    for ingest in ingests:
+        ingest.stop()
+    for ingest in ingests:
+        ingest.join()
+    merger.flush()
+    if(flight_journal is not None):
+        flight_journal.close()
+        flight_recording.close()
+    for station_journal in station_journals.values():
+        station_journal.close()
+    recordDirectly(False)
     app.destroy()
 
 def updateLabels():
     time_elapsed_label.configure(text = 'Elapsed time: ' + elapsed_time)
-    rssi_label.configure(text = 'RSSI: ' + rssi + ' dbm')
+    if(multi_station):
+        rssi_label.configure(text = 'RSSI: ' + ', '.join('{} {}'.format(name, value) for name, value in merger.rssi().items()) + ' dbm')
+    else:
+        rssi_label.configure(text = 'RSSI: ' + rssi + ' dbm')
+    link_text = 'Link: ' + link.summary()
+    if(multi_station):
+        link_text += '\n' + ', '.join('{} {:.0f}% lost'.format(name, 100 * station.loss(station.windows[1])) for name, station in station_links.items())
+    link_label.configure(text = link_text)
     ntc_temp_label.configure(text = 'NTC Temperature: ' + str(ntc_temp) + u'\N{DEGREE SIGN}' + 'C')
     tilt_gps_label.configure(text = 'GPS based tilt: ' + str(tilt_gps) + u'\N{DEGREE SIGN}')
     tilt_pressure_label.configure(text = 'Pressure based tilt: ' + str(tilt_pressure) + u'\N{DEGREE SIGN}')
     bearing_label.configure(text = 'Bearing: ' + str(bearing) + u'\N{DEGREE SIGN}')
+    vertical_rate_label.configure(text = 'Vertical rate: -' if vertical_rate != vertical_rate else 'Vertical rate: {:+.1f} m/s'.format(vertical_rate))
+    ingest_label.configure(text = 'Ingest: ' + pipeline_stats.summary() + ', ' + str(sum(ingest.stats.rejected for ingest in ingests)) + ' rejected, ' + str(merger.duplicates) + ' duplicates, ' + str(skipped_samples) + ' skipped, ' + str(flight_recording.rejected if flight_recording is not None else 0) + ' unrecorded, ' + samples.summary())
     time_elapsed_label.after(1000, func = updateLabels)
 updateLabels()
 
 def updateMap():
-    lat, lng = line[-1]
+    track.flush()
+    lat, lng = track.last
     marker.set_position(lat, lng)
     marker.set_text('Cansat\nlat: ' + str(lat) + '\nlng: ' + str(lng))
-    path.set_position_list(line)
     op_can_path.set_position_list(op_can_line)
     map_widget.after(1000, func = updateMap)
 updateMap()
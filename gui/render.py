@@ -0,0 +1,124 @@
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+# Single figure render engine for the live plots.
+#
+# All channels share one figure, one canvas and one Tk timer. The static parts
+# of every panel (frame, ticks, labels) are rendered once and cached, each tick
+# only restores those backgrounds and blits the lines on top. Nothing at all is
+# drawn when the store has not changed since the last tick, and a full redraw
+# only happens when a panel has to change its axis limits.
+#
+# The per frame work of both render modes lives here, update_panel() for the
+# classic figures and BlitRenderer.render() for the blit mode. Without a
+# parent frame the renderer draws into an Agg canvas instead of Tk, so the
+# benchmarks time the very code the GUI runs, headless.
+
+# Extra room given to the axes when data leaves the current limits, so the
+# ticks are not redrawn for every new sample
+HEADROOM = 0.25
+
+def update_panel(ax, graph, store, channel):
+    # One panel of the classic mode, the figure is redrawn in full afterwards
+    # Draw about two points per horizontal pixel, however long the flight is
+    x, y = store.downsampled(channel, 2 * ax.bbox.width)
+    low, high = store.limits(channel)
+    ax.set_xlim(1, len(store) + 1)
+    if(low <= high): # Channels that only received NaN have no limits yet
+        ax.set_ylim(low - 1, high + 1)
+    graph.set_data(x, y)
+
+class BlitRenderer:
+    def __init__(self, parent_frame, store, panels, rows = 2, interval = 200, on_frame = None):
+        # panels is a list of (title, xlabel, ylabel, color, channel),
+        # on_frame() is called whenever new samples have made it to the screen.
+        # parent_frame None renders into memory, for the benchmarks.
+        self.store = store
+        self.interval = interval
+        self.on_frame = on_frame
+        self.version = -1
+        self.after_id = None
+
+        columns = -(-len(panels) // rows)
+        self.fig, axes = plt.subplots(rows, columns, squeeze = False)
+        self.fig.set_size_inches(4.4 * columns, 4 * rows)
+        self.panels = []
+        for (title, xlabel, ylabel, color, channel), ax in zip(panels, axes.flat):
+            ax.set_title(title + ' ' + ylabel)
+            ax.set_xlabel(xlabel)
+            graph = ax.plot([], [], color = color, animated = True)[0]
+            self.panels.append((ax, graph, channel))
+        for ax in list(axes.flat)[len(panels):]:
+            ax.set_visible(False)
+        self.fig.tight_layout()
+
+        self.backgrounds = []
+        self.canvas = FigureCanvasAgg(self.fig) if parent_frame is None else FigureCanvasTkAgg(self.fig, parent_frame)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.draw()
+        if(parent_frame is not None):
+            self.canvas.get_tk_widget().pack(side = 'left', fill = 'both', expand = True)
+
+    def on_draw(self, event):
+        # Runs after every full draw (first show, resize, limit change)
+        self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax, _, _ in self.panels]
+        for ax, graph, _ in self.panels:
+            ax.draw_artist(graph)
+
+    def start(self):
+        self.after_id = self.canvas.get_tk_widget().after(self.interval, self.tick)
+
+    def stop(self):
+        if(self.after_id is not None):
+            self.canvas.get_tk_widget().after_cancel(self.after_id)
+            self.after_id = None
+        plt.close(self.fig)
+
+    def limits_for(self, ax, channel, n):
+        # Returns new limits or None when the current ones still fit the data
+        low, high = self.store.limits(channel)
+        xmin, xmax = ax.get_xlim()
+        ymin, ymax = ax.get_ylim()
+        new_xlim = None
+        new_ylim = None
+        if(n + 1 > xmax):
+            new_xlim = (1, max(10, (n + 1) * (1 + HEADROOM)))
+        if(low <= high and (low - 1 < ymin or high + 1 > ymax)):
+            margin = (high - low) * HEADROOM / 2 + 1
+            new_ylim = (low - margin, high + margin)
+        return new_xlim, new_ylim
+
+    def tick(self):
+        self.after_id = self.canvas.get_tk_widget().after(self.interval, self.tick)
+        if(self.render() and self.on_frame is not None):
+            self.on_frame()
+
+    def render(self):
+        # Brings the canvas up to date with the store, returns False when there was nothing new
+        version = self.store.version
+        n = len(self.store)
+        if(version == self.version or not n):
+            return False
+        self.version = version
+
+        relimit = False
+        for ax, graph, channel in self.panels:
+            x, y = self.store.downsampled(channel, 2 * ax.bbox.width)
+            graph.set_data(x, y)
+            new_xlim, new_ylim = self.limits_for(ax, channel, n)
+            if(new_xlim is not None):
+                ax.set_xlim(*new_xlim)
+                relimit = True
+            if(new_ylim is not None):
+                ax.set_ylim(*new_ylim)
+                relimit = True
+
+        if(relimit or len(self.backgrounds) != len(self.panels)):
+            self.canvas.draw() # on_draw() recaches the backgrounds and draws the lines
+        else:
+            for (ax, graph, _), background in zip(self.panels, self.backgrounds):
+                self.canvas.restore_region(background)
+                ax.draw_artist(graph)
+                self.canvas.blit(ax.bbox)
+        return True
@@ -0,0 +1,70 @@
+# Bounded single producer, single consumer queue between the data thread and
+# the Tk thread.
+#
+# The ring is a preallocated list with two counters. Only the producer moves
+# the tail and only the consumer moves the head, and each side publishes its
+# counter after it is done with the slots, so under the GIL neither side needs
+# a lock. When the ring is full the new sample is dropped and counted rather
+# than blocking the reader of the serial port; the Tk side catches up in one
+# drain() however many samples are waiting.
+#
+# Exactly one thread may call put() and exactly one may call drain(). The
+# station merger already serialises the packets of every station, so its
+# callback is the one producer.
+
+DEFAULT_CAPACITY = 4096
+
+class SampleQueue:
+    def __init__(self, capacity = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0 # Next slot to read, only the consumer moves it
+        self.tail = 0 # Next slot to write, only the producer moves it
+        self.dropped = 0
+        self.put_count = 0
+        self.drained = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def put(self, item):
+        # Producer side, False when the queue was full and the item is dropped
+        depth = self.tail - self.head
+        if(depth >= self.capacity):
+            self.dropped += 1
+            return False
+        self.slots[self.tail % self.capacity] = item
+        self.tail += 1
+        self.put_count += 1
+        if(depth + 1 > self.high_water):
+            self.high_water = depth + 1
+        return True
+
+    def drain(self, limit = None):
+        # Consumer side, every waiting item in order, at most limit of them
+        head = self.head
+        tail = self.tail
+        if(limit is not None):
+            tail = min(tail, head + limit)
+        if(tail == head):
+            return []
+        start = head % self.capacity
+        end = tail % self.capacity
+        if(start < end):
+            items = self.slots[start:end]
+            self.slots[start:end] = [None] * (end - start)
+        else:
+            items = self.slots[start:] + self.slots[:end]
+            self.slots[start:] = [None] * (self.capacity - start)
+            self.slots[:end] = [None] * end
+        self.head = tail
+        self.drained += len(items)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(items))
+        return items
+
+    def summary(self):
+        return 'queue {}/{} (peak {}), {} dropped'.format(len(self), self.capacity, self.high_water, self.dropped)
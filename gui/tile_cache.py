@@ -0,0 +1,45 @@
+import io
+
+import PIL
+from PIL import Image, ImageTk
+import tkintermapview
+
+from moist.tiles import fetch, tile_url
+
+# Map widget that takes its tiles from a moist.tiles.TileStore.
+#
+# tkintermapview loads tiles on its own background threads through
+# request_image(). CachedMapView replaces that method: a tile comes from the
+# store's memory, then from its database, and only when both miss is it
+# fetched from the tile server and written to the store for the next time.
+# With offline set the network is never touched and missing tiles stay blank,
+# so a store seeded with `python -m moist.tiles seed` is all the map needs on
+# the launch site.
+
+class CachedMapView(tkintermapview.TkinterMapView):
+    def __init__(self, *args, tile_store = None, offline = False, **kwargs):
+        self.tile_store = tile_store
+        self.offline = offline
+        self.fetched = 0
+        super().__init__(*args, **kwargs)
+
+    def request_image(self, zoom, x, y, db_cursor = None):
+        if(self.tile_store is None):
+            return super().request_image(zoom, x, y, db_cursor = db_cursor)
+        data = self.tile_store.get(self.tile_server, zoom, x, y)
+        if(data is None and not self.offline):
+            try:
+                data = fetch(tile_url(self.tile_server, zoom, x, y))
+            except (OSError, ValueError):
+                return self.empty_tile_image # No network, try again when the tile is next needed
+            if(data is not None):
+                self.tile_store.put(self.tile_server, zoom, x, y, data)
+                self.fetched += 1
+        if(data is None or not self.running):
+            return self.empty_tile_image
+        try:
+            image_tk = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+        except PIL.UnidentifiedImageError:
+            image_tk = self.empty_tile_image
+        self.tile_image_cache[f'{zoom}{x}{y}'] = image_tk
+        return image_tk
@@ -75,6 +75,36 @@ void floatToBytes(uint8_t* bf, float val, uint8_t len) {
   }
 }
 
+uint16_t crc16(const uint8_t* data, uint16_t len) {
+  uint16_t crc = 0xFFFF;
+  for(uint16_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for(uint8_t j = 0; j < 8; j++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+uint16_t buildFrame(uint8_t* frame, const uint8_t* payload, uint8_t len, uint32_t elapsed, int16_t rssi) {
+  uint16_t i = 0;
+  frame[i++] = FRAME_SYNC_0;
+  frame[i++] = FRAME_SYNC_1;
+  frame[i++] = len;
+  memcpy(frame + i, payload, len);
+  i += len;
+  frame[i++] = elapsed >> 24;
+  frame[i++] = elapsed >> 16;
+  frame[i++] = elapsed >> 8;
+  frame[i++] = elapsed & 0xff;
+  frame[i++] = (uint16_t)rssi >> 8;
+  frame[i++] = (uint16_t)rssi & 0xff;
+  uint16_t crc = crc16(frame + 2, i - 2);
+  frame[i++] = crc >> 8;
+  frame[i++] = crc & 0xff;
+  return i;
+}
+
 void printBytes(uint8_t* bytes, uint8_t len) {
   for(uint8_t i = 0; i < len; i++) {
     printBitsFromByte(bytes[i]);
@@ -24,6 +24,14 @@
 
 #define DATA_BUDGET_SIZE 34
 
+// Binary frame sent from the receiver to the ground station software:
+// sync (2) | payload length (1) | payload | elapsed seconds (4) | RSSI (2) | CRC-16 (2)
+// Multi byte fields are big endian, the CRC is CRC-16/CCITT-FALSE over
+// everything between the sync word and the CRC.
+#define FRAME_SYNC_0 0xA5
+#define FRAME_SYNC_1 0x5A
+#define FRAME_OVERHEAD 11
+
 uint8_t bitStringToUint8(const char* str);
 int32_t bitStringToInt32(const char* str);
 float16 bitStringToFloat16(const char* str);
@@ -34,6 +42,8 @@ void byteToBits(uint8_t val, char* str, uint8_t len);
 void idToBytes(uint8_t* bf, uint32_t id, uint8_t len);
 void float16ToBytes(uint8_t* bf, float16 val, uint8_t len);
 void floatToBytes(uint8_t* bf, float val, uint8_t len);
+uint16_t crc16(const uint8_t* data, uint16_t len);
+uint16_t buildFrame(uint8_t* frame, const uint8_t* payload, uint8_t len, uint32_t elapsed, int16_t rssi);
 void printBytes(uint8_t* bytes, uint8_t len);
 void printBitsFromByte(byte val);
 
@@ -0,0 +1 @@
+# Headless ground station code shared by the GUI and the analysis scripts
@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+
+# Sensor conversions shared by the GUI, the tools and the analysis scripts.
+#
+# Every function takes either a plain number or a NumPy array. Numbers go
+# through the math module, which keeps a live packet in the microsecond range,
+# and arrays go through NumPy, so whole flights convert at array speed with
+# exactly the same formulas. Temperatures are in degrees Celsius, pressures in
+# Pa and altitudes in m. A number the formula has no answer for, like a zero
+# resistance or pressure from a damaged packet, gives NaN as it does in NumPy
+# instead of raising.
+
+KELVIN = 273.15
+
+R = 8.31446261815324 # Molar gas constant (J/(mol K))
+M = 0.0289644        # Molar mass of dry air (kg/mol)
+G = 9.80665          # Standard gravity (m/s^2)
+LAPSE_RATE = -0.0065 # Temperature gradient of the standard atmosphere (K/m)
+
+SEA_LEVEL_PRESSURE = 101325.0 # Pa
+LAUNCH_PRESSURE = 101036.0    # Pa at the launch pad on Andøya
+
+def _is_number(value):
+    return isinstance(value, (int, float))
+
+def _positive(value):
+    # False for zero, negative, infinite and NaN numbers
+    return 0 < value < math.inf
+
+def _array(value):
+    # Arrays and pandas columns pass through as they are, so a Series stays a Series
+    if(hasattr(value, '__array_ufunc__')):
+        return value
+    return np.asarray(value, dtype = float)
+
+class NtcCalibration:
+    # Steinhart-Hart curve of the NTC thermistor:
+    # 1 / T = a + b ln(R / R25) + c ln(R / R25)^2 + d ln(R / R25)^3
+    def __init__(self, a = 3.354016e-3, b = 2.569850e-4, c = 2.620131e-6, d = 6.383091e-8, r25 = 10000.0):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        self.r25 = r25
+
+    @classmethod
+    def fit(cls, ohms, celsius, r25 = 10000.0):
+        # Least squares fit of the coefficients to reference measurements, needs four or more
+        log_r = np.log(np.asarray(ohms, dtype = float) / r25)
+        inverse = 1 / (np.asarray(celsius, dtype = float) + KELVIN)
+        terms = np.stack([np.ones_like(log_r), log_r, log_r ** 2, log_r ** 3], axis = 1)
+        a, b, c, d = np.linalg.lstsq(terms, inverse, rcond = None)[0]
+        return cls(a, b, c, d, r25)
+
+    def temperature(self, ohm):
+        if(_is_number(ohm)):
+            if(not _positive(ohm)):
+                return math.nan
+            log_ntc = math.log(ohm / self.r25)
+        else:
+            log_ntc = np.log(_array(ohm) / self.r25)
+        return (1 / (self.a + self.b * log_ntc + self.c * log_ntc * log_ntc + self.d * log_ntc * log_ntc * log_ntc)) - KELVIN
+
+    def table(self, low = 100.0, high = 2.0e6, points = 4096):
+        return NtcTable(self, low, high, points)
+
+class NtcTable:
+    # The curve sampled evenly in ln(R) and interpolated linearly. Resistances
+    # outside [low, high] are clamped to the ends of the table.
+    def __init__(self, calibration, low = 100.0, high = 2.0e6, points = 4096):
+        self.calibration = calibration
+        self.log_r = np.linspace(math.log(low), math.log(high), points)
+        self.celsius = calibration.temperature(np.exp(self.log_r))
+        self.start = math.log(low)
+        self.step = (math.log(high) - self.start) / (points - 1)
+        self.celsius_list = self.celsius.tolist()
+
+    def temperature(self, ohm):
+        if(not _is_number(ohm)):
+            return np.interp(np.log(_array(ohm)), self.log_r, self.celsius)
+        if(not _positive(ohm)):
+            return math.nan
+        # Even spacing, so the position in the table is computed rather than searched
+        position = (math.log(ohm) - self.start) / self.step
+        if(position <= 0):
+            return self.celsius_list[0]
+        i = int(position)
+        if(i >= len(self.celsius_list) - 1):
+            return self.celsius_list[-1]
+        y0 = self.celsius_list[i]
+        return y0 + (self.celsius_list[i + 1] - y0) * (position - i)
+
+    def max_error(self):
+        # Worst interpolation error in degrees, checked halfway between the samples
+        middle = np.exp((self.log_r[1:] + self.log_r[:-1]) / 2)
+        return float(np.max(np.abs(self.temperature(middle) - self.calibration.temperature(middle))))
+
+DEFAULT_NTC = NtcCalibration()
+
+def ntc_temperature(ohm, calibration = DEFAULT_NTC):
+    return calibration.temperature(ohm)
+
+def hypsometric_altitude(pressure, temperature, p0 = SEA_LEVEL_PRESSURE):
+    # Height above the level where the pressure is p0, for an isothermal layer at temperature
+    if(_is_number(pressure) and _is_number(temperature)):
+        if(not _positive(pressure)):
+            return math.nan
+        return R * (temperature + KELVIN) / (M * G) * math.log(p0 / pressure)
+    return R * (_array(temperature) + KELVIN) / (M * G) * np.log(p0 / _array(pressure))
+
+def pad_altitude(pressure, temperature, pad_pressure = LAUNCH_PRESSURE):
+    # Altitude over the launch pad. The vertical rate is computed from this one
+    # in the GUI, the daemon and the analysis scripts, so they all agree.
+    return hypsometric_altitude(pressure, temperature, pad_pressure)
+
+def barometric_altitude(pressure, temperature, p0 = SEA_LEVEL_PRESSURE, h0 = 0.0, lapse_rate = LAPSE_RATE):
+    # Barometric formula of the Andøya CanSat handbook, temperature is the one at h0
+    exponent = -R * lapse_rate / (M * G)
+    if(_is_number(pressure) and _is_number(temperature)):
+        if(not _positive(pressure)):
+            return math.nan
+        return h0 + (temperature + KELVIN) / lapse_rate * ((pressure / p0) ** exponent - 1)
+    return h0 + (_array(temperature) + KELVIN) / lapse_rate * ((_array(pressure) / p0) ** exponent - 1)
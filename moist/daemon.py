@@ -0,0 +1,194 @@
+import argparse
+import os
+import signal
+import threading
+import time
+
+from moist import journal
+from moist.conversions import barometric_altitude, ntc_temperature, pad_altitude
+from moist.geodesy import Observer
+from moist.ingest import Ingest, SerialSource, DEFAULT_PORT, DEFAULT_BAUDRATE
+from moist.link import LinkQuality
+from moist.metrics import PipelineStats
+from moist.pubsub import Publisher, parse_address, DEFAULT_BACKLOG, DEFAULT_HISTORY, DEFAULT_PORT as DEFAULT_PUBLISH_PORT
+from moist.recording import RecordingWriter
+from moist.replay import ReplaySource
+from moist.stations import StationMerger, DEFAULT_WINDOW
+from moist.telemetry import FIELDS, format_packet, hms_to_seconds
+from moist.velocity import VerticalVelocity
+
+# Headless ground station.
+#
+# The daemon owns the receivers: it reads every station, merges their copies
+# of each packet, journals and records the flight, works out the derived
+# quantities and publishes every sample with moist.pubsub. GUIs, loggers and
+# scripts subscribe to it and may come and go, a viewer that hangs or is
+# closed does not touch the capture. Run it on an always-on box next to the
+# receivers and point the GUI at it with --daemon.
+#
+#   python -m moist.daemon --port /dev/ttyUSB0 --listen 0.0.0.0:5780
+#   python -m moist.pubsub box.local:5780 --csv
+#
+# A published sample looks like
+#   {"type": "sample", "seq": 1, "received_at": 1700000000.1, "station": "COM6",
+#    "packet": {"elapsed_time": "0:0:1", "id": 1, ...},
+#    "derived": {"ntc_temp": 11.2, "altitude": 3.4, "vertical_rate": 4.9, "distance": 120.1, ...}}
+
+OPERATOR_POS = (69.296049, 16.030619) # Starting position of operator, as in moist-gui.py
+
+class GroundStation:
+    def __init__(self, sources, publisher, flight_journal = None, recording = None, binary = False,
+                 merge_window = DEFAULT_WINDOW, operator = None, station_journals = None):
+        # station_journals: {station name: journal of its raw lines}, with several stations
+        self.sources = sources
+        self.publisher = publisher
+        self.journal = flight_journal
+        self.station_journals = station_journals or {}
+        self.recording = recording
+        self.operator = operator
+        self.multi_station = len(sources) > 1
+        self.merger = StationMerger(on_packet = self.packet, on_final = self.final, window = merge_window)
+        self.stats = PipelineStats()
+        # Packet loss and RSSI of the merged stream and of every station on its own
+        self.link = LinkQuality()
+        self.velocity = VerticalVelocity() # Fed in packet order under the merger's lock
+        self.station_links = {source.name: LinkQuality() for source in sources}
+        self.ingests = [Ingest(source,
+                               on_packet = lambda packet, received_at, name = source.name: self.station_packet(name, packet, received_at),
+                               on_line = lambda line, received_at, name = source.name: self.line(line, received_at, name),
+                               binary = binary)
+                        for source in sources]
+
+    def station_packet(self, name, packet, received_at):
+        self.station_links[name].update(packet.id, packet.rssi)
+        self.merger.offer(name, packet, received_at)
+
+    def line(self, line, received_at, station = None):
+        # Raw lines per station, with several stations the flight journal gets the best copy of every packet
+        target = self.station_journals.get(station) if self.multi_station else self.journal
+        if(target is not None):
+            target.write(line, received_at)
+
+    def derive(self, packet):
+        ntc_temp = ntc_temperature(packet.ohm)
+        # As specified in the Andøya Cansat handbook, from a starting altitude of 1 m
+        derived = {'ntc_temp': ntc_temp, 'altitude': barometric_altitude(packet.pressure, ntc_temp, h0 = 1)}
+        # Over the pad, like the analysis scripts compute the rate
+        derived['vertical_rate'] = self.velocity.update(hms_to_seconds(packet.time), pad_altitude(packet.pressure, ntc_temp))[1]
+        if(self.operator is not None and packet.lat != 0 and packet.lng != 0):
+            derived['distance'] = self.operator.distance(packet.lat, packet.lng)
+            derived['bearing'] = self.operator.bearing(packet.lat, packet.lng)
+            derived['tilt_gps'] = self.operator.elevation(packet.alt, packet.lat, packet.lng)
+            derived['tilt_pressure'] = self.operator.elevation(derived['altitude'], packet.lat, packet.lng)
+        return derived
+
+    def packet(self, packet, received_at, station):
+        # First copy of a packet from any station, called under the merger's lock
+        self.link.update(packet.id, packet.rssi)
+        self.stats.received(received_at)
+        self.publisher.publish({'type': 'sample',
+                                'received_at': received_at,
+                                'station': station,
+                                'packet': dict(zip(FIELDS, packet)),
+                                'derived': self.derive(packet)})
+        self.stats.delivered(received_at)
+        # After publishing, a packet the recording can not hold still reaches the subscribers
+        if(not self.multi_station):
+            self.record(packet)
+
+    def final(self, packet, station, received_at):
+        # Best copy of a packet once every station had the chance to deliver it
+        if(not self.multi_station):
+            return
+        if(self.journal is not None):
+            self.journal.write(format_packet(packet), received_at)
+        self.record(packet, station)
+
+    def record(self, packet, station = None):
+        # Out of range values are counted in recording.rejected
+        if(self.recording is None):
+            return
+        try:
+            self.recording.append_packet(packet, station)
+        except ValueError:
+            pass
+
+    def start(self):
+        for ingest in self.ingests:
+            ingest.start()
+        return self
+
+    def running(self):
+        return any(ingest.is_alive() for ingest in self.ingests)
+
+    def stop(self):
+        for ingest in self.ingests:
+            ingest.stop()
+        for ingest in self.ingests:
+            ingest.join()
+        self.merger.flush()
+
+    def summary(self):
+        rejected = sum(ingest.stats.rejected for ingest in self.ingests)
+        unrecorded = self.recording.rejected if self.recording is not None else 0
+        return '{}, {} rejected, {} duplicates, {} unrecorded | link {} | {} subscribers, {} overflows'.format(
+            self.stats.summary(), rejected, self.merger.duplicates, unrecorded, self.link.summary(),
+            self.publisher.subscribers(), self.publisher.overflows)
+
+def parse_point(text):
+    lat, lng = text.split(',')
+    return float(lat), float(lng)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Headless MOIST ground station that publishes the samples it receives')
+    parser.add_argument('--port', action = 'append', help = 'serial port of a ground station receiver, repeat it for every station (default {})'.format(DEFAULT_PORT))
+    parser.add_argument('--baud', type = int, default = DEFAULT_BAUDRATE, help = 'baud rate of the receiver')
+    parser.add_argument('--format', choices = ['csv', 'binary'], default = 'csv', help = 'output format of the receiver, see BINARY_OUTPUT in receiver.ino')
+    parser.add_argument('--replay', metavar = 'PATH', action = 'append', help = 'replay a CSV log or binary recording instead of reading a receiver, repeat it for every station')
+    parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed, 1 is real time and 0 as fast as possible')
+    parser.add_argument('--loop', action = 'store_true', help = 'start the replay over when it ends')
+    parser.add_argument('--listen', default = 'localhost:{}'.format(DEFAULT_PUBLISH_PORT), help = 'host:port the samples are published on')
+    parser.add_argument('--history', type = int, default = DEFAULT_HISTORY, help = 'samples kept for subscribers that join late')
+    parser.add_argument('--backlog', type = int, default = DEFAULT_BACKLOG, help = 'samples a subscriber may fall behind before it is disconnected')
+    parser.add_argument('--journal-dir', default = 'journal', help = 'directory of the flight journal that records every received line')
+    parser.add_argument('--fsync', choices = journal.FSYNC_POLICIES, default = journal.FSYNC_SEGMENT, help = 'when the journal is forced to disk')
+    parser.add_argument('--compress', action = 'store_true', help = 'gzip closed journal segments')
+    parser.add_argument('--merge-window', type = int, default = DEFAULT_WINDOW, help = 'packet ids kept open for copies from other stations')
+    parser.add_argument('--operator', metavar = 'LAT,LNG', type = parse_point, default = OPERATOR_POS, help = 'position the bearing and tilt are computed from')
+    parser.add_argument('--status-interval', type = float, default = 10, help = 'seconds between status lines')
+    args = parser.parse_args()
+
+    if(args.replay):
+        sources = [ReplaySource(path, args.speed, loop = args.loop) for path in args.replay]
+    else:
+        sources = [SerialSource(port, args.baud) for port in args.port or [DEFAULT_PORT]]
+
+    host, port = parse_address(args.listen)
+    publisher = Publisher(host, port, history = args.history, backlog = args.backlog).start()
+    flight_journal = journal.Journal(args.journal_dir, fsync = args.fsync, compress = args.compress).start()
+    names = [source.name for source in sources] if len(sources) > 1 else []
+    station_journals = {name: journal.Journal(journal.station_directory(args.journal_dir, name), fsync = args.fsync, compress = args.compress).start()
+                        for name in names}
+    recording = RecordingWriter(os.path.join(args.journal_dir, 'flight-{}.mrec'.format(int(time.time()))), stations = names)
+    station = GroundStation(sources, publisher, flight_journal, recording, binary = args.format == 'binary',
+                            merge_window = args.merge_window, operator = Observer(*args.operator),
+                            station_journals = station_journals).start()
+    print('publishing on {}:{}'.format(host, publisher.port), flush = True)
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        while(station.running() and not stopped.wait(args.status_interval)):
+            print(station.summary(), flush = True)
+    except KeyboardInterrupt:
+        pass
+    station.stop()
+    publisher.stop()
+    flight_journal.close()
+    for station_journal in station_journals.values():
+        station_journal.close()
+    recording.close()
+    print(station.summary())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from moist.radiosonde import read_soundings
+from moist.telemetry import hms_to_seconds, seconds_to_hms
+
+# Cached, typed datasets for the analysis scripts.
+#
+# A ground station log or a merged dataset is parsed once into NumPy columns
+# of the smallest type that keeps everything the sensors resolve: int32 ids, int32
+# seconds for the clock fields, float64 for the positions and float32 for the
+# sensor readings and derived columns. The receiver clock (elapsed_time) and
+# the GPS clock (time) are unwrapped over midnight, so they only ever go up.
+# The columns are saved as an .npz in a cache directory next to the source,
+# named after a hash of the source's content, and later runs load that
+# instead of parsing again. Editing the source gives it a new hash, so a
+# stale cache is never used. The hash is remembered with the size and
+# modification time of the source, so an unchanged source is not read again
+# just to find its cache.
+#
+# Columns are read from the .npz when they are first used, a script that
+# only plots the RSSI never loads the rest. Dataset.frame() builds a pandas
+# DataFrame for the scripts that want one, with the clock columns as the
+# 'H:M:S' text of the file like pandas.read_csv gave them.
+#
+#   flight = load_flight('merged_data_header.txt', sort = 'id')
+#   flight['pressure'], flight.times(), flight.frame()
+
+FORMAT_VERSION = 2
+CACHE_DIR = '.cache' # Next to the source, MOIST_CACHE_DIR overrides it
+DAY = 86400
+
+# Types of the telemetry columns, anything else in a file is float32
+FLIGHT_TYPES = {
+    'elapsed_time': np.int32, # Seconds since the receiver started
+    'id': np.int32,
+    'time': np.int32,         # Seconds since midnight of the first GPS day
+    'alt': np.float32,
+    'lat': np.float64,        # float32 would only resolve ~0.5 m
+    'lng': np.float64,
+    'pressure': np.float32,
+    'ohm': np.float32,
+    'hum': np.float32,
+    'co2': np.float32,
+    'temp': np.float32,
+    'rssi': np.int16,
+}
+CLOCK_COLUMNS = ['elapsed_time', 'time']
+
+RADIOSONDE_TYPES = {
+    'time': np.float64, # Unix time, NaN where the sonde sent none
+    'gpheight': np.float32,
+    'temp': np.float32,
+    'dewpoint': np.float32,
+    'pressure': np.float32,
+    'wind_u': np.float32,
+    'wind_v': np.float32,
+    'lat': np.float64,
+    'lng': np.float64,
+    'alt': np.float32,
+    'sounding': np.int32, # Index of the sounding in the file
+}
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_hash(source, directory):
+    # content_hash of source, remembered in directory until the file's size or modification time changes
+    stat = os.stat(source)
+    path = os.path.join(directory, os.path.basename(source) + '.hash')
+    state = [stat.st_size, stat.st_mtime_ns]
+    try:
+        with open(path) as f:
+            known = json.load(f)
+        if(known['state'] == state):
+            return known['hash']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    digest = content_hash(source)
+    try:
+        os.makedirs(directory, exist_ok = True)
+        temporary = path + '.tmp-{}'.format(os.getpid())
+        with open(temporary, 'w') as f:
+            json.dump({'state': state, 'hash': digest}, f)
+        os.replace(temporary, path)
+    except OSError:
+        pass # A read only cache only costs the hashing
+    return digest
+
+def unwrap_clock(seconds):
+    # Adds a day every time a clock in seconds of the day jumps back by more than half a day
+    seconds = np.asarray(seconds, dtype = np.int64)
+    if(len(seconds) < 2):
+        return seconds
+    wraps = np.concatenate([[0], np.cumsum(np.diff(seconds) < -DAY // 2)])
+    return seconds + wraps * DAY
+
+class Dataset:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.columns = meta['columns']
+        self.file = np.load(path, allow_pickle = False)
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if(name not in self.loaded):
+            if(name not in self.columns):
+                raise KeyError(name)
+            self.loaded[name] = self.file[name]
+        return self.loaded[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def nbytes(self):
+        # Memory of the columns loaded so far
+        return sum(column.nbytes for column in self.loaded.values())
+
+    def times(self, column = 'time'):
+        # A clock column as datetime64. Without a date in the metadata the day
+        # is 1900-01-01, as pandas.to_datetime(format = '%H:%M:%S') has it.
+        start = np.datetime64(self.meta.get('date') or '1900-01-01', 's')
+        return start + self[column].astype('timedelta64[s]')
+
+    def epoch(self, column = 'time'):
+        # Unix time of a clock column, needs the date the flight started on
+        if(not self.meta.get('date')):
+            raise ValueError('{} has no date, load it with date = ...'.format(self.meta['source']))
+        return self.times(column).astype(np.int64)
+
+    def frame(self, columns = None, clock_text = True):
+        # clock_text False keeps the clock columns as the unwrapped seconds of the dataset
+        import pandas as pd
+        data = {}
+        for name in columns or self.columns:
+            if(clock_text and name in CLOCK_COLUMNS):
+                data[name] = [seconds_to_hms(seconds) for seconds in (self[name] % DAY).tolist()]
+            else:
+                data[name] = self[name]
+        return pd.DataFrame(data)
+
+    def close(self):
+        self.file.close()
+
+def cache_directory(source, cache_dir = None):
+    return cache_dir or os.environ.get('MOIST_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIR)
+
+def cache_path(source, kind, key, cache_dir = None):
+    name = '{}.{}.{}.npz'.format(os.path.basename(source), kind, key)
+    return os.path.join(cache_directory(source, cache_dir), name)
+
+def cached(source, kind, parse, options = (), cache_dir = None, cache = True):
+    # Dataset of source, parse(source) -> (columns, meta) only runs on a cache miss
+    digest = source_hash(source, cache_directory(source, cache_dir)) if cache else content_hash(source)
+    key = hashlib.blake2b('{}|{}|{}|{}'.format(FORMAT_VERSION, kind, digest, options).encode(),
+                          digest_size = 12).hexdigest()
+    path = cache_path(source, kind, key, cache_dir)
+    if(not cache or not os.path.isfile(path)):
+        columns, meta = parse(source)
+        meta.update(source = os.path.basename(source), rows = len(next(iter(columns.values()), [])), columns = list(columns))
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        temporary = path + '.tmp-{}'.format(os.getpid())
+        with open(temporary, 'wb') as f:
+            np.savez(f, __meta__ = np.array(json.dumps(meta)), **columns)
+        os.replace(temporary, path) # Readers never see half a file
+    with np.load(path, allow_pickle = False) as f:
+        meta = json.loads(str(f['__meta__']))
+    return Dataset(path, meta)
+
+def parse_flight(path, sort = None, date = None):
+    with open(path, newline = '') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        if(sort is not None and sort not in header):
+            raise ValueError('{} has no {} column, it is not a flight log'.format(path, sort))
+        rows = []
+        rejected = 0
+        for fields in reader:
+            if(len(fields) != len(header)):
+                rejected += 1 # Receiver debug output or a damaged line
+                continue
+            try:
+                row = []
+                for name, value in zip(header, fields):
+                    if(name in CLOCK_COLUMNS):
+                        row.append(hms_to_seconds(value))
+                    elif(FLIGHT_TYPES.get(name, np.float32) in (np.int16, np.int32)):
+                        row.append(int(value))
+                    else:
+                        row.append(float(value) if value else np.nan)
+            except ValueError:
+                rejected += 1
+                continue
+            rows.append(row)
+
+    table = list(zip(*rows)) if rows else [[] for _ in header]
+    columns = {}
+    for name, values in zip(header, table):
+        if(name in CLOCK_COLUMNS):
+            values = unwrap_clock(values) # In the order the lines were received
+        columns[name] = np.asarray(values, dtype = FLIGHT_TYPES.get(name, np.float32))
+    if(sort is not None and rows):
+        order = np.argsort(columns[sort], kind = 'stable')
+        columns = {name: column[order] for name, column in columns.items()}
+    return columns, {'rejected': rejected, 'date': date}
+
+def parse_radiosonde(path):
+    columns, soundings = read_soundings(path)
+    columns = {name: column.astype(RADIOSONDE_TYPES.get(name, np.float32)) for name, column in columns.items()}
+    return columns, {'soundings': [members.get('properties', {}) for members in soundings]}
+
+def load_flight(path, sort = None, date = None, cache_dir = None, cache = True):
+    # A ground station log or merged dataset. sort names a column to order the
+    # rows by, date ('2024-04-25') is the day the GPS clock started on.
+    return cached(path, 'flight', lambda source: parse_flight(source, sort, date), (sort, date), cache_dir, cache)
+
+def load_radiosonde(path, cache_dir = None, cache = True):
+    # The soundings of a radiosonde GeoJSON file, see moist.radiosonde. temp
+    # and pressure are in K and hPa as the file has them, temp_c, dewpoint_c
+    # and pressure_pa are converted. Missing values are NaN.
+    return cached(path, 'radiosonde', parse_radiosonde, (), cache_dir, cache)
@@ -0,0 +1,111 @@
+import binascii
+
+import numpy as np
+
+from moist.telemetry import Packet, seconds_to_hms
+
+# Decoder for the binary frames of the receiver (BINARY_OUTPUT in receiver.ino).
+#
+# sync (2) | payload length (1) | payload | elapsed seconds (4) | RSSI (2) | CRC-16 (2)
+#
+# The payload is the 34 byte radio packet exactly as the CanSat sent it, so
+# nothing is converted to text on either side. Everything is big endian and
+# the CRC is CRC-16/CCITT-FALSE over the bytes between sync word and CRC.
+
+SYNC = b'\xa5\x5a'
+PAYLOAD_SIZE = 34 # DATA_BUDGET_SIZE in moist.h
+FRAME_OVERHEAD = 11
+
+# Layout written by transmitter.ino
+PAYLOAD_DTYPE = np.dtype([
+    ('id', 'u1', (3,)), # 24 bit big endian
+    ('hour', 'u1'),
+    ('minute', 'u1'),
+    ('second', 'u1'),
+    ('alt', '>f4'),
+    ('lat', '>f4'),
+    ('lng', '>f4'),
+    ('pressure', '>f4'),
+    ('ohm', '>f4'),
+    ('hum', '>f2'),
+    ('co2', '>f4'),
+    ('temp', '>f2')
+])
+
+FRAME_DTYPE = np.dtype([
+    ('sync', '>u2'),
+    ('length', 'u1'),
+    ('payload', PAYLOAD_DTYPE),
+    ('elapsed', '>u4'),
+    ('rssi', '>i2'),
+    ('crc', '>u2')
+])
+
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+def encode_frame(payload, elapsed, rssi):
+    # Same bytes as buildFrame() in moist.cpp, handy for replaying and testing
+    body = bytes([len(payload)]) + bytes(payload) + int(elapsed).to_bytes(4, 'big') + int(rssi).to_bytes(2, 'big', signed = True)
+    return SYNC + body + crc16(body).to_bytes(2, 'big')
+
+def encode_payload(packet):
+    # Builds the radio payload for a packet, mirrors transmitter.ino
+    hour, minute, second = (int(v) for v in packet.time.split(':'))
+    payload = np.zeros(1, dtype = PAYLOAD_DTYPE)
+    payload['id'] = [(packet.id >> 16) & 0xff, (packet.id >> 8) & 0xff, packet.id & 0xff]
+    payload['hour'], payload['minute'], payload['second'] = hour, minute, second
+    for name in ('alt', 'lat', 'lng', 'pressure', 'ohm', 'hum', 'co2', 'temp'):
+        payload[name] = getattr(packet, name)
+    return payload.tobytes()
+
+def decode(frames):
+    # Vectorised decode of a FRAME_DTYPE array into a list of packets
+    payload = frames['payload']
+    ids = (payload['id'][:, 0].astype(np.uint32) << 16) | (payload['id'][:, 1].astype(np.uint32) << 8) | payload['id'][:, 2]
+    columns = [ids.tolist()] + [payload[name].astype(float).tolist() for name in ('alt', 'lat', 'lng', 'pressure', 'ohm', 'hum', 'co2', 'temp')]
+    clocks = zip(payload['hour'].tolist(), payload['minute'].tolist(), payload['second'].tolist())
+    packets = []
+    for elapsed, rssi, (hour, minute, second), values in zip(frames['elapsed'].tolist(), frames['rssi'].tolist(), clocks, zip(*columns)):
+        packets.append(Packet(seconds_to_hms(elapsed), values[0], '{}:{}:{}'.format(hour, minute, second), *values[1:], rssi))
+    return packets
+
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.rejected = 0 # Frames with a bad CRC or length
+        self.skipped = 0  # Bytes thrown away while looking for a sync word
+
+    def feed(self, data):
+        # Returns the packets completed by data, partial frames are kept
+        self.buffer += data
+        good = bytearray()
+        position = 0
+        while(True):
+            start = self.buffer.find(SYNC, position)
+            if(start < 0):
+                # Keep a trailing first sync byte, the second may still arrive
+                keep = 1 if self.buffer.endswith(SYNC[:1]) else 0
+                self.skipped += len(self.buffer) - position - keep
+                position = len(self.buffer) - keep
+                break
+            self.skipped += start - position
+            if(len(self.buffer) - start < FRAME_SIZE):
+                position = start
+                break
+            frame = bytes(self.buffer[start:start + FRAME_SIZE])
+            if(frame[2] != PAYLOAD_SIZE or crc16(frame[2:-2]) != int.from_bytes(frame[-2:], 'big')):
+                # Not a real frame, look for the next sync word after this one
+                self.rejected += 1
+                position = start + 1
+                continue
+            good += frame
+            position = start + FRAME_SIZE
+        del self.buffer[:position]
+        if(not good):
+            return []
+        self.frames += len(good) // FRAME_SIZE
+        return decode(np.frombuffer(bytes(good), dtype = FRAME_DTYPE))
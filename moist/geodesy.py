@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+# Range, bearing and elevation of the CanSat as seen from the ground stations.
+#
+# The array functions take degrees and work on scalars or whole NumPy arrays,
+# so a complete flight is converted in one call. Observer keeps the sines and
+# cosines of a ground station's position, which saves most of the work of the
+# per packet calls in the GUI, and look_angles() does every station at once
+# by broadcasting the stations against the samples.
+
+EARTH_RADIUS = 6371000.0 # Mean radius (m)
+
+def distance(lat1, lng1, lat2, lng2):
+    # Haversine great circle distance in meters
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def bearing(lat1, lng1, lat2, lng2):
+    # Initial bearing from the first point to the second, degrees from north in (-180, 180]
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    x = np.sin(lng2 - lng1) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lng2 - lng1)
+    return np.degrees(np.arctan2(x, y))
+
+def elevation(height, ground_distance):
+    # Angle above the horizon of a point height meters up and ground_distance meters away
+    return np.degrees(np.arctan2(height, ground_distance))
+
+class Observer:
+    def __init__(self, lat, lng, alt = 0.0, name = None):
+        self.name = name
+        self.lat = lat
+        self.lng = lng
+        self.alt = alt
+        self.lat_rad = math.radians(lat)
+        self.lng_rad = math.radians(lng)
+        self.sin_lat = math.sin(self.lat_rad)
+        self.cos_lat = math.cos(self.lat_rad)
+
+    # Scalar fast paths for one packet at a time
+
+    def distance(self, lat, lng):
+        lat = math.radians(lat)
+        a = math.sin((lat - self.lat_rad) / 2) ** 2 + self.cos_lat * math.cos(lat) * math.sin((math.radians(lng) - self.lng_rad) / 2) ** 2
+        return 2 * EARTH_RADIUS * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    def bearing(self, lat, lng):
+        lat = math.radians(lat)
+        diff_lng = math.radians(lng) - self.lng_rad
+        cos_lat = math.cos(lat)
+        x = math.sin(diff_lng) * cos_lat
+        y = self.cos_lat * math.sin(lat) - self.sin_lat * cos_lat * math.cos(diff_lng)
+        return math.degrees(math.atan2(x, y))
+
+    def elevation(self, alt, lat, lng):
+        return math.degrees(math.atan2(alt - self.alt, self.distance(lat, lng)))
+
+    # Whole arrays
+
+    def look(self, lat, lng, alt):
+        # (range along the ground in m, bearing, elevation) for arrays of positions
+        return tuple(values[0] for values in look_angles([self], lat, lng, alt))
+
+def look_angles(observers, lat, lng, alt):
+    # Returns (distance, bearing, elevation), each of shape (observers, samples)
+    lat = np.radians(np.asarray(lat, dtype = float))[np.newaxis]
+    lng = np.radians(np.asarray(lng, dtype = float))[np.newaxis]
+    alt = np.asarray(alt, dtype = float)[np.newaxis]
+    obs_lat = np.array([o.lat_rad for o in observers])[:, np.newaxis]
+    obs_lng = np.array([o.lng_rad for o in observers])[:, np.newaxis]
+    obs_sin = np.array([o.sin_lat for o in observers])[:, np.newaxis]
+    obs_cos = np.array([o.cos_lat for o in observers])[:, np.newaxis]
+    obs_alt = np.array([o.alt for o in observers], dtype = float)[:, np.newaxis]
+
+    # Shared by the distance and the bearing
+    cos_lat = np.cos(lat)
+    diff_lng = lng - obs_lng
+
+    a = np.sin((lat - obs_lat) / 2) ** 2 + obs_cos * cos_lat * np.sin(diff_lng / 2) ** 2
+    ground = 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    x = np.sin(diff_lng) * cos_lat
+    y = obs_cos * np.sin(lat) - obs_sin * cos_lat * np.cos(diff_lng)
+    return ground, np.degrees(np.arctan2(x, y)), np.degrees(np.arctan2(alt - obs_alt, ground))
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import serial
+
+from moist.framing import FrameDecoder
+from moist.telemetry import FrameError, format_packet, parse_line
+
+# Ingest for the ground station receiver.
+#
+# A thread blocks on its data source with a read timeout instead of polling
+# it, so it uses no CPU while idle and hands every line on as soon as it is
+# complete. Lost sources are reopened with exponential backoff, and lines that
+# do not parse are counted instead of stopping the thread. With binary set the
+# source is read as binary frames (see moist.framing) instead of CSV lines.
+#
+# A source has open(), read(binary) and close(). read() blocks for at most
+# its timeout and returns the bytes it got, b'' when nothing arrived. Sources
+# raise OSError when they are lost and SourceExhausted when they have ended.
+# SerialSource reads the receiver, moist.replay.ReplaySource replays a file.
+
+DEFAULT_PORT = 'COM6'
+DEFAULT_BAUDRATE = 9600
+
+class SourceExhausted(Exception):
+    pass
+
+class SerialSource:
+    def __init__(self, port = DEFAULT_PORT, baudrate = DEFAULT_BAUDRATE, timeout = 0.5):
+        self.name = str(port)
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.ser = None
+
+    def open(self):
+        self.ser = serial.Serial(self.port, self.baudrate, timeout = self.timeout)
+
+    def read(self, binary = False):
+        # Blocks for up to the timeout, returns early with a partial line
+        if(binary):
+            return self.ser.read(max(1, self.ser.in_waiting))
+        return self.ser.read_until(b'\n')
+
+    def close(self):
+        if(self.ser is not None):
+            try:
+                self.ser.close()
+            except OSError:
+                pass
+            self.ser = None
+
+class IngestStats:
+    def __init__(self):
+        self.lines = 0
+        self.packets = 0
+        self.rejected = 0
+        self.reconnects = 0
+        self.last_error = None
+
+class Ingest(threading.Thread):
+    def __init__(self, source, on_packet = None, on_line = None, binary = False, backoff = 0.5, max_backoff = 10.0):
+        super().__init__(name = 'ingest-' + source.name, daemon = True)
+        self.source = source
+        self.on_packet = on_packet # on_packet(packet, received_at)
+        self.on_line = on_line     # on_line(line, received_at), every line including rejected ones
+        self.binary = binary
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.decoder = FrameDecoder()
+        self.stats = IngestStats()
+        self.stopped = threading.Event()
+        self.connected = False
+
+    def stop(self):
+        self.stopped.set()
+
+    def connect(self):
+        delay = self.backoff
+        while(not self.stopped.is_set()):
+            try:
+                self.source.open()
+                return True
+            except SourceExhausted:
+                return False # Nothing to read, like an empty replay
+            except OSError as e:
+                self.stats.last_error = e
+            self.stopped.wait(delay)
+            delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def handle(self, raw):
+        received_at = time.time()
+        line = raw.decode(errors = 'replace').strip()
+        if(not line):
+            return
+        self.stats.lines += 1
+        if(self.on_line is not None):
+            self.on_line(line, received_at)
+        try:
+            packet = parse_line(line)
+        except FrameError:
+            self.stats.rejected += 1 # Receiver debug output or a damaged line
+            return
+        self.stats.packets += 1
+        if(self.on_packet is not None):
+            self.on_packet(packet, received_at)
+
+    def handle_frames(self, chunk):
+        received_at = time.time()
+        rejected = self.decoder.rejected
+        packets = self.decoder.feed(chunk)
+        self.stats.rejected += self.decoder.rejected - rejected
+        for packet in packets:
+            self.stats.lines += 1
+            self.stats.packets += 1
+            if(self.on_line is not None):
+                # The journal keeps text, binary frames go in as the line they stand for
+                self.on_line(format_packet(packet), received_at)
+            if(self.on_packet is not None):
+                self.on_packet(packet, received_at)
+
+    def run(self):
+        pending = b''
+        while(not self.stopped.is_set()):
+            if(not self.connected):
+                self.connected = self.connect()
+                pending = b''
+                self.decoder = FrameDecoder()
+                if(not self.connected):
+                    break
+            try:
+                chunk = self.source.read(self.binary)
+            except SourceExhausted:
+                break
+            except OSError as e:
+                self.stats.last_error = e
+                self.stats.reconnects += 1
+                self.close()
+                continue
+            if(not chunk):
+                continue
+            try:
+                # A failing consumer must not take the ingest down with it
+                if(self.binary):
+                    self.handle_frames(chunk)
+                    continue
+                pending += chunk
+                while(b'\n' in pending):
+                    raw, pending = pending.split(b'\n', 1)
+                    self.handle(raw)
+            except Exception as e:
+                self.stats.last_error = e
+        self.close()
+
+    def close(self):
+        self.source.close()
+        self.connected = False
+
+class SerialIngest(Ingest):
+    def __init__(self, port = DEFAULT_PORT, baudrate = DEFAULT_BAUDRATE, timeout = 0.5, **kwargs):
+        super().__init__(SerialSource(port, baudrate, timeout), **kwargs)
@@ -0,0 +1,288 @@
+import argparse
+import glob
+import gzip
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from moist.telemetry import HEADER
+
+# Always-on flight journal.
+#
+# Every raw line from the receiver is stamped with the time it arrived and
+# handed to a background thread, which writes them to disk in batches. The
+# journal is split into segments that are rotated after a configurable time or
+# size, closed segments can be gzipped, and a segment that was still open when
+# the program died is repaired the next time the journal is started.
+#
+# Segment lines are '<unix time>\t<raw line>'. Lines starting with '#' are
+# markers, the Record button uses them to mark regions of the journal.
+#
+# With several ground stations the journal holds the merged telemetry, the
+# best copy of every packet, and every station journals its raw lines in a
+# subdirectory of its own (see station_directory).
+
+OPEN_SUFFIX = '.open'
+MARK_PREFIX = '#'
+RECORD_START = 'record-start'
+RECORD_STOP = 'record-stop'
+
+# Policies for calling os.fsync() on the segment file
+FSYNC_NEVER = 'never'     # Leave it to the operating system
+FSYNC_FLUSH = 'flush'     # After every periodic flush
+FSYNC_SEGMENT = 'segment' # When a segment is closed
+FSYNC_POLICIES = [FSYNC_NEVER, FSYNC_FLUSH, FSYNC_SEGMENT]
+
+def _segment_time(path):
+    # Segments are named journal-<unix time>-<sequence>.log
+    try:
+        return int(os.path.basename(path).split('-')[1])
+    except (IndexError, ValueError):
+        return 0
+
+def _truncate_partial_line(path):
+    # A crash can leave half a line at the end of the segment
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if(end != len(data)):
+            f.truncate(end)
+
+def _compress(path):
+    tmp = path + '.gz.tmp'
+    with open(path, 'rb') as src, gzip.open(tmp, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, path + '.gz')
+    os.remove(path)
+
+def station_directory(directory, station):
+    # Journal directory of one ground station, inside the flight journal
+    return os.path.join(directory, 'station-' + re.sub(r'[^\w.-]', '_', station))
+
+def recover(directory, compress = False):
+    # Closes segments left open by a crash, returns the recovered paths
+    for tmp in glob.glob(os.path.join(directory, '*.gz.tmp')):
+        os.remove(tmp) # Interrupted compression, the source is still there
+    recovered = []
+    for path in sorted(glob.glob(os.path.join(directory, '*' + OPEN_SUFFIX))):
+        _truncate_partial_line(path)
+        closed = path[:-len(OPEN_SUFFIX)]
+        os.replace(path, closed)
+        if(compress):
+            _compress(closed)
+        recovered.append(closed)
+    return recovered
+
+def segments(directory):
+    # All segments in the order they were written, including the open one
+    paths = glob.glob(os.path.join(directory, 'journal-*'))
+    paths = [p for p in paths if not p.endswith('.tmp')]
+    return sorted(paths, key = lambda p: (_segment_time(p), p))
+
+def entries(directory):
+    # Yields (timestamp, is_mark, text) for everything in the journal
+    for path in segments(directory):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', newline = '') as f:
+            for entry in f:
+                if(not entry.endswith('\n')):
+                    break # Half written line at the end of the open segment
+                is_mark = entry.startswith(MARK_PREFIX)
+                body = entry[1:] if is_mark else entry
+                stamp, _, text = body.rstrip('\n').partition('\t')
+                try:
+                    yield float(stamp), is_mark, text
+                except ValueError:
+                    continue
+
+def read(directory, since = None, until = None):
+    # Yields (timestamp, line) for the received lines between since and until
+    for stamp, is_mark, line in entries(directory):
+        if(is_mark):
+            continue
+        if(since is not None and stamp < since):
+            continue
+        if(until is not None and stamp > until):
+            continue
+        yield stamp, line
+
+def regions(directory):
+    # (start, stop) timestamps of every region marked with the Record button
+    found = []
+    start = None
+    for stamp, is_mark, label in entries(directory):
+        if(not is_mark):
+            continue
+        if(label == RECORD_START):
+            start = stamp
+        elif(label == RECORD_STOP and start is not None):
+            found.append((start, stamp))
+            start = None
+    if(start is not None):
+        found.append((start, None))
+    return found
+
+def export(directory, path, start = None):
+    # Appends journalled lines to a CSV recording, returns the line count.
+    # With start only the lines received between the record-start mark at
+    # start and the record-stop mark after it are exported, otherwise the
+    # whole journal is. The merged lines of several stations are written a
+    # little after they were received, so the region is chosen by time.
+    count = 0
+    inside = start is None
+    stop = None
+    with open(path, 'a', newline = '') as f:
+        if(f.tell() == 0):
+            f.write(HEADER + '\n')
+        for stamp, is_mark, line in entries(directory):
+            if(is_mark):
+                if(start is not None and line == RECORD_START and stamp == start):
+                    inside = True
+                elif(start is not None and line == RECORD_STOP and inside and stop is None):
+                    stop = stamp
+            elif(stop is not None and stamp > stop):
+                break
+            elif(inside and (start is None or stamp >= start) and line.count(',') == HEADER.count(',')): # Skip receiver debug output
+                f.write(line + '\n')
+                count += 1
+    return count
+
+class Journal:
+    def __init__(self, directory, segment_seconds = 3600, segment_bytes = 64 * 1024 * 1024,
+                 flush_interval = 1.0, fsync = FSYNC_SEGMENT, compress = False, batch_size = 256):
+        if(fsync not in FSYNC_POLICIES):
+            raise ValueError('Unknown fsync policy: ' + str(fsync))
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.compress = compress
+        self.batch_size = batch_size
+
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.file = None
+        self.path = None
+        self.opened_at = 0
+        self.written = 0
+        self.sequence = 0
+        self.last_flush = 0
+        self.lines = 0
+        self.error = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok = True)
+        recover(self.directory, self.compress)
+        self.thread = threading.Thread(target = self.run, name = 'journal', daemon = True)
+        self.thread.start()
+        return self
+
+    def write(self, line, timestamp = None):
+        self.queue.put('{:.3f}\t{}\n'.format(time.time() if timestamp is None else timestamp, line))
+
+    def mark(self, label, timestamp = None):
+        # Returns the timestamp as it is stored, it identifies the mark later on
+        stamp = round(time.time() if timestamp is None else timestamp, 3)
+        self.queue.put('{}{:.3f}\t{}\n'.format(MARK_PREFIX, stamp, label))
+        return stamp
+
+    def sync(self, timeout = None):
+        # Blocks until everything queued so far is written and flushed
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if(self.thread is not None):
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def open_segment(self):
+        self.opened_at = time.time()
+        self.sequence += 1
+        name = 'journal-{}-{:04d}.log'.format(int(self.opened_at), self.sequence)
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path + OPEN_SUFFIX, 'w', newline = '', buffering = 1024 * 1024)
+        self.written = 0
+
+    def close_segment(self):
+        self.flush(self.fsync != FSYNC_NEVER)
+        self.file.close()
+        self.file = None
+        os.replace(self.path + OPEN_SUFFIX, self.path)
+        if(self.compress):
+            try:
+                _compress(self.path)
+            except OSError as e:
+                self.error = e # The segment stays on disk uncompressed
+
+    def flush(self, fsync = False):
+        self.file.flush()
+        if(fsync):
+            os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    def run(self):
+        self.open_segment()
+        running = True
+        while(running):
+            batch = []
+            waiters = []
+            try:
+                item = self.queue.get(timeout = self.flush_interval)
+                while(True):
+                    if(item is None):
+                        running = False
+                        break
+                    elif(isinstance(item, threading.Event)):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+                    if(len(batch) >= self.batch_size):
+                        break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            try:
+                if(self.file is None):
+                    self.open_segment() # The last rotation failed half way
+                if(batch):
+                    chunk = ''.join(batch)
+                    self.file.write(chunk)
+                    self.written += len(chunk)
+                    self.lines += len(batch)
+                if(waiters or time.monotonic() - self.last_flush >= self.flush_interval):
+                    self.flush(self.fsync == FSYNC_FLUSH)
+                if(self.written >= self.segment_bytes or time.time() - self.opened_at >= self.segment_seconds):
+                    self.close_segment()
+                    self.open_segment()
+            except OSError as e:
+                self.error = e # Keep going, the next batch may well succeed
+            for waiter in waiters:
+                waiter.set()
+        if(self.file is not None):
+            self.close_segment()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Export lines from a MOIST flight journal to CSV')
+    parser.add_argument('directory', help = 'journal directory')
+    parser.add_argument('output', help = 'CSV file to append to')
+    parser.add_argument('--marked', action = 'store_true', help = 'only export the regions marked with the Record button')
+    args = parser.parse_args()
+
+    if(args.marked):
+        count = 0
+        for start, _ in regions(args.directory):
+            count += export(args.directory, args.output, start)
+    else:
+        count = export(args.directory, args.output)
+    print('Exported {} lines to {}'.format(count, args.output))
+
+if __name__ == '__main__':
+    main()
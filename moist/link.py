@@ -0,0 +1,210 @@
+import argparse
+import collections
+import math
+import threading
+
+from moist.telemetry import FIELDS, FrameError, parse_line
+
+# Link quality of the radio downlink, updated packet by packet.
+#
+# The CanSat numbers its packets, so every id that never arrived is a lost
+# packet. LinkQuality keeps a ring bitmap of the most recent ids, the gaps in
+# the id sequence, the loss over several trailing windows of ids and the RSSI
+# statistics over the most recent packets. Each id costs a constant amount of
+# work, so it does not slow down as the flight gets longer, and the same class
+# runs on a whole log offline (python -m moist.link LOG).
+
+DEFAULT_WINDOWS = (20, 100, 500) # Trailing windows for the loss, in packet ids
+DEFAULT_RSSI_WINDOW = 60         # Packets in the RSSI statistics
+HISTORY = 4096                   # Ids kept in the bitmap, late packets older than this are ignored
+MAX_GAPS = 1000                  # Gaps kept in the gap list
+
+class LinkQuality:
+    def __init__(self, windows = DEFAULT_WINDOWS, rssi_window = DEFAULT_RSSI_WINDOW, history = HISTORY, max_gaps = MAX_GAPS):
+        self.windows = tuple(windows)
+        self.history = max(history, max(self.windows))
+        self.rssi_window = rssi_window
+        self.lock = threading.Lock()
+        self.gaps = collections.deque(maxlen = max_gaps) # [first missing id, last missing id]
+        self.rssi_values = collections.deque()
+        self.rssi_sum = 0.0
+        self.rssi_squares = 0.0
+        self.rssi_low = collections.deque()  # Monotonic deques for the rolling min and max
+        self.rssi_high = collections.deque()
+        self.rssi_count = 0
+        self.restarts = 0
+        self.reset()
+
+    def reset(self):
+        # Also used when the ids start over, for example after a reboot of the CanSat
+        self.bitmap = bytearray(self.history) # 1 where the id at index id % history arrived
+        self.first = None
+        self.last = None
+        self.received = 0
+        self.late = 0
+        self.duplicates = 0
+        self.in_window = [0] * len(self.windows) # Ids received in each trailing window
+
+    def update(self, packet_id, rssi = None):
+        with self.lock:
+            if(self.last is not None and packet_id <= self.last - self.history):
+                self.reset()
+                self.restarts += 1
+            if(self.last is None):
+                self.first = packet_id
+                self.last = packet_id - 1
+            if(packet_id > self.last):
+                self.advance(packet_id)
+            elif(self.bitmap[packet_id % self.history]):
+                self.duplicates += 1
+                return
+            else:
+                self.fill(packet_id)
+            self.bitmap[packet_id % self.history] = 1
+            self.received += 1
+            for i, window in enumerate(self.windows):
+                if(packet_id > self.last - window):
+                    self.in_window[i] += 1
+            if(rssi is not None):
+                self.add_rssi(rssi)
+
+    def advance(self, packet_id):
+        # Moves the head of the sequence to packet_id, every id passed on the way was lost
+        if(packet_id - self.last > 1):
+            self.gaps.append([self.last + 1, packet_id - 1])
+        if(packet_id - self.last >= self.history):
+            # Nothing of the old windows survives the jump
+            self.bitmap = bytearray(self.history)
+            self.in_window = [0] * len(self.windows)
+            self.last = packet_id
+            return
+        for expected in range(self.last + 1, packet_id + 1):
+            for i, window in enumerate(self.windows):
+                leaving = expected - window
+                if(leaving >= self.first and self.bitmap[leaving % self.history]):
+                    self.in_window[i] -= 1
+            self.bitmap[expected % self.history] = 0
+        self.last = packet_id
+
+    def fill(self, packet_id):
+        # A packet that arrived after later ids, usually from a slower station
+        self.late += 1
+        if(packet_id < self.first):
+            # Before the first packet seen, it extends the expected range
+            if(self.first - packet_id > 1 and len(self.gaps) != self.gaps.maxlen):
+                self.gaps.appendleft([packet_id + 1, self.first - 1])
+            self.first = packet_id
+            return
+        for i in range(len(self.gaps) - 1, -1, -1): # Late packets fill recent gaps
+            start, end = self.gaps[i]
+            if(end < packet_id):
+                break
+            if(start <= packet_id):
+                if(start == end):
+                    del self.gaps[i]
+                elif(packet_id == start):
+                    self.gaps[i][0] += 1
+                elif(packet_id == end):
+                    self.gaps[i][1] -= 1
+                else:
+                    if(len(self.gaps) == self.gaps.maxlen):
+                        self.gaps.popleft() # Make room by forgetting the oldest gap
+                        i -= 1
+                    self.gaps[i][1] = packet_id - 1
+                    self.gaps.insert(i + 1, [packet_id + 1, end])
+                break
+
+    def add_rssi(self, rssi):
+        self.rssi_count += 1
+        self.rssi_values.append(rssi)
+        self.rssi_sum += rssi
+        self.rssi_squares += rssi * rssi
+        while(self.rssi_low and self.rssi_low[-1][1] > rssi):
+            self.rssi_low.pop()
+        self.rssi_low.append((self.rssi_count, rssi))
+        while(self.rssi_high and self.rssi_high[-1][1] < rssi):
+            self.rssi_high.pop()
+        self.rssi_high.append((self.rssi_count, rssi))
+        if(len(self.rssi_values) > self.rssi_window):
+            old = self.rssi_values.popleft()
+            self.rssi_sum -= old
+            self.rssi_squares -= old * old
+            oldest = self.rssi_count - self.rssi_window
+            if(self.rssi_low[0][0] <= oldest):
+                self.rssi_low.popleft()
+            if(self.rssi_high[0][0] <= oldest):
+                self.rssi_high.popleft()
+
+    def expected(self):
+        return 0 if self.last is None else self.last - self.first + 1
+
+    def lost(self):
+        return self.expected() - self.received
+
+    def loss(self, window = None):
+        # Fraction of the ids lost, over the whole link or over one of the windows
+        with self.lock:
+            expected = self.expected()
+            if(expected == 0):
+                return 0.0
+            if(window is None):
+                return (expected - self.received) / expected
+            i = self.windows.index(window)
+            span = min(window, expected)
+            return (span - self.in_window[i]) / span
+
+    def rssi(self):
+        # (mean, standard deviation, min, max) of the recent RSSI values
+        with self.lock:
+            n = len(self.rssi_values)
+            if(n == 0):
+                return None
+            mean = self.rssi_sum / n
+            std = math.sqrt(max(0.0, self.rssi_squares / n - mean * mean))
+            return (mean, std, self.rssi_low[0][1], self.rssi_high[0][1])
+
+    def last_gap(self):
+        # Length in packets of the most recent gap, 0 when there was none
+        with self.lock:
+            if(not self.gaps):
+                return 0
+            start, end = self.gaps[-1]
+            return end - start + 1
+
+    def summary(self):
+        losses = ' / '.join('{:.0f}%'.format(100 * self.loss(window)) for window in self.windows)
+        text = 'loss {} (last {} packets), {} lost of {}'.format(
+            losses, '/'.join(str(window) for window in self.windows), self.lost(), self.expected())
+        rssi = self.rssi()
+        if(rssi is not None):
+            text += ', RSSI {:.0f} ± {:.0f} dbm'.format(rssi[0], rssi[1])
+        return text
+
+def analyse(path, **kwargs):
+    # Runs a whole log through a LinkQuality, lines are taken in file order
+    link = LinkQuality(**kwargs)
+    with open(path, newline = '') as f:
+        for line in f:
+            try:
+                # Merged datasets carry derived columns after the telemetry fields
+                packet = parse_line(','.join(line.strip().split(',')[:len(FIELDS)]))
+            except FrameError:
+                continue
+            link.update(packet.id, packet.rssi)
+    return link
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Packet loss and RSSI statistics of a MOIST log')
+    parser.add_argument('log')
+    parser.add_argument('--gaps', type = int, default = 10, help = 'how many of the longest gaps to list')
+    args = parser.parse_args()
+
+    link = analyse(args.log, max_gaps = None)
+    print(link.summary())
+    print('{} late, {} duplicate packets'.format(link.late, link.duplicates))
+    longest = sorted(link.gaps, key = lambda gap: gap[0] - gap[1])[:args.gaps]
+    for start, end in longest:
+        print('ids {}-{}: {} packets lost'.format(start, end, end - start + 1))
+
+if __name__ == '__main__':
+    main()
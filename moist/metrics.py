@@ -0,0 +1,54 @@
+import collections
+import threading
+import time
+
+# Throughput and latency of the ingest pipeline.
+#
+# received() is called when a packet comes off the source and delivered() when
+# it has gone all the way through the consumer, the GUI calls it once the
+# packet has been drawn. Rates are measured over a sliding window and latency
+# statistics over the most recent packets.
+
+class PipelineStats:
+    def __init__(self, window = 10.0, samples = 1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.arrivals = collections.deque()
+        self.latencies = collections.deque(maxlen = samples)
+        self.total = 0
+        self.started = time.time()
+
+    def received(self, received_at = None):
+        now = time.time() if received_at is None else received_at
+        with self.lock:
+            self.total += 1
+            self.arrivals.append(now)
+            while(self.arrivals and self.arrivals[0] < now - self.window):
+                self.arrivals.popleft()
+
+    def delivered(self, received_at, now = None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.latencies.append(now - received_at)
+
+    def rate(self):
+        # Packets per second over the sliding window
+        with self.lock:
+            if(not self.arrivals):
+                return 0.0
+            span = min(self.window, max(time.time() - self.started, 1e-9))
+            return len(self.arrivals) / span
+
+    def latency(self):
+        # (mean, 95th percentile, max) in seconds of the recent packets
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if(not ordered):
+            return (0.0, 0.0, 0.0)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return (sum(ordered) / len(ordered), p95, ordered[-1])
+
+    def summary(self):
+        mean, p95, worst = self.latency()
+        return '{:.1f} packets/s, latency {:.0f} ms (p95 {:.0f} ms, max {:.0f} ms)'.format(
+            self.rate(), mean * 1000, p95 * 1000, worst * 1000)
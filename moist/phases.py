@@ -0,0 +1,110 @@
+import numpy as np
+
+from moist.conversions import hypsometric_altitude
+
+# Flight phases from the altitude or pressure series of a flight.
+#
+# Everything is a handful of whole array passes, so a flight of any length is
+# classified in linear time, and all thresholds are in meters and seconds
+# rather than samples, so irregular sampling and gaps in the telemetry do not
+# change the result.
+#
+#   ground       median altitude before the first climb of `climb` meters
+#   launch       last sample within `pad_tolerance` of the ground before that climb
+#   burst        highest point, ignoring single samples more than `climb`
+#                meters off their neighbours
+#   landing      first sample after the burst, less than `landed_height` over
+#                the ground, from which the altitude changes by less than
+#                `landed_rate` m/s over `landed_window` seconds, None when the
+#                signal was lost in the air
+#   last_signal  last sample
+#
+# The phases between them are PAD, ASCENT, DESCENT and LANDED.
+
+PAD = 'pad'
+ASCENT = 'ascent'
+DESCENT = 'descent'
+LANDED = 'landed'
+
+class FlightPhases:
+    def __init__(self, times, launch, burst, landing, last_signal, ground):
+        self.times = times
+        self.launch = launch
+        self.burst = burst
+        self.landing = landing
+        self.last_signal = last_signal
+        self.ground = ground
+
+    def events(self):
+        # [(name, index, time)] of the events that happened, in order
+        events = [('launch', self.launch), ('burst', self.burst), ('landing', self.landing), ('last_signal', self.last_signal)]
+        return [(name, index, self.times[index]) for name, index in events if index is not None]
+
+    def time(self, name):
+        index = getattr(self, name)
+        return None if index is None else self.times[index]
+
+    def ascent(self):
+        return slice(self.launch, self.burst + 1)
+
+    def descent(self):
+        return slice(self.burst, (self.landing if self.landing is not None else self.last_signal) + 1)
+
+    def labels(self):
+        # The phase of every sample
+        index = np.arange(len(self.times))
+        landing = self.landing if self.landing is not None else len(self.times)
+        return np.select([index < self.launch, index <= self.burst, index < landing],
+                         [PAD, ASCENT, DESCENT], LANDED)
+
+    def summary(self):
+        parts = ['{} at {} ({})'.format(name, index, self.times[index]) for name, index, _ in self.events()]
+        return ', '.join(parts)
+
+def despike(values, tolerance):
+    # NaN for the samples more than tolerance off the median of them and their neighbours
+    if(len(values) < 3):
+        return values
+    stacked = np.stack([values[:-2], values[1:-1], values[2:]])
+    median = np.concatenate([values[:1], np.median(stacked, axis = 0), values[-1:]])
+    return np.where(np.abs(values - median) > tolerance, np.nan, values)
+
+def pressure_altitude(pressure, temperature = 15.0, reference_samples = 10):
+    # Altitude over the start of the series, isothermal at temperature
+    pressure = np.asarray(pressure, dtype = float)
+    p0 = np.median(pressure[:reference_samples])
+    return hypsometric_altitude(pressure, temperature, p0)
+
+def detect_phases(times, altitude = None, pressure = None, temperature = 15.0, climb = 50.0, pad_tolerance = 3.0,
+                  landed_rate = 0.5, landed_window = 30.0, landed_height = 1000.0):
+    # times are increasing seconds, irregular steps and gaps are fine. Give the
+    # altitude in meters, or the pressure and temperature it is computed from.
+    times = np.asarray(times)
+    seconds = times.astype(float) if np.issubdtype(times.dtype, np.number) else (times - times[0]) / np.timedelta64(1, 's')
+    if(altitude is None):
+        if(pressure is None):
+            raise ValueError('detect_phases() needs the altitude or the pressure')
+        altitude = pressure_altitude(pressure, temperature)
+    altitude = despike(np.asarray(altitude, dtype = float), climb)
+    n = len(altitude)
+    if(n == 0):
+        raise ValueError('detect_phases() needs at least one sample')
+
+    burst = int(np.nanargmax(altitude))
+    before = altitude[:burst + 1]
+    above = np.flatnonzero(before > np.nanmin(before) + climb)
+    rise = int(above[0]) if len(above) else burst
+    ground = float(np.nanmedian(altitude[:max(rise, 1)]))
+    on_pad = np.flatnonzero(altitude[:rise] <= ground + pad_tolerance)
+    launch = int(on_pad[-1]) if len(on_pad) else 0
+
+    # Altitude change over the next landed_window seconds, from every sample after the burst
+    after = np.arange(burst, n)
+    ahead = np.searchsorted(seconds, seconds[after] + landed_window)
+    complete = ahead < n # Windows that end before the signal does
+    after, ahead = after[complete], ahead[complete]
+    rate = np.abs(altitude[ahead] - altitude[after]) / (seconds[ahead] - seconds[after])
+    flat = np.flatnonzero((rate < landed_rate) & (altitude[after] < ground + landed_height))
+    landing = int(after[flat[0]]) if len(flat) else None
+
+    return FlightPhases(times, launch, burst, landing, n - 1, ground)
@@ -0,0 +1,118 @@
+import numpy as np
+
+from moist.phases import ASCENT, DESCENT
+
+# Vertical profiles of any channel on a common altitude or pressure grid.
+#
+# The samples of many profiles are binned in one pass: every sample carries
+# a group number (the flight, the sounding, or flight and phase), and the
+# statistics of all groups and all bins come out of np.bincount over the
+# combined group * bins + bin index. Interpolation does the same with a
+# single np.interp, each group is shifted along the coordinate by its own
+# offset so the groups do not overlap. The work is linear in the number of
+# samples however many flights or soundings there are.
+#
+#   edges = np.arange(0, 20000, 250)
+#   moist = bin_profile(altitude, temp_ntc, edges, phase_groups(phases))
+#   sonde = bin_profile(sonde_altitude, sonde_temp, edges)
+#   residual = moist.residual(sonde)   # [ascent, descent] x bins
+#   bias, rms, bins = residual_stats(residual)
+
+ASCENT_GROUP = 0
+DESCENT_GROUP = 1
+
+class Profile:
+    def __init__(self, edges, count, mean, std):
+        self.edges = edges
+        self.count = count # (groups, bins), like mean and std
+        self.mean = mean
+        self.std = std
+
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def groups(self):
+        return self.mean.shape[0]
+
+    def residual(self, reference, reference_group = None):
+        # Mean of every group minus the mean of the reference, NaN where either has no samples.
+        # The reference is its only group, its group of the same number, or reference_group.
+        if(reference_group is None and reference.groups() != 1):
+            return self.mean - reference.mean
+        return self.mean - reference.mean[reference_group or 0]
+
+def phase_groups(phases):
+    # ASCENT_GROUP or DESCENT_GROUP for every sample of a flight, -1 on the ground
+    labels = phases.labels()
+    return np.select([labels == ASCENT, labels == DESCENT], [ASCENT_GROUP, DESCENT_GROUP], -1)
+
+def pressure_edges(low, high, bins):
+    # Edges evenly spaced in log pressure, so the bins are of similar height, increasing
+    return np.geomspace(low, high, bins + 1)
+
+def _valid(coordinate, values, groups):
+    coordinate = np.asarray(coordinate, dtype = float)
+    values = np.asarray(values, dtype = float)
+    groups = np.zeros(len(values), dtype = np.int64) if groups is None else np.asarray(groups, dtype = np.int64)
+    keep = np.isfinite(coordinate) & np.isfinite(values) & (groups >= 0)
+    return coordinate[keep], values[keep], groups[keep]
+
+def bin_profile(coordinate, values, edges, groups = None, n_groups = None):
+    # Count, mean and standard deviation of values in every bin of coordinate
+    # between the increasing edges, per group. Samples with NaN, outside the
+    # edges or with a negative group are left out.
+    edges = np.asarray(edges, dtype = float)
+    bins = len(edges) - 1
+    coordinate, values, groups = _valid(coordinate, values, groups)
+    index = np.searchsorted(edges, coordinate, side = 'right') - 1
+    inside = (index >= 0) & (index < bins)
+    if(n_groups is None):
+        n_groups = int(groups.max()) + 1 if len(groups) else 1
+    flat = groups[inside] * bins + index[inside]
+    values = values[inside]
+
+    size = n_groups * bins
+    count = np.bincount(flat, minlength = size)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = np.bincount(flat, values, minlength = size) / count
+        squares = np.bincount(flat, (values - mean[flat]) ** 2, minlength = size) # Two pass, no cancellation
+        std = np.sqrt(squares / (count - 1))
+    std[count < 2] = np.nan
+    shape = (n_groups, bins)
+    return Profile(edges, count.reshape(shape), mean.reshape(shape), std.reshape(shape))
+
+def interpolate_profile(coordinate, values, grid, groups = None, n_groups = None):
+    # values interpolated onto the grid of coordinates, (groups, len(grid)),
+    # NaN outside the range each group covers
+    grid = np.asarray(grid, dtype = float)
+    coordinate, values, groups = _valid(coordinate, values, groups)
+    if(n_groups is None):
+        n_groups = int(groups.max()) + 1 if len(groups) else 1
+    result = np.full((n_groups, len(grid)), np.nan)
+    if(not len(values)):
+        return result
+
+    # Shifting every group past the span of all the others makes them one increasing series
+    span = max(coordinate.max(), grid.max()) - min(coordinate.min(), grid.min()) + 1
+    order = np.lexsort((coordinate, groups))
+    coordinate, values, groups = coordinate[order], values[order], groups[order]
+    offsets = np.arange(n_groups)[:, None] * span
+    interpolated = np.interp(grid[None, :] + offsets, coordinate + groups * span, values)
+
+    present = np.bincount(groups, minlength = n_groups) > 0
+    low = np.full(n_groups, np.inf)
+    high = np.full(n_groups, -np.inf)
+    np.minimum.at(low, groups, coordinate)
+    np.maximum.at(high, groups, coordinate)
+    covered = present[:, None] & (grid[None, :] >= low[:, None]) & (grid[None, :] <= high[:, None])
+    result[covered] = interpolated[covered]
+    return result
+
+def residual_stats(residual):
+    # (bias, rms, bins) of a residual per group, over the bins where it is defined
+    residual = np.atleast_2d(residual)
+    bins = np.isfinite(residual).sum(axis = 1)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        bias = np.nansum(residual, axis = 1) / bins
+        rms = np.sqrt(np.nansum(residual ** 2, axis = 1) / bins)
+    return bias, rms, bins
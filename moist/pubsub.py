@@ -0,0 +1,286 @@
+import argparse
+import collections
+import json
+import socket
+import threading
+import time
+
+from moist.telemetry import FIELDS, Packet, format_packet
+
+# Publish/subscribe of decoded samples over a local TCP socket.
+#
+# Messages are JSON objects, one per line, numbered by the publisher with a
+# running seq. The publisher keeps the last `history` messages. A subscriber
+# opens with one hello line, {"session": ..., "since": n}, and is sent every
+# message after n that is still in the history before it joins the live
+# stream, so a viewer started late catches up and one that lost its
+# connection resumes where it stopped. The session changes whenever the
+# publisher restarts, a subscriber that comes back from an earlier session
+# gets the whole history again.
+#
+# publish() never blocks on the network. Every subscriber has its own bounded
+# queue and writer thread, and a subscriber that falls further behind than
+# its queue is disconnected, it catches up from the history when it comes
+# back. Capture throughput does not depend on how many viewers are attached
+# or how slow they are.
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 5780
+DEFAULT_HISTORY = 20000 # Messages kept for late subscribers, a whole flight at 1 Hz is ~2500
+DEFAULT_BACKLOG = 1000  # Live messages a subscriber may fall behind by
+HELLO_TIMEOUT = 2.0
+
+def parse_address(text, default_host = DEFAULT_HOST):
+    # 'host:port', ':port' or 'port'
+    host, _, port = text.rpartition(':')
+    return host or default_host, int(port)
+
+def encode(message):
+    return (json.dumps(message, separators = (',', ':')) + '\n').encode()
+
+def packet_from_message(message):
+    fields = message['packet']
+    return Packet(*(fields[name] for name in FIELDS))
+
+class Connection(threading.Thread):
+    # Writer for one subscriber, fed by the publisher under its lock
+    def __init__(self, publisher, sock, address, capacity):
+        super().__init__(name = 'subscriber-{}:{}'.format(*address[:2]), daemon = True)
+        self.publisher = publisher
+        self.sock = sock
+        self.address = address
+        self.capacity = capacity
+        self.queue = collections.deque()
+        self.ready = threading.Condition(threading.Lock())
+        self.closed = False
+        self.sent = 0
+
+    def offer(self, line):
+        # Publisher lock held
+        with self.ready:
+            if(self.closed):
+                return
+            if(len(self.queue) >= self.capacity):
+                self.closed = True # Too slow, it resumes from the history when it reconnects
+                self.publisher.overflows += 1
+            else:
+                self.queue.append(line)
+            self.ready.notify()
+
+    def hello(self):
+        # (session, since) the subscriber asked for, (None, 0) if it said nothing
+        self.sock.settimeout(HELLO_TIMEOUT)
+        data = b''
+        try:
+            while(b'\n' not in data and len(data) < 4096):
+                chunk = self.sock.recv(4096)
+                if(not chunk):
+                    break
+                data += chunk
+            request = json.loads(data.split(b'\n', 1)[0] or b'{}')
+            return request.get('session'), int(request.get('since') or 0)
+        except (OSError, ValueError, AttributeError):
+            return None, 0
+        finally:
+            self.sock.settimeout(None)
+
+    def run(self):
+        session, since = self.hello()
+        self.publisher.attach(self, since if session in (None, self.publisher.session) else 0)
+        try:
+            while(True):
+                with self.ready:
+                    while(not self.queue and not self.closed):
+                        self.ready.wait()
+                    if(self.closed and not self.queue):
+                        break
+                    lines = list(self.queue)
+                    self.queue.clear()
+                    closed = self.closed
+                self.sock.sendall(b''.join(lines))
+                self.sent += len(lines)
+                if(closed):
+                    break
+        except OSError:
+            pass
+        finally:
+            self.publisher.detach(self)
+            self.sock.close()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+class Publisher:
+    def __init__(self, host = DEFAULT_HOST, port = DEFAULT_PORT, history = DEFAULT_HISTORY, backlog = DEFAULT_BACKLOG):
+        self.host = host
+        self.port = port
+        self.history = collections.deque(maxlen = history) # (seq, line)
+        self.backlog = backlog
+        self.session = '{:x}'.format(time.time_ns())
+        self.seq = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.overflows = 0
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1] # The real one when port was 0
+        self.thread = threading.Thread(target = self.accept, name = 'publisher', daemon = True)
+        self.thread.start()
+        return self
+
+    def accept(self):
+        while(True):
+            try:
+                sock, address = self.server.accept()
+            except OSError:
+                break # Closed by stop()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Connection(self, sock, address, self.history.maxlen + self.backlog).start()
+
+    def attach(self, connection, since):
+        # The catch up and the live stream are queued under one lock, nothing is lost or repeated in between
+        with self.lock:
+            connection.offer(encode({'type': 'hello', 'session': self.session, 'seq': self.seq}))
+            for seq, line in self.history:
+                if(seq > since):
+                    connection.offer(line)
+            self.connections.add(connection)
+
+    def detach(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+
+    def publish(self, message):
+        # Numbers the message and hands it to every subscriber, returns its seq
+        with self.lock:
+            self.seq += 1
+            message['seq'] = self.seq
+            line = encode(message)
+            self.history.append((self.seq, line))
+            for connection in self.connections:
+                connection.offer(line)
+            return self.seq
+
+    def subscribers(self):
+        with self.lock:
+            return len(self.connections)
+
+    def stop(self):
+        if(self.server is not None):
+            try:
+                self.server.shutdown(socket.SHUT_RDWR) # Wakes up accept()
+            except OSError:
+                pass
+            self.server.close()
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close() # Sends what is queued, then hangs up
+        for connection in connections:
+            connection.join(1.0)
+
+class Subscriber:
+    # Client side. Iterating yields the messages of the publisher in order,
+    # reconnecting with backoff and resuming after the last seq it saw.
+    def __init__(self, host = DEFAULT_HOST, port = DEFAULT_PORT, since = 0, timeout = 0.5, backoff = 0.5, max_backoff = 10.0):
+        self.host = host
+        self.port = port
+        self.since = since
+        self.session = None
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.pending = b''
+        self.missed = 0 # Messages that were gone from the history when we came back
+        self.stopped = threading.Event()
+
+    def open(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout = self.timeout)
+        self.sock.sendall(encode({'session': self.session, 'since': self.since}))
+        self.pending = b''
+
+    def receive(self):
+        # Messages that arrived within the timeout, raises OSError when the connection is gone
+        try:
+            chunk = self.sock.recv(65536)
+        except socket.timeout:
+            return []
+        if(not chunk):
+            raise ConnectionError('publisher closed the connection')
+        self.pending += chunk
+        *lines, self.pending = self.pending.split(b'\n')
+        messages = []
+        for line in lines:
+            message = json.loads(line)
+            if(message.get('type') == 'hello'):
+                if(message['session'] != self.session):
+                    self.session = message['session']
+                    self.since = 0
+                continue
+            seq = message['seq']
+            if(seq > self.since + 1 and self.since):
+                self.missed += seq - self.since - 1
+            self.since = seq
+            messages.append(message)
+        return messages
+
+    def close(self):
+        if(self.sock is not None):
+            self.sock.close()
+            self.sock = None
+
+    def stop(self):
+        self.stopped.set()
+
+    def __iter__(self):
+        delay = self.backoff
+        while(not self.stopped.is_set()):
+            try:
+                if(self.sock is None):
+                    self.open()
+                    delay = self.backoff
+                yield from self.receive()
+            except OSError:
+                self.close()
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
+        self.close()
+
+class DaemonSource(Subscriber):
+    # Source for moist.ingest.Ingest that reads the samples of a daemon, so the
+    # GUI can view a daemon's stream with its usual pipeline
+    def __init__(self, host = DEFAULT_HOST, port = DEFAULT_PORT, timeout = 0.5):
+        super().__init__(host, port, timeout = timeout)
+        self.name = 'daemon-{}:{}'.format(host, port)
+
+    def read(self, binary = False):
+        # Telemetry lines as the receiver would print them
+        lines = [format_packet(packet_from_message(m)) + '\n' for m in self.receive() if m.get('type') == 'sample']
+        return ''.join(lines).encode()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Print or log the samples published by a MOIST daemon')
+    parser.add_argument('address', nargs = '?', default = '{}:{}'.format(DEFAULT_HOST, DEFAULT_PORT), help = 'host:port of the daemon')
+    parser.add_argument('--since', type = int, default = 0, help = 'start after this seq, 0 for the whole history')
+    parser.add_argument('--csv', action = 'store_true', help = 'print telemetry lines instead of JSON')
+    args = parser.parse_args()
+
+    host, port = parse_address(args.address)
+    subscriber = Subscriber(host, port, since = args.since)
+    try:
+        for message in subscriber:
+            if(not args.csv):
+                print(json.dumps(message), flush = True)
+            elif(message.get('type') == 'sample'):
+                print(format_packet(packet_from_message(message)), flush = True)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import array
+import gzip
+import json
+import math
+
+import numpy as np
+
+from moist.conversions import KELVIN
+
+# Streaming reader for radiosonde soundings in GeoJSON.
+#
+# A sounding is a FeatureCollection with one Point feature per measurement,
+# the properties holding the sonde's readings. A file may hold one sounding
+# or a whole season of them, as concatenated collections, one collection per
+# line, or a JSON array of collections, optionally gzipped. iter_features()
+# walks the file in fixed size chunks and decodes one feature at a time, so
+# memory stays at a chunk plus one feature however big the file is.
+#
+# read_soundings() collects every Point of every sounding into typed arrays
+# in that single pass, NaN where a feature lacks a property, and does the
+# unit conversions on the finished arrays:
+#
+#   columns, soundings = read_soundings('data_radiosonde.geojson')
+#   columns['temp_c'], columns['pressure_pa'], columns['sounding']
+#
+#   python -m moist.radiosonde season/*.geojson.gz
+
+CHUNK = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+# Properties read from every Point, as the sonde reports them (K, hPa, m, m/s)
+PROPERTIES = ['time', 'gpheight', 'temp', 'dewpoint', 'pressure', 'wind_u', 'wind_v']
+COORDINATES = ['lng', 'lat', 'alt']
+
+class _Stream:
+    # Text read in chunks with a position, decoding JSON values at the position
+    def __init__(self, f, chunk = CHUNK):
+        self.f = f
+        self.chunk = chunk
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        data = self.f.read(self.chunk)
+        if(not data):
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, '' at the end of the file
+        while(True):
+            while(self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE):
+                self.position += 1
+            if(self.position < len(self.buffer)):
+                return self.buffer[self.position]
+            if(not self.fill()):
+                return ''
+
+    def expect(self, characters):
+        character = self.peek()
+        if(character == '' or character not in characters):
+            raise ValueError('Expected one of {!r} at {!r}'.format(characters, self.buffer[self.position:self.position + 40]))
+        self.position += 1
+        return character
+
+    def value(self):
+        # Decodes the value at the position, reading more until it is complete
+        self.peek()
+        while(True):
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number that ends with the buffer may go on in the next chunk
+                if(end < len(self.buffer) or self.eof):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if(self.eof):
+                    raise
+            self.fill()
+
+def iter_features(f, soundings = None, chunk = CHUNK):
+    # Yields (sounding index, feature) for every feature of every collection in
+    # the text file f. The other members of each collection are appended to
+    # soundings, if given, once the collection has been read.
+    stream = _Stream(f, chunk)
+    sounding = 0
+    in_array = stream.peek() == '['
+    if(in_array):
+        stream.expect('[')
+    while(stream.peek() not in ('', ']')):
+        stream.expect('{')
+        members = {}
+        while(stream.peek() != '}'):
+            key = stream.value()
+            stream.expect(':')
+            if(key == 'features'):
+                stream.expect('[')
+                while(stream.peek() != ']'):
+                    yield sounding, stream.value()
+                    if(stream.peek() == ','):
+                        stream.expect(',')
+                stream.expect(']')
+            else:
+                members[key] = stream.value()
+            if(stream.peek() == ','):
+                stream.expect(',')
+        stream.expect('}')
+        if(soundings is not None):
+            soundings.append(members)
+        sounding += 1
+        if(in_array and stream.peek() == ','):
+            stream.expect(',')
+
+def open_text(path):
+    if(path.endswith('.gz')):
+        return gzip.open(path, 'rt', encoding = 'utf-8')
+    return open(path, encoding = 'utf-8')
+
+def read_soundings(path, chunk = CHUNK):
+    # ({column: array}, [members of each collection]) of every Point in the file
+    values = {name: array.array('d') for name in PROPERTIES + COORDINATES}
+    index = array.array('i')
+    soundings = []
+    nan = math.nan
+    with open_text(path) as f:
+        for sounding, feature in iter_features(f, soundings, chunk):
+            geometry = feature.get('geometry') or {}
+            if(geometry.get('type') != 'Point'):
+                continue # Like the LineString of the whole track that ends a sounding
+            properties = feature.get('properties') or {}
+            for name in PROPERTIES:
+                value = properties.get(name)
+                values[name].append(nan if value is None else value)
+            coordinates = geometry.get('coordinates') or []
+            for i, name in enumerate(COORDINATES):
+                values[name].append(coordinates[i] if i < len(coordinates) and coordinates[i] is not None else nan)
+            index.append(sounding)
+
+    columns = {name: np.frombuffer(column, dtype = np.float64) for name, column in values.items()}
+    columns['sounding'] = np.frombuffer(index, dtype = np.int32)
+    columns['temp_c'] = columns['temp'] - KELVIN
+    columns['dewpoint_c'] = columns['dewpoint'] - KELVIN
+    columns['pressure_pa'] = columns['pressure'] * 100
+    return columns, soundings
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Summary of the radiosonde soundings in GeoJSON files')
+    parser.add_argument('path', nargs = '+')
+    args = parser.parse_args()
+
+    for path in args.path:
+        columns, soundings = read_soundings(path)
+        for i, members in enumerate(soundings):
+            selected = columns['sounding'] == i
+            if(not selected.any()):
+                continue
+            properties = members.get('properties') or {}
+            print('{} #{} {}: {} points, up to {:.0f} m, down to {:.1f} °C and {:.1f} hPa'.format(
+                path, i, properties.get('sonde_serial', '-'), int(selected.sum()), np.nanmax(columns['gpheight'][selected]),
+                np.nanmin(columns['temp_c'][selected]), np.nanmin(columns['pressure'][selected])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import glob
+import os
+import struct
+import time
+
+import numpy as np
+
+from moist.telemetry import FIELDS, HEADER, format_fields, hms_to_seconds, parse_fields, seconds_to_hms
+
+# Fixed record binary recording format.
+#
+# A recording is a 32 byte header followed by fixed width little endian
+# records, one per telemetry line. Files are only ever appended to while live,
+# and a recording can be opened with np.memmap, so loading a whole archive is
+# just mapping files instead of parsing text. The record holds the same twelve
+# fields as the CSV recordings, with the sensor values at the precision the
+# 34 byte radio packet carries them (float32, float16 for humidity and the
+# SCD30 temperature). The clock fields are stored as seconds. Converting back
+# to CSV gives the same values, although a float16 value that sits exactly
+# between two printed decimals can come out one unit off in the last digit.
+#
+# With several ground stations every record also says which station delivered
+# it. The names of the stations follow the fixed header as a newline separated
+# table, the header size covers it, and a record holds the index into that
+# table. Version 1 recordings, which have no station field, are still read.
+
+MAGIC = b'MOISTREC'
+VERSION = 2
+
+# magic, version, header size, record size, field count, reserved
+HEADER_STRUCT = struct.Struct('<8sHHHH16x')
+HEADER_SIZE = HEADER_STRUCT.size
+
+# Same layout as DTYPE, used to append single records while live
+RECORD_STRUCT = struct.Struct('<IIIfffffefehB')
+
+DTYPE_V1 = np.dtype([
+    ('elapsed_time', '<u4'), # seconds since the receiver started
+    ('id', '<u4'),
+    ('time', '<u4'),         # GPS time of day in seconds
+    ('alt', '<f4'),
+    ('lat', '<f4'),
+    ('lng', '<f4'),
+    ('pressure', '<f4'),
+    ('ohm', '<f4'),
+    ('hum', '<f2'),
+    ('co2', '<f4'),
+    ('temp', '<f2'),
+    ('rssi', '<i2')
+])
+
+DTYPE = np.dtype(DTYPE_V1.descr + [('station', 'u1')]) # Index into the station table of the header
+DTYPES = {1: DTYPE_V1, 2: DTYPE}
+
+class RecordingError(Exception):
+    pass
+
+def record_from_packet(packet, station = 0):
+    return (
+        hms_to_seconds(packet.elapsed_time),
+        packet.id,
+        hms_to_seconds(packet.time),
+        packet.alt,
+        packet.lat,
+        packet.lng,
+        packet.pressure,
+        packet.ohm,
+        packet.hum,
+        packet.co2,
+        packet.temp,
+        packet.rssi,
+        station
+    )
+
+def record_from_fields(fields):
+    # Converts the twelve CSV strings of a telemetry line to a record tuple
+    return record_from_packet(parse_fields(fields))
+
+def fields_from_record(record):
+    # Inverse of record_from_fields, gives the strings of the CSV layout
+    values = list(record)[:len(FIELDS)]
+    values[0] = seconds_to_hms(values[0])
+    values[2] = seconds_to_hms(values[2])
+    return format_fields(values)
+
+def read_header(f):
+    # (header size, record dtype, station names)
+    data = f.read(HEADER_SIZE)
+    if(len(data) < HEADER_SIZE):
+        raise RecordingError('Recording header is truncated')
+    magic, version, header_size, record_size, field_count = HEADER_STRUCT.unpack(data)
+    if(magic != MAGIC):
+        raise RecordingError('Not a MOIST recording')
+    dtype = DTYPES.get(version)
+    if(dtype is None or record_size != dtype.itemsize or field_count != len(dtype.names)):
+        raise RecordingError('Unsupported recording version {}'.format(version))
+    table = f.read(header_size - HEADER_SIZE)
+    if(len(table) < header_size - HEADER_SIZE):
+        raise RecordingError('Recording header is truncated')
+    stations = table.rstrip(b'\0').decode().split('\n') if table.strip(b'\0') else []
+    return header_size, dtype, stations
+
+def write_header(f, stations):
+    table = '\n'.join(stations).encode()
+    f.write(HEADER_STRUCT.pack(MAGIC, VERSION, HEADER_SIZE + len(table), DTYPE.itemsize, len(DTYPE.names)))
+    f.write(table)
+
+class RecordingWriter:
+    def __init__(self, path, flush_interval = 1.0, append = True, stations = None):
+        # stations: names of the ground stations, records refer to them by name
+        self.path = path
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.count = 0
+        self.rejected = 0 # Records with a value out of range of the format, not written
+        self.stations = list(stations or [])
+
+        exists = append and os.path.isfile(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'r+b' if exists else 'wb')
+        if(exists):
+            try:
+                header_size, dtype, stations = read_header(self.file)
+                if(dtype != DTYPE):
+                    raise RecordingError('Can not append to a version 1 recording')
+                if(self.stations and stations != self.stations):
+                    raise RecordingError('Recording was made with the stations {}'.format(', '.join(stations)))
+            except RecordingError:
+                self.file.close()
+                raise
+            self.stations = stations
+            # Drop a record that was only half written when we last stopped
+            self.count = (os.path.getsize(path) - header_size) // DTYPE.itemsize
+            self.file.seek(header_size + self.count * DTYPE.itemsize)
+            self.file.truncate()
+        else:
+            write_header(self.file, self.stations)
+
+    def append(self, record):
+        # Raises ValueError for a value the format can not hold, like hum=70000 for
+        # the float16 fields, the file is left as it was
+        try:
+            data = RECORD_STRUCT.pack(*record)
+        except (struct.error, OverflowError):
+            self.rejected += 1
+            raise ValueError('Record value out of range of the recording format')
+        self.file.write(data)
+        self.count += 1
+        if(time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def append_fields(self, fields):
+        self.append(record_from_fields(fields))
+
+    def append_packet(self, packet, station = None):
+        self.append(record_from_packet(packet, 0 if station is None else self.stations.index(station)))
+
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if(not self.file.closed):
+            self.file.close()
+
+def open_recording(path):
+    # Zero copy, read only view of every complete record in the file
+    with open(path, 'rb') as f:
+        header_size, dtype, _ = read_header(f)
+    count = (os.path.getsize(path) - header_size) // dtype.itemsize
+    if(count == 0):
+        return np.zeros(0, dtype = dtype)
+    return np.memmap(path, dtype = dtype, mode = 'r', offset = header_size, shape = (count,))
+
+def recording_stations(path):
+    # Names of the stations the station field of the records refers to, [] for a single station
+    with open(path, 'rb') as f:
+        return read_header(f)[2]
+
+def open_archive(directory, pattern = '*.mrec'):
+    # Maps every recording in a directory, keyed by file name
+    return {os.path.basename(p): open_recording(p) for p in sorted(glob.glob(os.path.join(directory, pattern)))}
+
+def csv_to_recording(csv_path, path):
+    # Returns the number of records written, lines that do not parse are skipped.
+    # Extra columns, like the derived ones of a merged dataset, are dropped.
+    writer = RecordingWriter(path, append = False)
+    try:
+        with open(csv_path, newline = '') as f:
+            for fields in csv.reader(f):
+                try:
+                    writer.append_fields(fields[:len(FIELDS)])
+                except ValueError:
+                    continue # Header line or receiver debug output
+        return writer.count
+    finally:
+        writer.close()
+
+def recording_to_csv(path, csv_path):
+    # With several stations the name of the one that delivered a record follows the telemetry fields
+    records = open_recording(path)
+    stations = recording_stations(path)
+    with open(csv_path, 'w', newline = '') as f:
+        f.write(HEADER + (',station\n' if stations else '\n'))
+        for record in records.tolist():
+            fields = fields_from_record(record)
+            if(stations):
+                fields.append(stations[record[-1]])
+            f.write(','.join(fields) + '\n')
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Convert between MOIST CSV and binary recordings')
+    parser.add_argument('direction', choices = ['to-csv', 'from-csv'])
+    parser.add_argument('input')
+    parser.add_argument('output')
+    args = parser.parse_args()
+
+    if(args.direction == 'to-csv'):
+        count = recording_to_csv(args.input, args.output)
+    else:
+        count = csv_to_recording(args.input, args.output)
+    print('Converted {} records to {}'.format(count, args.output))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import os
+import random
+import time
+
+from moist.framing import encode_frame, encode_payload
+from moist.ingest import Ingest, SourceExhausted
+from moist.metrics import PipelineStats
+from moist.stations import StationMerger
+from moist.recording import RecordingError, fields_from_record, open_recording
+from moist.telemetry import FIELDS, FrameError, hms_to_seconds, parse_line
+
+# Replay of recorded flights in place of the serial port.
+#
+# ReplaySource plugs into moist.ingest.Ingest like SerialSource does and
+# streams a CSV log or a binary recording with the timing of its elapsed_time
+# column, at real time, sped up, or as fast as the pipeline can take it. It
+# can add jitter, drop lines and corrupt them, so the ingest and the GUI can be
+# load tested without a receiver. Run as a module it measures how many packets
+# per second the ingest side sustains, with several recordings it replays one
+# station per recording and merges them like the GUI does.
+
+MAX_BATCH = 1000 # Lines handed over per read() when running behind
+
+def load_lines(path):
+    # [(elapsed seconds, line)] of a CSV log or a binary recording
+    entries = []
+    try:
+        records = open_recording(path)
+    except RecordingError:
+        records = None
+    if(records is not None):
+        for record in records.tolist():
+            entries.append((record[0], ','.join(fields_from_record(record))))
+        return entries
+
+    elapsed = 0
+    with open(path, newline = '') as f:
+        for line in f:
+            line = line.strip()
+            if(not line or line.startswith(FIELDS[0] + ',')):
+                continue
+            fields = line.split(',')
+            # Merged datasets carry derived columns after the telemetry fields
+            line = ','.join(fields[:len(FIELDS)])
+            try:
+                elapsed = hms_to_seconds(fields[0])
+            except ValueError:
+                pass # Debug output keeps the time of the line before
+            entries.append((elapsed, line))
+    return entries
+
+class ReplaySource:
+    def __init__(self, path, speed = 1.0, jitter = 0.0, drop = 0.0, corrupt = 0.0,
+                 seed = None, timeout = 0.5, loop = False):
+        # speed 0 replays as fast as possible, jitter is in seconds,
+        # drop and corrupt are probabilities per line
+        self.name = 'replay-' + os.path.basename(path)
+        self.path = path
+        self.speed = speed
+        self.jitter = jitter
+        self.drop = drop
+        self.corrupt = corrupt
+        self.seed = seed
+        self.timeout = timeout
+        self.loop = loop
+        self.entries = None
+        self.dropped = 0
+        self.corrupted = 0
+
+    def open(self):
+        if(self.entries is None):
+            self.entries = load_lines(self.path)
+            if(not self.entries):
+                raise SourceExhausted()
+        self.random = random.Random(self.seed)
+        self.position = 0
+        self.offset = 0.0
+        self.started = time.monotonic()
+        self.next_due = self.schedule(0)
+
+    def schedule(self, position, previous = 0.0):
+        # Seconds after open() at which the line at position is due
+        if(self.speed <= 0):
+            return 0.0
+        due = self.offset + max(0, self.entries[position][0] - self.entries[0][0]) / self.speed
+        if(self.jitter > 0):
+            due += self.random.uniform(0, self.jitter)
+        return max(due, previous) # Jitter delays lines but never reorders them
+
+    def mangle(self, data, binary):
+        self.corrupted += 1
+        data = bytearray(data)
+        position = self.random.randrange(max(1, len(data) - 2))
+        choice = self.random.random()
+        if(choice < 0.5 or binary):
+            data[position] ^= 1 << self.random.randrange(8) # Flipped bit
+        elif(choice < 0.75):
+            del data[position:-2]                          # Truncated line
+        else:
+            data[position:position] = b','                 # Stray separator
+        return bytes(data)
+
+    def encode(self, line, binary):
+        if(not binary):
+            return line.encode() + b'\r\n'
+        try:
+            packet = parse_line(line)
+        except FrameError:
+            return b'' # Debug output has no binary frame
+        return encode_frame(encode_payload(packet), hms_to_seconds(packet.elapsed_time), packet.rssi)
+
+    def read(self, binary = False):
+        if(self.position >= len(self.entries)):
+            if(not self.loop):
+                raise SourceExhausted()
+            # Start over right after the last line
+            self.offset = self.next_due + (2.0 / self.speed if self.speed > 0 else 0.0)
+            self.position = 0
+            self.next_due = self.schedule(0, self.offset)
+
+        now = time.monotonic() - self.started
+        if(self.next_due > now):
+            time.sleep(min(self.timeout, self.next_due - now))
+            now = time.monotonic() - self.started
+            if(self.next_due > now):
+                return b''
+
+        chunks = []
+        while(self.position < len(self.entries) and self.next_due <= now and len(chunks) < MAX_BATCH):
+            line = self.entries[self.position][1]
+            self.position += 1
+            if(self.position < len(self.entries)):
+                self.next_due = self.schedule(self.position, self.next_due)
+            if(self.drop > 0 and self.random.random() < self.drop):
+                self.dropped += 1
+                continue
+            data = self.encode(line, binary)
+            if(data and self.corrupt > 0 and self.random.random() < self.corrupt):
+                data = self.mangle(data, binary)
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def close(self):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay a MOIST recording through the ingest pipeline and measure it')
+    parser.add_argument('path', nargs = '+', help = 'CSV log or binary recording, one per station')
+    parser.add_argument('--speed', type = float, default = 0, help = 'replay speed, 1 is real time and 0 as fast as possible')
+    parser.add_argument('--jitter', type = float, default = 0, help = 'random delay per line in seconds')
+    parser.add_argument('--drop', type = float, default = 0, help = 'probability of dropping a line')
+    parser.add_argument('--corrupt', type = float, default = 0, help = 'probability of corrupting a line')
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('--binary', action = 'store_true', help = 'replay as binary frames instead of CSV lines')
+    parser.add_argument('--duration', type = float, default = None, help = 'loop the recording for this many seconds')
+    args = parser.parse_args()
+
+    stats = PipelineStats()
+
+    def consume(packet, received_at, station):
+        stats.received(received_at)
+        stats.delivered(received_at)
+
+    merger = StationMerger(on_packet = consume)
+    sources = []
+    ingests = []
+    for path in args.path:
+        source = ReplaySource(path, args.speed, args.jitter, args.drop, args.corrupt, args.seed,
+                              loop = args.duration is not None)
+        sources.append(source)
+        ingests.append(Ingest(source,
+                              on_packet = lambda packet, received_at, name = source.name: merger.offer(name, packet, received_at),
+                              binary = args.binary))
+    started = time.monotonic()
+    for ingest in ingests:
+        ingest.start()
+    try:
+        while(any(ingest.is_alive() for ingest in ingests)):
+            ingests[0].join(1.0)
+            if(args.duration is not None and time.monotonic() - started >= args.duration):
+                for ingest in ingests:
+                    ingest.stop()
+            print(stats.summary())
+    except KeyboardInterrupt:
+        for ingest in ingests:
+            ingest.stop()
+    for ingest in ingests:
+        ingest.join()
+    elapsed = time.monotonic() - started
+    packets = sum(ingest.stats.packets for ingest in ingests)
+    print('{} packets in {:.2f} s, {:.0f} packets/s sustained, {} rejected, {} dropped, {} corrupted, {} duplicates'.format(
+        packets, elapsed, packets / elapsed, sum(ingest.stats.rejected for ingest in ingests),
+        sum(source.dropped for source in sources), sum(source.corrupted for source in sources), merger.duplicates))
+
+if __name__ == '__main__':
+    main()
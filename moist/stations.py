@@ -0,0 +1,101 @@
+import collections
+import threading
+import time
+
+# Merge of the packet streams of several ground stations.
+#
+# Every receiver runs its own ingest thread and offers its packets here. The
+# first copy of a packet id goes on to the timeline straight away, so a second
+# station never delays the plots. Later copies of the same id only update which
+# station heard it best. Once an id has dropped out of the window of recent
+# ids, or has waited max_age seconds for copies, its best copy is final and
+# handed to on_final, tagged with the station that delivered it. The window is
+# an OrderedDict of fixed size, so memory is bounded and every packet costs
+# the same however many stations there are.
+# The callbacks run one at a time under the merge lock, so consumers see a
+# single stream no matter how many threads feed it, and should be quick.
+
+DEFAULT_WINDOW = 512 # Packet ids kept open for late copies from other stations
+DEFAULT_MAX_AGE = 5.0 # Seconds an id waits for copies, the stations hear the same transmission
+
+class StationStats:
+    def __init__(self, name):
+        self.name = name
+        self.packets = 0   # Every packet the station delivered
+        self.first = 0     # Packets no other station had delivered yet
+        self.best = 0      # Final copies that came from this station
+        self.rssi = None   # RSSI of the last packet
+        self.last_seen = None
+
+class StationMerger:
+    def __init__(self, on_packet = None, on_final = None, window = DEFAULT_WINDOW, max_age = DEFAULT_MAX_AGE):
+        self.on_packet = on_packet # on_packet(packet, received_at, station), first copy of every id
+        self.on_final = on_final   # on_final(packet, station, received_at), best copy of every id at the time of the first
+        self.window = window
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.open = collections.OrderedDict() # id -> [best packet, station, received_at of the first copy]
+        self.stations = collections.OrderedDict()
+        self.duplicates = 0
+
+    def station(self, name):
+        if(name not in self.stations):
+            self.stations[name] = StationStats(name)
+        return self.stations[name]
+
+    def offer(self, station, packet, received_at = None):
+        # Called from the ingest thread of every station
+        received_at = time.time() if received_at is None else received_at
+        with self.lock:
+            stats = self.station(station)
+            stats.packets += 1
+            stats.rssi = packet.rssi
+            stats.last_seen = received_at
+
+            entry = self.open.get(packet.id)
+            if(entry is not None):
+                self.duplicates += 1
+                if(packet.rssi > entry[0].rssi):
+                    entry[0] = packet
+                    entry[1] = station
+                return
+            stats.first += 1
+            self.open[packet.id] = [packet, station, received_at]
+            if(self.on_packet is not None):
+                self.on_packet(packet, received_at, station)
+            self.finalise_old(received_at)
+
+    def finalise(self, packet, station, received_at):
+        self.stations[station].best += 1
+        if(self.on_final is not None):
+            self.on_final(packet, station, received_at)
+
+    def finalise_old(self, now):
+        # Oldest first, while the window is overfull or the oldest id has waited long enough
+        while(self.open):
+            entry = next(iter(self.open.values()))
+            if(len(self.open) <= self.window and now - entry[2] < self.max_age):
+                break
+            self.finalise(*self.open.popitem(last = False)[1])
+
+    def expire(self, now = None):
+        # Finalises the ids older than max_age, for when the stations have gone quiet
+        with self.lock:
+            self.finalise_old(time.time() if now is None else now)
+
+    def best(self, packet_id):
+        # (packet, station) of the best copy so far, None once the id is final
+        with self.lock:
+            entry = self.open.get(packet_id)
+            return None if entry is None else tuple(entry[:2])
+
+    def rssi(self):
+        # {station: RSSI of its last packet}
+        with self.lock:
+            return {name: stats.rssi for name, stats in self.stations.items()}
+
+    def flush(self):
+        # Finalises every open id, call it when the stations have stopped
+        with self.lock:
+            while(self.open):
+                self.finalise(*self.open.popitem(last = False)[1])
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+# Layout of the telemetry lines printed by the ground station receiver
+
+FIELDS = ['elapsed_time', 'id', 'time', 'alt', 'lat', 'lng', 'pressure', 'ohm', 'hum', 'co2', 'temp', 'rssi']
+
+HEADER = ','.join(FIELDS)
+
+# One decoded telemetry line, the clock fields are kept as received
+Packet = namedtuple('Packet', FIELDS)
+
+# Decimals the receiver prints every field with, None for integers and clocks
+DECIMALS = [None, None, None, 2, 6, 6, 2, 2, 4, 2, 4, None]
+
+class FrameError(ValueError):
+    pass
+
+def hms_to_seconds(text):
+    # '14:4:8' -> 50648, the receiver does not zero pad its clock fields
+    hours, minutes, seconds = text.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+def seconds_to_hms(seconds):
+    seconds = int(seconds)
+    return '{}:{}:{}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+def parse_fields(fields):
+    if(len(fields) != len(FIELDS)):
+        raise FrameError('Expected {} fields, got {}'.format(len(FIELDS), len(fields)))
+    try:
+        hms_to_seconds(fields[0])
+        hms_to_seconds(fields[2])
+        return Packet(
+            fields[0],
+            int(fields[1]),
+            fields[2],
+            float(fields[3]),
+            float(fields[4]),
+            float(fields[5]),
+            float(fields[6]),
+            float(fields[7]),
+            float(fields[8]),
+            float(fields[9]),
+            float(fields[10]),
+            int(fields[11])
+        )
+    except ValueError as e:
+        raise FrameError(str(e))
+
+def parse_line(line):
+    # Raises FrameError for anything that is not a complete telemetry line
+    return parse_fields(line.strip().split(','))
+
+def format_fields(values):
+    return [str(v) if d is None else '{:.{}f}'.format(v, d) for v, d in zip(values, DECIMALS)]
+
+def format_packet(packet):
+    # The CSV line the receiver would have printed for this packet
+    return ','.join(format_fields(packet))
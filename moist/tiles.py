@@ -0,0 +1,316 @@
+import argparse
+import collections
+import http.server
+import math
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline map tiles for the ground station.
+#
+# TileStore keeps slippy map tiles in an SQLite database keyed by
+# (server, zoom, x, y), with a small in-memory LRU of the most recent tiles in
+# front of it. Every tile carries the time it was last used and the database
+# is trimmed to max_tiles by dropping the least recently used ones. Uses are
+# noted in memory and written out in batches, so serving a tile from the cache
+# does not cost a write.
+#
+# seed() fills the store for a bounding box and a range of zoom levels before
+# the trip, so the map works on the launch site without any network. serve()
+# publishes a store over HTTP with the usual {z}/{x}/{y} layout, which makes
+# it a stand-in tile server for testing the seeding and lets a second laptop
+# use the same cache.
+#
+#   python -m moist.tiles seed tiles.db --radius 5 --zooms 6-16
+#   python -m moist.tiles serve tiles.db --port 8089
+#   python -m moist.tiles seed test.db --url http://localhost:8089/{z}/{x}/{y}.png
+#   python -m moist.tiles info tiles.db
+#
+# The OpenStreetMap tile policy forbids bulk downloading from its servers, so
+# seed() refuses to fetch more than MAX_SEED tiles at once unless told to.
+
+DEFAULT_URL = 'https://a.tile.openstreetmap.org/{z}/{x}/{y}.png'
+DEFAULT_CENTER = (69.296049, 16.030619) # Operator position on Andøya, as in moist-gui.py
+DEFAULT_MAX_TILES = 100000 # About 1.5 GB of OSM tiles
+DEFAULT_MEMORY = 512       # Tiles kept in memory
+MAX_SEED = 20000
+USER_AGENT = 'moist-ground-station'
+TOUCH_BATCH = 256          # Uses noted before they are written out
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tiles (
+    server TEXT NOT NULL,
+    zoom INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (server, zoom, x, y)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tiles_last_used ON tiles (last_used);
+'''
+
+def tile_xy(lat, lng, zoom):
+    # Tile containing a position, as in the slippy map spec
+    n = 2 ** zoom
+    lat = math.radians(max(-85.0511, min(85.0511, lat)))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_for_bbox(south, west, north, east, zoom):
+    x0, y0 = tile_xy(north, west, zoom)
+    x1, y1 = tile_xy(south, east, zoom)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield zoom, x, y
+
+def bbox_around(points, radius):
+    # (south, west, north, east) covering every (lat, lng) in points plus radius meters
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    dlat = math.degrees(radius / 6371000.0)
+    dlng = dlat / max(math.cos(math.radians(max(abs(min(lats)), abs(max(lats))) + dlat)), 1e-6)
+    return min(lats) - dlat, min(lngs) - dlng, max(lats) + dlat, max(lngs) + dlng
+
+def tile_url(server, zoom, x, y):
+    return server.replace('{z}', str(zoom)).replace('{x}', str(x)).replace('{y}', str(y))
+
+def fetch(url, timeout = 10):
+    # Tile bytes, or None if the server has no such tile
+    request = urllib.request.Request(url, headers = {'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout = timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        if(e.code == 404):
+            return None
+        raise
+
+class TileStore:
+    def __init__(self, path, max_tiles = DEFAULT_MAX_TILES, memory = DEFAULT_MEMORY):
+        self.path = path
+        self.max_tiles = max_tiles
+        self.memory_size = memory
+        self.memory = collections.OrderedDict()
+        self.touched = {}
+        self.lock = threading.Lock()
+        # One connection shared by the map's loader threads, every use holds the lock
+        self.db = sqlite3.connect(path, check_same_thread = False)
+        self.db.executescript(SCHEMA)
+        self.count = self.db.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.closed = False
+
+    def remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while(len(self.memory) > self.memory_size):
+            self.memory.popitem(last = False)
+
+    def get(self, server, zoom, x, y):
+        key = (server, zoom, x, y)
+        with self.lock:
+            if(self.closed):
+                return None
+            data = self.memory.get(key)
+            if(data is not None):
+                self.memory.move_to_end(key)
+                self.hits += 1
+            else:
+                row = self.db.execute('SELECT data FROM tiles WHERE server = ? AND zoom = ? AND x = ? AND y = ?', key).fetchone()
+                if(row is None):
+                    self.misses += 1
+                    return None
+                data = row[0]
+                self.remember(key, data)
+                self.disk_hits += 1
+            self.touched[key] = time.time()
+            if(len(self.touched) >= TOUCH_BATCH):
+                self.write_touched()
+        return data
+
+    def __contains__(self, key):
+        with self.lock:
+            if(key in self.memory):
+                return True
+            return self.db.execute('SELECT 1 FROM tiles WHERE server = ? AND zoom = ? AND x = ? AND y = ?', key).fetchone() is not None
+
+    def put(self, server, zoom, x, y, data):
+        self.put_many([(server, zoom, x, y, data)])
+
+    def put_many(self, tiles):
+        now = time.time()
+        with self.lock:
+            if(self.closed):
+                return
+            with self.db:
+                for server, zoom, x, y, data in tiles:
+                    key = (server, zoom, x, y)
+                    if(self.db.execute('SELECT 1 FROM tiles WHERE server = ? AND zoom = ? AND x = ? AND y = ?', key).fetchone() is None):
+                        self.count += 1
+                    self.db.execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?)', key + (data, now))
+                    self.remember(key, data)
+                self.write_touched()
+                self.evict()
+
+    def write_touched(self):
+        # Lock held
+        if(self.touched):
+            with self.db:
+                self.db.executemany('UPDATE tiles SET last_used = ? WHERE server = ? AND zoom = ? AND x = ? AND y = ?',
+                                    [(used,) + key for key, used in self.touched.items()])
+            self.touched = {}
+
+    def evict(self):
+        # Lock held, drops the least recently used tiles beyond max_tiles
+        excess = self.count - self.max_tiles
+        if(excess <= 0):
+            return
+        with self.db:
+            victims = self.db.execute('SELECT server, zoom, x, y FROM tiles ORDER BY last_used LIMIT ?', (excess,)).fetchall()
+            self.db.executemany('DELETE FROM tiles WHERE server = ? AND zoom = ? AND x = ? AND y = ?', victims)
+        for key in victims:
+            self.memory.pop(tuple(key), None)
+        self.count -= len(victims)
+
+    def summary(self):
+        with self.lock:
+            return self.db.execute('SELECT server, zoom, COUNT(*), SUM(LENGTH(data)) FROM tiles GROUP BY server, zoom ORDER BY server, zoom').fetchall()
+
+    def close(self):
+        # The map's loader threads may still ask for tiles, they get nothing from now on
+        with self.lock:
+            if(not self.closed):
+                self.write_touched()
+                self.db.close()
+                self.closed = True
+
+def seed(store, points, radius, zooms, server = DEFAULT_URL, workers = 4, timeout = 10, limit = MAX_SEED, progress = None):
+    # Fetches every missing tile within radius meters of points, returns (stored, cached, missing, failed)
+    south, west, north, east = bbox_around(points, radius)
+    wanted = [tile for zoom in zooms for tile in tiles_for_bbox(south, west, north, east, zoom)]
+    todo = [tile for tile in wanted if (server,) + tile not in store]
+    if(limit is not None and len(todo) > limit):
+        raise ValueError('{} tiles to fetch, more than the limit of {}'.format(len(todo), limit))
+
+    def download(tile):
+        try:
+            return tile, fetch(tile_url(server, *tile), timeout), None
+        except (OSError, ValueError) as e:
+            return tile, None, e
+
+    stored = missing = failed = 0
+    batch = []
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        for done, (tile, data, error) in enumerate(pool.map(download, todo), 1):
+            if(error is not None):
+                failed += 1
+            elif(data is None):
+                missing += 1
+            else:
+                batch.append((server,) + tile + (data,))
+                stored += 1
+            if(len(batch) >= 64):
+                store.put_many(batch)
+                batch = []
+            if(progress is not None):
+                progress(done, len(todo))
+    if(batch):
+        store.put_many(batch)
+    return stored, len(wanted) - len(todo), missing, failed
+
+TILE_PATH = re.compile(r'^/(\d+)/(\d+)/(\d+)(\.\w+)?$')
+
+def serve(store, port = 8089, server = DEFAULT_URL, host = 'localhost'):
+    # HTTP server handing out the tiles of one server in the store as {z}/{x}/{y}.png
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = TILE_PATH.match(self.path)
+            data = store.get(server, *map(int, match.groups()[:3])) if match else None
+            if(data is None):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return http.server.ThreadingHTTPServer((host, port), Handler)
+
+def parse_zooms(text):
+    low, _, high = text.partition('-')
+    return range(int(low), int(high or low) + 1)
+
+def parse_point(text):
+    lat, lng = text.split(',')
+    return float(lat), float(lng)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Offline map tile cache of the ground station')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    seed_parser = commands.add_parser('seed', help = 'download the tiles around the launch site')
+    seed_parser.add_argument('db')
+    seed_parser.add_argument('--url', default = DEFAULT_URL, help = 'tile server, with {z}, {x} and {y} in it')
+    seed_parser.add_argument('--around', metavar = 'LAT,LNG', type = parse_point, action = 'append',
+                             help = 'position to cover, repeat it for more (default {},{})'.format(*DEFAULT_CENTER))
+    seed_parser.add_argument('--radius', type = float, default = 5, help = 'km around the positions')
+    seed_parser.add_argument('--zooms', type = parse_zooms, default = parse_zooms('6-16'), help = 'zoom levels, like 6-16')
+    seed_parser.add_argument('--workers', type = int, default = 4)
+    seed_parser.add_argument('--max-tiles', type = int, default = DEFAULT_MAX_TILES, help = 'size of the cache in tiles')
+    seed_parser.add_argument('--force', action = 'store_true', help = 'fetch more than {} tiles'.format(MAX_SEED))
+
+    serve_parser = commands.add_parser('serve', help = 'serve cached tiles over HTTP')
+    serve_parser.add_argument('db')
+    serve_parser.add_argument('--url', default = DEFAULT_URL, help = 'tile server whose tiles are served')
+    serve_parser.add_argument('--port', type = int, default = 8089)
+    serve_parser.add_argument('--host', default = 'localhost')
+
+    info_parser = commands.add_parser('info', help = 'list the cached tiles per zoom level')
+    info_parser.add_argument('db')
+    args = parser.parse_args()
+
+    if(args.command == 'seed'):
+        store = TileStore(args.db, max_tiles = args.max_tiles)
+        def progress(done, total):
+            if(done % 100 == 0 or done == total):
+                print('\r{}/{} tiles'.format(done, total), end = '', flush = True)
+        try:
+            stored, cached, missing, failed = seed(store, args.around or [DEFAULT_CENTER], args.radius * 1000, args.zooms,
+                                                   args.url, args.workers, limit = None if args.force else MAX_SEED,
+                                                   progress = progress)
+        except ValueError as e:
+            parser.error('{}, narrow the area or pass --force'.format(e))
+        finally:
+            store.close()
+        print('\n{} fetched, {} already cached, {} not on the server, {} failed'.format(stored, cached, missing, failed))
+    elif(args.command == 'serve'):
+        store = TileStore(args.db)
+        httpd = serve(store, args.port, args.url, args.host)
+        print('serving {} on http://{}:{}/{{z}}/{{x}}/{{y}}.png'.format(args.db, args.host, args.port))
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            store.close()
+    else:
+        store = TileStore(args.db)
+        for server, zoom, count, size in store.summary():
+            print('{} z{:<2} {:7} tiles {:8.1f} MB'.format(server, zoom, count, size / 1e6))
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Smoothed altitude and vertical velocity, one sample at a time.
+#
+# A two state Kalman filter (altitude and vertical rate) with a constant
+# velocity model driven by white noise acceleration. Every update costs the
+# same few multiplications, and the time step is taken from the samples, so
+# irregular spacing is fine and after a gap the filter trusts the next
+# measurement more because its own prediction has grown uncertain. Samples
+# with the same time are fused without a prediction step, samples that go
+# back in time are dropped, and a clock in seconds of the day is unwrapped
+# over midnight.
+#
+# The GUI feeds it packet by packet while the analysis scripts run
+# vertical_velocity() over a whole flight, which is the same filter in a
+# loop, so the live and the post-flight numbers are identical.
+#
+#   estimator = VerticalVelocity()
+#   altitude, rate = estimator.update(seconds, measured_altitude)
+
+DAY = 86400
+DEFAULT_ACCELERATION = 0.2 # White noise acceleration spectral density (m^2/s^3)
+DEFAULT_NOISE = 5.0        # Standard deviation of the measured altitude (m)
+DEFAULT_RATE = 10.0        # Standard deviation of the rate before the first samples (m/s)
+
+class VerticalVelocity:
+    def __init__(self, acceleration = DEFAULT_ACCELERATION, noise = DEFAULT_NOISE, initial_rate = DEFAULT_RATE, gate = None):
+        # gate: innovations beyond this many standard deviations are rejected as spikes
+        self.q = acceleration
+        self.r = noise * noise
+        self.initial_rate = initial_rate
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.time = None
+        self.offset = 0 # Days added to a wrapped clock
+        self.altitude = np.nan
+        self.rate = np.nan
+        self.p00 = self.p01 = self.p11 = 0.0 # Covariance
+        self.rejected = 0
+        self.out_of_order = 0
+
+    def update(self, time, altitude):
+        # Adds one measurement, returns the smoothed (altitude, rate)
+        time = time + self.offset
+        if(self.time is not None and time < self.time - DAY / 2):
+            self.offset += DAY
+            time += DAY
+        if(altitude != altitude): # NaN
+            return self.altitude, self.rate
+        if(self.time is None):
+            self.time = time
+            self.altitude = altitude
+            self.rate = 0.0
+            self.p00 = self.r
+            self.p01 = 0.0
+            self.p11 = self.initial_rate * self.initial_rate
+            return self.altitude, self.rate
+        dt = time - self.time
+        if(dt < 0):
+            self.out_of_order += 1
+            return self.altitude, self.rate
+
+        # Predict
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        if(dt > 0):
+            q = self.q
+            self.altitude += self.rate * dt
+            p00 += dt * (2 * p01 + dt * p11) + q * dt * dt * dt / 3
+            p01 += dt * p11 + q * dt * dt / 2
+            p11 += q * dt
+            self.time = time
+
+        # Correct
+        s = p00 + self.r
+        innovation = altitude - self.altitude
+        if(self.gate is not None and innovation * innovation > self.gate * self.gate * s):
+            self.rejected += 1
+            self.p00, self.p01, self.p11 = p00, p01, p11
+            return self.altitude, self.rate
+        k0 = p00 / s
+        k1 = p01 / s
+        self.altitude += k0 * innovation
+        self.rate += k1 * innovation
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        return self.altitude, self.rate
+
+    def rate_error(self):
+        # Standard deviation of the rate estimate (m/s)
+        return np.sqrt(self.p11)
+
+def vertical_velocity(times, altitude, **options):
+    # (smoothed altitude, rate) of a whole series, the VerticalVelocity updates in a loop
+    estimator = VerticalVelocity(**options)
+    times = np.asarray(times, dtype = float)
+    altitude = np.asarray(altitude, dtype = float)
+    smoothed = np.empty(len(altitude))
+    rate = np.empty(len(altitude))
+    update = estimator.update
+    for i, (time, value) in enumerate(zip(times.tolist(), altitude.tolist())):
+        smoothed[i], rate[i] = update(time, value)
+    return smoothed, rate